@@ -0,0 +1,303 @@
+#!/usr/bin/python
+
+"""
+Benchmarks of the orchestration layer against fakecluster.FakeCluster.
+Every scenario runs in its own process, with the same random seed, and reports wall time,
+commands per second, CPU time and memory growth of its measured step. Results can be saved
+as a baseline and later runs compared against it.
+The fake cluster runs in the same process: CPU time and memory include its model of the cluster.
+"""
+
+import sys
+import json
+import logging
+import argparse
+import resource
+import time
+import multiprocessing
+import config
+import executor
+import fakecluster
+import inventory
+import lagreport
+import metrics
+import utils
+import replication
+
+g_scenarios = ['create_volumes', 'create_tables', 'load', 'autosetup', 'replstatus',
+               'stress_bulk', 'stress_increment', 'stress_pipeline']
+
+# Result fields compared with the baseline, and whether a larger value is better
+g_compared_fields = {'wall_time': False, 'cpu_time': False, 'rss_growth_kb': False, 'commands_per_sec': True}
+# Changes smaller than this are noise, whatever their relative size (memory grows by whole pages and arenas)
+g_absolute_tolerance = {'rss_growth_kb': 1024}
+
+
+def _volume_list():
+    return ["/" + config.src_volume_prefix + str(config.vol_start_index + i).zfill(utils.g_zfill_width)
+            for i in xrange(0, config.num_src_vols)]
+
+
+def _create_volumes():
+    utils.create_volume_multithread(volume_path_prefix="/" + config.src_volume_prefix,
+                                    start_idx=config.vol_start_index,
+                                    num_volumes=config.num_src_vols,
+                                    parallelism=config.volume_parallelism)
+
+
+def _create_tables():
+    for volume in _volume_list():
+        utils.create_tables_multithread(table_path_prefix_list=[volume + "/" + config.src_table_prefix],
+                                        start_idx=config.table_start_index,
+                                        num_tables=config.num_src_tables)
+
+
+def _load():
+    for volume in _volume_list():
+        utils.load_volume_tables_multithread(volume_path=volume,
+                                             num_cfs=config.num_cfs,
+                                             num_cols=config.num_cols,
+                                             num_rows=config.num_rows)
+
+
+def _autosetup():
+    remote_path, _ = replication.get_replica_parent_paths()
+    for volume in _volume_list():
+        utils.autosetup_replica_table_multithread(volume_path=volume,
+                                                  replica_parent=remote_path,
+                                                  num_replica=config.num_replica)
+
+
+def _replstatus():
+    aggregator = lagreport.LagAggregator()
+    for volume in _volume_list():
+        utils.get_replica_status_multithread(volume_path=volume, fields=None, aggregator=aggregator)
+
+
+# scenario -> (setup steps, not measured; measured step)
+g_scenario_steps = {'create_volumes': ([], _create_volumes),
+                    'create_tables': ([_create_volumes], _create_tables),
+                    'load': ([_create_volumes, _create_tables], _load),
+                    'autosetup': ([_create_volumes, _create_tables, _load], _autosetup),
+                    'replstatus': ([_create_volumes, _create_tables, _load, _autosetup], _replstatus),
+                    'stress_bulk': ([], replication.execute_stress_bulk),
+                    'stress_increment': ([], replication.execute_stress_incremental),
+                    'stress_pipeline': ([], lambda: replication.execute_stress_incremental(is_pipelined=True))}
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_scenario(scenario, settings):
+    """
+    Runs one scenario in the calling process. Meant to be called in a fresh process.
+    :param scenario: one of g_scenarios
+    :param settings: dict of config.py attribute to value, e.g. num_src_vols
+    :return: dict of results
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    for name, value in settings.items():
+        setattr(config, name, value)
+    config.journal_path = None
+    fake_cluster = fakecluster.FakeCluster(latencies=config.fake_latencies,
+                                           failure_rate=config.fake_failure_rate,
+                                           time_scale=config.fake_time_scale,
+                                           capacity=config.fake_capacity,
+                                           seed=config.fake_seed)
+    utils.g_executor = executor.CommandExecutor(num_workers=config.num_workers, runner=fake_cluster.run)
+    utils.g_inventory = inventory.TableInventory(ttl=config.inventory_ttl)
+
+    setup_steps, step = g_scenario_steps[scenario]
+    for setup_step in setup_steps:
+        setup_step()
+    registry = metrics.MetricsRegistry()
+    utils.g_executor.registry = registry
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_before = _cpu_time()
+    start = time.time()
+    step()
+    wall_time = time.time() - start
+    cpu_time = _cpu_time() - cpu_before
+    # ru_maxrss is the peak of the process lifetime, setup included: only its growth is due to the step
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    utils.g_executor.shutdown()
+
+    stats = registry.snapshot()
+    num_commands = sum(op_stats['count'] for op_stats in stats.values())
+    return {'scenario': scenario,
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'commands': num_commands,
+            'errors': sum(op_stats['errors'] for op_stats in stats.values()),
+            'commands_per_sec': num_commands / wall_time if wall_time > 0 else 0.0,
+            'cpu_ms_per_command': 1000.0 * cpu_time / num_commands if num_commands else None,
+            'rss_before_kb': rss_before,
+            'peak_rss_kb': peak_rss,
+            'rss_growth_kb': peak_rss - rss_before,
+            'fake_cluster': fake_cluster.summary()}
+
+
+def _run_scenario_star(args):
+    return run_scenario(*args)
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+def summarize_runs(runs):
+    """
+    :param runs: results of several runs of one scenario
+    :return: results of the run of median wall time, with every compared field replaced by its median,
+             'runs' the number of runs and 'spread' the relative spread (max - min) / median of each compared field
+    """
+    result = dict(sorted(runs, key=lambda run: run['wall_time'])[len(runs) // 2])
+    result['runs'] = len(runs)
+    result['spread'] = {}
+    for field in g_compared_fields:
+        values = [run[field] for run in runs if run.get(field) is not None]
+        if not values:
+            continue
+        result[field] = _median(values)
+        if result[field]:
+            result['spread'][field] = (max(values) - min(values)) / float(abs(result[field]))
+    return result
+
+
+def run_benchmarks(list_of_scenarios, settings, repeat=3):
+    """
+    Runs each scenario in a new process, repeat times, and keeps the median of the runs
+    :param list_of_scenarios: scenarios to run
+    :param settings: dict of config.py attribute to value
+    :param repeat: number of runs of each scenario
+    :return: dict of scenario to results, see summarize_runs
+    """
+    results = {}
+    for scenario in list_of_scenarios:
+        pool = multiprocessing.Pool(processes=1, maxtasksperchild=1)
+        try:
+            runs = pool.map(_run_scenario_star, [(scenario, settings)] * repeat)
+        finally:
+            pool.close()
+            pool.join()
+        results[scenario] = summarize_runs(runs)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    :param results: output of run_benchmarks
+    :param baseline: output of run_benchmarks of an earlier run
+    :param tolerance: allowed relative change for the worse, e.g. 0.2 for 20%
+    :return: list of regression descriptions, empty if none. A field whose runs spread by more than
+             the tolerance, in the results or in the baseline, is too noisy to tell and is not compared.
+    """
+    regressions = []
+    for scenario, result in sorted(results.items()):
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        for field, larger_is_better in sorted(g_compared_fields.items()):
+            if not base.get(field) or result.get(field) is None:
+                continue
+            if abs(result[field] - base[field]) < g_absolute_tolerance.get(field, 0):
+                continue
+            spread = max(result.get('spread', {}).get(field, 0), base.get('spread', {}).get(field, 0))
+            if spread > tolerance:
+                logging.warning("%s %s not compared: runs spread by %.0f%%, more than the tolerance" %
+                                (scenario, field, 100 * spread))
+                continue
+            change = (result[field] - base[field]) / float(base[field])
+            if (larger_is_better and change < -tolerance) or (not larger_is_better and change > tolerance):
+                regressions.append("%s %s: %.3f -> %.3f (%+.0f%%)" % (scenario, field, base[field],
+                                                                      result[field], 100 * change))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = ["%-18s %9s %9s %9s %11s %12s %12s" % ("scenario", "commands", "wall(s)", "cpu(s)", "cmds/sec",
+                                                   "cpu ms/cmd", "rss +(MB)")]
+    for scenario in g_scenarios:
+        result = results.get(scenario)
+        if result is None:
+            continue
+        lines.append("%-18s %9d %9.2f %9.2f %11.1f %12.3f %12.1f" % (
+            scenario, result['commands'], result['wall_time'], result['cpu_time'], result['commands_per_sec'],
+            result['cpu_ms_per_command'] or 0.0, result['rss_growth_kb'] / 1024.0))
+        if baseline is not None and scenario in baseline:
+            base = baseline[scenario]
+            lines.append("%-18s %9d %9.2f %9.2f %11.1f %12.3f %12.1f" % (
+                "  baseline", base['commands'], base['wall_time'], base['cpu_time'], base['commands_per_sec'],
+                base['cpu_ms_per_command'] or 0.0, base.get('rss_growth_kb', 0) / 1024.0))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-scenarios',
+                        default=','.join(g_scenarios),
+                        help='Comma separated scenarios to run (default: all of ' + ', '.join(g_scenarios) + ')')
+    parser.add_argument('-numvolumes',
+                        type=int,
+                        default=4,
+                        help='Number of volumes')
+    parser.add_argument('-numtables',
+                        type=int,
+                        default=50,
+                        help='Number of tables per volume')
+    parser.add_argument('-numrows',
+                        type=int,
+                        default=10000,
+                        help='Number of rows loaded per table')
+    parser.add_argument('-timescale',
+                        type=float,
+                        default=0.001,
+                        help='Latency multiplier of the fake cluster (default: 0.001)')
+    parser.add_argument('-repeat',
+                        type=int,
+                        default=3,
+                        help='Run each scenario this many times and keep the median (default: 3). ' +
+                             'Fields whose runs spread by more than the tolerance are not compared')
+    parser.add_argument('-baseline',
+                        help='Compare with the results stored in this file')
+    parser.add_argument('-save',
+                        help='Store the results in this file, to be used as -baseline later')
+    parser.add_argument('-tolerance',
+                        type=float,
+                        default=0.2,
+                        help='Allowed relative change for the worse before a result is a regression')
+    args = parser.parse_args()
+
+    list_of_scenarios = args.scenarios.split(',')
+    for scenario in list_of_scenarios:
+        if scenario not in g_scenario_steps:
+            logging.error('Unknown scenario: ' + scenario)
+            sys.exit(-1)
+    settings = {'num_src_vols': args.numvolumes,
+                'num_src_tables': args.numtables,
+                'num_rows': args.numrows,
+                'fake_time_scale': args.timescale,
+                'fake_seed': 1}
+
+    if args.baseline is not None and args.repeat < 3:
+        logging.warning('With fewer than 3 runs per scenario, noise cannot be told from regressions')
+    results = run_benchmarks(list_of_scenarios, settings, args.repeat)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+    print format_results(results, baseline)
+    if args.save is not None:
+        with open(args.save, 'w') as out_file:
+            json.dump({'settings': settings, 'results': results}, out_file, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print "REGRESSION " + regression
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,371 @@
+#!/usr/bin/python
+
+"""
+In-process load engine, an alternative to one loadtest process per table.
+Rows are generated a batch at a time: keys from a sequential, uniform or zipfian distribution,
+values sliced from a pre-generated random buffer, laid out in configurable column families.
+Batches are written through a pluggable sink. MemorySink and FileSink are meant for testing,
+there is no sink writing to MapR tables.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from threading import Lock
+import loadstats
+import metrics
+
+g_key_distributions = ['sequential', 'uniform', 'zipfian']
+
+# Cache of zeta(n, theta), computing it is O(n)
+_zeta_cache = {}
+_zeta_lock = Lock()
+
+
+class SequentialKeys(object):
+    """
+    Keys start, start + 1, ... like loadtest
+    """
+
+    def __init__(self, start=0):
+        self._next = start
+
+    def next_batch(self, size):
+        keys = range(self._next, self._next + size)
+        self._next += size
+        return keys
+
+
+class UniformKeys(object):
+    """
+    Keys drawn uniformly from [0, key_space). Keys drawn twice overwrite the row.
+    """
+
+    def __init__(self, key_space, rng):
+        self.key_space = key_space
+        self._rng = rng
+
+    def next_batch(self, size):
+        randrange = self._rng.randrange
+        key_space = self.key_space
+        return [randrange(key_space) for _ in xrange(size)]
+
+
+def _zeta(n, theta):
+    with _zeta_lock:
+        value = _zeta_cache.get((n, theta))
+        if value is None:
+            value = sum(1.0 / (i ** theta) for i in xrange(1, n + 1))
+            _zeta_cache[(n, theta)] = value
+        return value
+
+
+class ZipfianKeys(object):
+    """
+    Keys drawn from [0, key_space) with a zipfian distribution, key 0 being the most popular.
+    Uses the method of Gray et al., "Quickly generating billion-record synthetic databases", as YCSB does.
+    """
+
+    def __init__(self, key_space, rng, theta=0.99):
+        """
+        :param key_space: number of distinct keys
+        :param rng: random.Random
+        :param theta: skew, in (0, 1). 0.99 is the YCSB default.
+        """
+        if not 0 < theta < 1:
+            raise ValueError("Zipfian theta must be in (0, 1): " + str(theta))
+        self.key_space = key_space
+        self._rng = rng
+        self._theta = theta
+        self._zetan = _zeta(key_space, theta)
+        self._alpha = 1.0 / (1.0 - theta)
+        # With 2 keys or less, every draw falls in the first two cases of next_batch
+        self._eta = (1 - (2.0 / key_space) ** (1 - theta)) / (1 - _zeta(2, theta) / self._zetan) \
+            if key_space > 2 else 0.0
+        self._second = 1 + 0.5 ** theta
+
+    def next_batch(self, size):
+        rand = self._rng.random
+        zetan, alpha, eta, second, key_space = self._zetan, self._alpha, self._eta, self._second, self.key_space
+        keys = []
+        for _ in xrange(size):
+            u = rand()
+            uz = u * zetan
+            if uz < 1.0:
+                keys.append(0)
+            elif uz < second:
+                keys.append(1)
+            else:
+                keys.append(min(key_space - 1, int(key_space * (eta * u - eta + 1) ** alpha)))
+        return keys
+
+
+def make_key_generator(distribution, key_space, rng, theta=0.99):
+    """
+    :param distribution: one of g_key_distributions
+    :param key_space: number of distinct keys (ignored by sequential)
+    :param rng: random.Random
+    :param theta: skew of the zipfian distribution
+    :return: key generator with a next_batch(size) method
+    """
+    if distribution == 'sequential':
+        return SequentialKeys()
+    if distribution == 'uniform':
+        return UniformKeys(key_space, rng)
+    if distribution == 'zipfian':
+        return ZipfianKeys(key_space, rng, theta)
+    raise ValueError("Unknown key distribution: " + str(distribution))
+
+
+class RowShape(object):
+    """
+    Column layout and value sizes of generated rows
+    """
+
+    def __init__(self, columns, value_size=10, value_size_max=None):
+        """
+        :param columns: dict of column family -> list of column names
+        :param value_size: bytes per value
+        :param value_size_max: if set, value sizes are drawn uniformly from [value_size, value_size_max]
+        """
+        self.columns = [(family, sorted(names)) for family, names in sorted(columns.items())]
+        self.value_size = value_size
+        self.value_size_max = value_size_max if value_size_max is not None else value_size
+        if self.value_size_max < self.value_size:
+            raise ValueError("value_size_max is smaller than value_size")
+
+    @classmethod
+    def from_counts(cls, num_cfs, num_cols, value_size=10, value_size_max=None):
+        """
+        Same layout as loadtest: families cf1..cfN with columns c1..cM each
+        """
+        columns = dict(("cf" + str(f), ["c" + str(c) for c in xrange(1, num_cols + 1)])
+                       for f in xrange(1, num_cfs + 1))
+        return cls(columns, value_size, value_size_max)
+
+    @property
+    def num_values(self):
+        return sum(len(names) for _, names in self.columns)
+
+
+class RowBatchGenerator(object):
+    """
+    Generates rows as batches of (key, {family: {column: value}})
+    """
+
+    def __init__(self, keys, shape, rng, key_width=10, buffer_size=1 << 20):
+        """
+        :param keys: key generator
+        :param shape: RowShape
+        :param rng: random.Random
+        :param key_width: keys are zero padded to this many digits, so that sequential keys sort
+        :param buffer_size: size of the random buffer values are sliced from
+        """
+        self.keys = keys
+        self.shape = shape
+        self._rng = rng
+        self._key_format = "row%0" + str(key_width) + "d"
+        buffer_size = max(buffer_size, 2 * shape.value_size_max)
+        # Hex digits of one large random number: printable, and cheap to generate
+        self._buffer = "%0*x" % (buffer_size, rng.getrandbits(4 * buffer_size))
+
+    def _values(self, count):
+        rand = self._rng.random
+        buf = self._buffer
+        last = len(buf) - self.shape.value_size_max
+        size, size_max = self.shape.value_size, self.shape.value_size_max
+        # random() is several times cheaper than randrange(), and this runs once per value
+        offsets = [int(rand() * last) for _ in xrange(count)]
+        if size == size_max:
+            return [buf[offset:offset + size] for offset in offsets]
+        spread = size_max - size + 1
+        return [buf[offset:offset + size + int(rand() * spread)] for offset in offsets]
+
+    def next_batch(self, size):
+        """
+        :param size: number of rows
+        :return: list of (key, {family: {column: value}})
+        """
+        key_format = self._key_format
+        values = self._values(size * self.shape.num_values)
+        # Offset of each family in the values of a row
+        layout = []
+        offset = 0
+        for family, names in self.shape.columns:
+            layout.append((family, names, offset, offset + len(names)))
+            offset += len(names)
+        rows = []
+        for i, key in enumerate(self.keys.next_batch(size)):
+            base = i * offset
+            rows.append((key_format % key,
+                         dict((family, dict(zip(names, values[base + first:base + last])))
+                              for family, names, first, last in layout)))
+        return rows
+
+
+def _row_bytes(rows):
+    return sum(len(key) + sum(len(value) for family in columns.itervalues() for value in family.itervalues())
+               for key, columns in rows)
+
+
+class Sink(object):
+    """
+    Destination of generated rows. Sinks implement write(table, rows), rows being a list of
+    (key, {family: {column: value}}), returning the number of rows that could not be written.
+    Implementations must be thread safe, tables are loaded concurrently.
+    """
+
+    def close(self):
+        pass
+
+
+class MemorySink(Sink):
+    """
+    Counts rows and bytes per table, and optionally keeps the rows (later puts of a key overwrite it)
+    """
+
+    def __init__(self, keep_rows=False):
+        self.keep_rows = keep_rows
+        self._lock = Lock()
+        self.rows_written = {}
+        self.bytes_written = {}
+        self.tables = {}
+
+    def write(self, table, rows):
+        num_bytes = _row_bytes(rows)
+        with self._lock:
+            self.rows_written[table] = self.rows_written.get(table, 0) + len(rows)
+            self.bytes_written[table] = self.bytes_written.get(table, 0) + num_bytes
+            if self.keep_rows is True:
+                self.tables.setdefault(table, {}).update(rows)
+        return 0
+
+
+class FileSink(Sink):
+    """
+    Writes one JSON document per row, {"_id": key, family: {column: value}}, to a file per table in a directory
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = Lock()
+        self._files = {}
+
+    def _get_file(self, table):
+        with self._lock:
+            handle = self._files.get(table)
+            if handle is None:
+                name = table.strip('/').replace('/', '_') or 'root'
+                handle = (open(os.path.join(self.directory, name + ".jsonl"), 'a'), Lock())
+                self._files[table] = handle
+            return handle
+
+    def write(self, table, rows):
+        lines = []
+        for key, columns in rows:
+            document = dict(columns)
+            document['_id'] = key
+            lines.append(json.dumps(document))
+        out, lock = self._get_file(table)
+        with lock:
+            out.write("\n".join(lines) + "\n")
+        return 0
+
+    def close(self):
+        with self._lock:
+            for out, _ in self._files.itervalues():
+                out.close()
+            self._files = {}
+
+
+def make_sink(name, directory=None):
+    """
+    :param name: memory / file
+    :param directory: output directory of the file sink
+    :return: Sink
+    """
+    if name == 'memory':
+        return MemorySink()
+    if name == 'file':
+        return FileSink(directory)
+    raise ValueError("Unknown sink: " + str(name))
+
+
+class BulkLoader(object):
+    """
+    Loads tables by writing generated row batches to a sink
+    """
+
+    def __init__(self, sink, key_distribution='sequential', key_space=None, zipf_theta=0.99, columns=None,
+                 value_size=10, value_size_max=None, batch_size=1000, seed=None, registry=None):
+        """
+        :param sink: Sink
+        :param key_distribution: one of g_key_distributions
+        :param key_space: distinct keys of the uniform / zipfian distributions (default = number of rows loaded)
+        :param zipf_theta: skew of the zipfian distribution
+        :param columns: dict of column family -> list of column names (default = layout of loadtest)
+        :param value_size: bytes per value
+        :param value_size_max: if set, value sizes are drawn uniformly from [value_size, value_size_max]
+        :param batch_size: rows per write to the sink
+        :param seed: seed of the generated data (None: different on every run)
+        :param registry: metrics.MetricsRegistry recording "bulkload write" latencies (default = metrics.g_registry)
+        """
+        if key_distribution not in g_key_distributions:
+            raise ValueError("Unknown key distribution: " + str(key_distribution))
+        self.sink = sink
+        self.key_distribution = key_distribution
+        self.key_space = key_space
+        self.zipf_theta = zipf_theta
+        self.columns = columns
+        self.value_size = value_size
+        self.value_size_max = value_size_max
+        self.batch_size = batch_size
+        self.seed = seed
+        self.registry = registry if registry is not None else metrics.g_registry
+
+    def make_generator(self, table, num_rows, num_cfs=1, num_cols=3):
+        """
+        :return: RowBatchGenerator for one table, seeded from the loader seed and the table
+        """
+        rng = random.Random((self.seed, table) if self.seed is not None else None)
+        key_space = self.key_space if self.key_space is not None else max(num_rows, 1)
+        keys = make_key_generator(self.key_distribution, key_space, rng, self.zipf_theta)
+        if self.columns is not None:
+            shape = RowShape(self.columns, self.value_size, self.value_size_max)
+        else:
+            shape = RowShape.from_counts(num_cfs, num_cols, self.value_size, self.value_size_max)
+        key_width = len(str(max(key_space, num_rows)))
+        return RowBatchGenerator(keys, shape, rng, key_width)
+
+    def load(self, table, num_rows, num_cfs=1, num_cols=3):
+        """
+        Writes num_rows generated rows to the table
+        :param table: table path
+        :param num_rows: total number of rows to write
+        :param num_cfs: number of column families, when no column layout was given
+        :param num_cols: number of columns in each family, when no column layout was given
+        :return: loadstats.LoadResult
+        """
+        generator = self.make_generator(table, num_rows, num_cfs, num_cols)
+        start = time.time()
+        written, errors, ok = 0, 0, True
+        while written + errors < num_rows:
+            rows = generator.next_batch(min(self.batch_size, num_rows - written - errors))
+            batch_start = time.time()
+            try:
+                failed = self.sink.write(table, rows)
+            except Exception:
+                logging.exception("Bulk load of " + table + " failed after " + str(written) + " rows")
+                self.registry.record("bulkload write", time.time() - batch_start, False)
+                errors += num_rows - written - errors
+                ok = False
+                break
+            self.registry.record("bulkload write", time.time() - batch_start, failed == 0)
+            written += len(rows) - failed
+            errors += failed
+        return loadstats.LoadResult(table, written, time.time() - start, errors, ok,
+                                    loadstats.ROWS_COUNTED, loadstats.ELAPSED_WALL_TIME)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+"""
+Adaptive (AIMD) concurrency limits, tracked separately for each kind of command.
+A limit grows by one while latency and error rate stay healthy and is halved when they degrade.
+"""
+
+import logging
+from threading import Condition, Lock
+
+
+class AdaptiveLimiter(object):
+    """
+    Additive increase / multiplicative decrease limit on the number of commands in flight
+    """
+
+    def __init__(self, name, initial=4, min_limit=1, max_limit=64, window=20,
+                 latency_tolerance=2.0, error_threshold=0.1):
+        """
+        :param name: operation the limiter is for, used in logs
+        :param initial: starting limit
+        :param min_limit: limit never goes below this
+        :param max_limit: limit never goes above this
+        :param window: number of completed commands after which the limit is re-evaluated
+        :param latency_tolerance: back off when mean latency of a window exceeds the best
+                                  mean latency seen so far by this factor
+        :param error_threshold: back off when the fraction of failed commands in a window exceeds this
+        """
+        self.name = name
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.in_flight = 0
+        self._cond = Condition(Lock())
+        self._baseline_latency = None
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+
+    def acquire(self):
+        """
+        Blocks till a command can be started under the current limit
+        :return: None
+        """
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, wall_time, ok=True):
+        """
+        Records a finished command and re-evaluates the limit at the end of a window
+        :param wall_time: time taken by the command in seconds
+        :param ok: whether the command succeeded
+        :return: None
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._window_count += 1
+            self._window_latency += wall_time
+            if not ok:
+                self._window_errors += 1
+            if self._window_count >= min(self.window, max(self.limit, 1) * 2):
+                self._adjust()
+            self._cond.notify_all()
+
+    def _adjust(self):
+        mean_latency = self._window_latency / self._window_count
+        error_rate = float(self._window_errors) / self._window_count
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+
+        if self._baseline_latency is None or mean_latency < self._baseline_latency:
+            self._baseline_latency = mean_latency
+        else:
+            # Let the baseline follow slow drifts of the cluster
+            self._baseline_latency *= 1.01
+
+        old_limit = self.limit
+        if error_rate > self.error_threshold or mean_latency > self._baseline_latency * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit / 2)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+        if self.limit != old_limit:
+            logging.debug("Concurrency of " + self.name + ": " + str(old_limit) + " -> " + str(self.limit) +
+                          " (mean latency %.3fs, error rate %.2f)" % (mean_latency, error_rate))
+
+
+class LimiterGroup(object):
+    """
+    One AdaptiveLimiter per operation, created on first use with the same settings
+    """
+
+    def __init__(self, **limiter_args):
+        """
+        :param limiter_args: arguments passed to every AdaptiveLimiter
+        """
+        self._limiter_args = limiter_args
+        self._limiters = {}
+        self._lock = Lock()
+
+    def get(self, operation):
+        """
+        :param operation: operation name, e.g. "table create"
+        :return: AdaptiveLimiter of the operation
+        """
+        with self._lock:
+            limiter = self._limiters.get(operation)
+            if limiter is None:
+                limiter = AdaptiveLimiter(operation, **self._limiter_args)
+                self._limiters[operation] = limiter
+            return limiter
+
+    def limits(self):
+        """
+        :return: dict of operation to its current limit
+        """
+        with self._lock:
+            return dict((operation, limiter.limit) for operation, limiter in self._limiters.items())
@@ -34,3 +34,118 @@ num_local = 1
 local_replica_volume_name = "localvol"
 remote_volume_name = "replvol"
 remote_cluster_name = "zoom"
+
+# Number of maprcli / hadoop / loadtest commands allowed to run at the same time
+num_workers = 10
+# Adapt the number of commands in flight to the cluster, separately for each operation
+# (table create, replica autosetup, loadtest...). The pool then has adaptive_max_limit workers instead of num_workers.
+adaptive_concurrency = False
+# Starting number of commands in flight per operation
+adaptive_initial_concurrency = 4
+# Upper bound of the number of commands in flight per operation, and size of the pool
+adaptive_max_limit = 32
+# Back off when mean latency exceeds the best seen so far by this factor
+adaptive_latency_tolerance = 2.0
+# Back off when more than this fraction of commands fail
+adaptive_error_threshold = 0.1
+# Number of volumes created / deleted at the same time
+volume_parallelism = 10
+
+# Pipelined incremental profile (stress increment -pipeline)
+# Number of threads in each stage. Keep num_workers at least as large as their sum.
+pipeline_create_workers = 2
+pipeline_load_workers = 4
+pipeline_autosetup_workers = 4
+# Maximum number of tables waiting between two stages
+pipeline_queue_size = 10
+
+# Maximum number of replica autosetup commands in flight per table (stress -concurrentreplica)
+replica_setup_concurrency = 3
+
+# Seconds for which a cached listing of tables in a volume is trusted
+inventory_ttl = 300
+
+# sqlite file recording volumes, tables and replicas created by the scripts (None: disabled)
+state_db_path = None
+
+# Journal of completed steps of stress runs, used by -resume (None: disabled).
+# A run without -resume moves the journal of the previous run to journal_path.YYYYmmdd-HHMMSS
+journal_path = "stress.journal"
+
+# Port on which live metrics are served in the Prometheus text format (None: disabled)
+metrics_port = None
+
+# replstatus -watch -adaptive: longest interval between two polls of an up to date table (seconds)
+replstatus_max_interval = 300
+# replstatus -watch -adaptive: maximum number of "maprcli table replica list" calls per minute (None: no limit)
+replstatus_poll_budget = 600
+
+# stress -uptodate: seconds between two polls of replicas that are not up to date yet
+uptodate_poll_interval = 10
+# stress -uptodate: stop waiting for replicas to become up to date after these many seconds (None: no limit)
+uptodate_timeout = 3600
+
+# replstatus -watch -history: samples kept at full resolution per replica
+history_capacity = 120
+# replstatus -watch -history: downsampled samples kept per replica, after they fall off the full resolution ones
+history_coarse_capacity = 288
+# replstatus -watch -history: number of full resolution samples merged (max) into one downsampled sample.
+# Retention is INTERVAL * (history_capacity + history_coarse_capacity * history_downsample_factor): with -watch 5,
+# 10 minutes at full resolution, then 6 days at one sample per 30 minutes, in at most 20KB per replica
+history_downsample_factor = 360
+
+# replstatus -lagreport: number of entries in each ranking
+lag_report_top = 10
+# replstatus -lagreport: flag replicas whose lag grew in at least these many consecutive polls
+lag_growing_polls = 3
+
+# -fake: latencies of the fake cluster, operation -> (median seconds, sigma), overriding fakecluster.g_default_latencies
+fake_latencies = {}
+# -fake: fraction of commands that fail
+fake_failure_rate = 0.0
+# -fake: multiplies all latencies and replication times (0.01: 100 times faster than a cluster)
+fake_time_scale = 0.01
+# -fake: number of commands served without slowing down (None: unlimited)
+fake_capacity = None
+# -fake: seed of the random latencies and failures (None: different on every run)
+fake_seed = None
+
+# stress -shardcount: directory shared by all instances, holding a lease file per volume (or table index)
+# claimed by a shard, so that two instances never work on the same objects (None: no leases)
+lease_dir = "stress.leases"
+# Seconds after which a lease that was not renewed, e.g. of a crashed instance, can be taken over
+lease_ttl = 60
+
+# stress increment -agents: port on which the coordinator listens for agents (0: any free port)
+fanout_port = 7077
+# Number of table operations each agent runs at the same time
+fanout_slots = 4
+# Directory of replication.py on the agent hosts (None: same directory as on this host)
+fanout_remote_dir = None
+# Give up, failing the remaining table operations, after these many seconds without any agent connected
+fanout_connect_timeout = 60
+
+# -cpuaware: CPUs given to each loadtest process
+load_cpus_per_process = 1
+# -cpuaware: maximum number of loadtest processes at the same time (None: one per load_cpus_per_process CPUs)
+load_max_processes = None
+# -cpuaware: pin each loadtest process to its CPUs with taskset
+load_pin_cpus = True
+
+# -bulkload: distribution of the row keys, sequential / uniform / zipfian
+bulkload_key_distribution = "sequential"
+# -bulkload: distinct keys of the uniform / zipfian distributions (None: number of rows loaded per table)
+bulkload_key_space = None
+# -bulkload: skew of the zipfian distribution, in (0, 1)
+bulkload_zipf_theta = 0.99
+# -bulkload: column family -> list of columns, e.g. {"d": ["name", "address"]} (None: num_cfs x num_cols as loadtest)
+bulkload_columns = None
+# -bulkload: bytes per value, drawn uniformly up to bulkload_value_size_max if that is set
+bulkload_value_size = 10
+bulkload_value_size_max = None
+# -bulkload: rows per write to the sink
+bulkload_batch_size = 1000
+# -bulkload file: directory of the files, one per table
+bulkload_dir = "bulkload.out"
+# -bulkload: seed of the generated data (None: different on every run)
+bulkload_seed = None
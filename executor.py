@@ -0,0 +1,237 @@
+#!/usr/bin/python
+
+"""
+Bounded worker pool used to run external commands (maprcli, hadoop, loadtest).
+Commands are passed as argv lists and executed directly, without a shell.
+"""
+
+import logging
+import subprocess
+import time
+import Queue
+from threading import Thread, Event, Lock
+import metrics
+
+
+class CommandResult(object):
+    """
+    Outcome of a single command executed by the pool
+    """
+
+    def __init__(self, argv, returncode, stdout, stderr, wall_time):
+        """
+        :param argv: command that was executed
+        :param returncode: exit code of the process (127 if it could not be started)
+        :param stdout: captured standard output
+        :param stderr: captured standard error
+        :param wall_time: time taken by the command in seconds
+        """
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall_time = wall_time
+        # Time the command was handed to its runner, set by CommandExecutor. Queue and limiter waits come before.
+        self.started_at = None
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def __repr__(self):
+        return "CommandResult(cmd=%r, returncode=%d, wall_time=%.3f)" % (' '.join(self.argv),
+                                                                        self.returncode,
+                                                                        self.wall_time)
+
+
+class PendingCommand(object):
+    """
+    Handle for a command submitted to the pool. Call wait() to get its CommandResult.
+    """
+
+    def __init__(self, argv, callback=None):
+        self.argv = argv
+        self.callback = callback
+        self.limiter = None
+        self._done = Event()
+        self._result = None
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self):
+        """
+        Blocks till the command finishes
+        :return: CommandResult
+        """
+        # Waiting in small steps keeps the main thread responsive to Ctrl-C
+        while not self._done.wait(1.0):
+            pass
+        return self._result
+
+    def _set_result(self, result):
+        self._result = result
+        self._done.set()
+        if self.callback is not None:
+            try:
+                self.callback(result)
+            except Exception:
+                logging.exception("Callback failed for: " + ' '.join(self.argv))
+
+
+def get_operation(argv):
+    """
+    Name of the kind of operation a command performs, e.g. "table create" or "loadtest"
+    :param argv: command as a list of arguments
+    :return: operation name
+    """
+    program = argv[0].rsplit('/', 1)[-1]
+    if program == "maprcli":
+        # maprcli <object> [<sub object>] <action> -options...
+        words = []
+        for arg in argv[1:]:
+            if arg.startswith('-'):
+                break
+            words.append(arg)
+        return ' '.join(words)
+    if program == "hadoop":
+        return ' '.join(argv[1:3])
+    return program
+
+
+def run_command(argv):
+    """
+    Runs a command in the calling thread and captures its outcome
+    :param argv: command as a list of arguments
+    :return: CommandResult
+    """
+    start = time.time()
+    try:
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+        stdout, stderr = proc.communicate()
+        returncode = proc.returncode
+    except OSError as e:
+        stdout, stderr, returncode = "", str(e), 127
+    return CommandResult(argv, returncode, stdout, stderr, time.time() - start)
+
+
+class CommandExecutor(object):
+    """
+    Runs commands on a fixed number of worker threads.
+    Workers are started lazily on first submit, so creating an executor is cheap.
+    """
+
+    def __init__(self, num_workers=10, limiters=None, registry=None, runner=None):
+        """
+        :param num_workers: maximum number of commands running at the same time
+        :param limiters: optional concurrency.LimiterGroup, limiting each kind of operation further
+        :param registry: metrics.MetricsRegistry recording every command (default = metrics.g_registry)
+        :param runner: function running an argv and returning its CommandResult (default = run_command),
+                       e.g. fakecluster.FakeCluster.run to run without a cluster
+        """
+        self.num_workers = num_workers
+        self.runner = runner if runner is not None else run_command
+        self.limiters = limiters
+        self.registry = registry if registry is not None else metrics.g_registry
+        # Number of commands currently running
+        self.in_flight = 0
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._lock = Lock()
+        self._count_lock = Lock()
+
+    def _start_workers(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in xrange(0, self.num_workers):
+                worker = Thread(target=self._worker_loop, name="executor-" + str(i))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _worker_loop(self):
+        while True:
+            pending = self._queue.get()
+            if pending is None:
+                self._queue.task_done()
+                return
+            with self._count_lock:
+                self.in_flight += 1
+            start = time.time()
+            result = None
+            try:
+                result = self.runner(pending.argv)
+                self.registry.record(get_operation(pending.argv), result.wall_time, result.ok)
+            except Exception as e:
+                # A worker must never die with a command in hand, its caller would wait forever
+                logging.exception("Failed to run: " + ' '.join(pending.argv))
+                if result is None:
+                    result = CommandResult(pending.argv, 1, "", str(e), time.time() - start)
+            finally:
+                if result is None:
+                    result = CommandResult(pending.argv, 1, "", "Interrupted", time.time() - start)
+                result.started_at = start
+                if pending.limiter is not None:
+                    pending.limiter.release(result.wall_time, result.ok)
+                with self._count_lock:
+                    self.in_flight -= 1
+                if not result.ok:
+                    logging.error("Command failed (" + str(result.returncode) + "): " + ' '.join(pending.argv))
+                    if result.stderr:
+                        logging.error(result.stderr.strip())
+                pending._set_result(result)
+                self._queue.task_done()
+
+    def queue_depth(self):
+        """
+        :return: number of commands waiting for a worker
+        """
+        return self._queue.qsize()
+
+    def submit(self, argv, callback=None):
+        """
+        Queues a command for execution
+        :param argv: command as a list of arguments
+        :param callback: optional function called with the CommandResult once done
+        :return: PendingCommand
+        """
+        if not self._workers:
+            self._start_workers()
+        logging.info(' '.join(argv))
+        pending = PendingCommand(argv, callback)
+        if self.limiters is not None:
+            # Waits here, in the submitting thread, so that workers never sit on a blocked command
+            pending.limiter = self.limiters.get(get_operation(argv))
+            pending.limiter.acquire()
+        self._queue.put(pending)
+        return pending
+
+    def run(self, argv):
+        """
+        Runs a command on the pool and waits for it to finish
+        :param argv: command as a list of arguments
+        :return: CommandResult
+        """
+        return self.submit(argv).wait()
+
+    def run_many(self, list_of_argv):
+        """
+        Runs all commands on the pool and waits for all of them
+        :param list_of_argv: list of commands
+        :return: list of CommandResult, in the same order as the commands
+        """
+        pending = [self.submit(argv) for argv in list_of_argv]
+        return [p.wait() for p in pending]
+
+    def shutdown(self):
+        """
+        Stops the workers after the queued commands are done
+        :return: None
+        """
+        with self._lock:
+            for _ in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
@@ -0,0 +1,325 @@
+#!/usr/bin/python
+
+"""
+In-memory stand-in for maprcli, hadoop fs and loadtest, to run the scripts without a MapR cluster.
+Plugs into executor.CommandExecutor as its runner. Keeps a model of volumes, tables and replicas,
+with simulated command latencies, failures and directcopy progress.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from threading import Lock
+from executor import CommandResult, get_operation
+
+# Median latency in seconds and spread (sigma of the log-normal distribution) of each operation
+g_default_latencies = {'volume create': (2.0, 0.5),
+                       'volume remove': (1.0, 0.5),
+                       'table create': (0.5, 0.5),
+                       'table delete': (0.3, 0.5),
+                       'table replica autosetup': (3.0, 0.6),
+                       'table replica list': (0.3, 0.4),
+                       'fs -ls': (0.8, 0.3),
+                       'loadtest': (1.0, 0.3)}
+
+
+class FakeReplica(object):
+    """
+    Replica of a fake table, copying its rows from the time it was set up
+    """
+
+    def __init__(self, table, path, cluster, is_multimaster, setup_at, rows_to_copy, idx):
+        # Replica table as given to autosetup, its key in the tables of the fake cluster
+        self.table = table
+        self.path = path
+        self.cluster = cluster
+        self.is_multimaster = is_multimaster
+        self.setup_at = setup_at
+        self.rows_to_copy = rows_to_copy
+        self.idx = idx
+        # Rows put on the source table after autosetup, replicated once the copy is done
+        self.rows_put = 0
+
+
+class FakeCluster(object):
+    """
+    Runs commands against the in-memory model. Thread safe.
+    """
+
+    def __init__(self, cluster_name="local", latencies=None, failure_rate=0.0, time_scale=1.0,
+                 copy_rows_per_sec=50000, replicate_rows_per_sec=20000, load_rows_per_sec=100000,
+                 row_size=100, capacity=None, seed=None):
+        """
+        :param cluster_name: name of the local cluster, replicas under /mapr/<other cluster> are remote
+        :param latencies: dict of operation to (median seconds, sigma), overrides g_default_latencies
+        :param failure_rate: fraction of commands failing with a simulated error
+        :param time_scale: multiplies all latencies and durations, e.g. 0.01 runs 100 times faster than a cluster
+        :param copy_rows_per_sec: directcopy speed of each replica
+        :param replicate_rows_per_sec: speed at which a copied replica catches up with new puts
+        :param load_rows_per_sec: loadtest speed, added to the loadtest latency
+        :param row_size: bytes per row, for bytesPending
+        :param capacity: number of commands the cluster serves without slowing down.
+                         Latencies grow in proportion beyond that (default = unlimited)
+        :param seed: seed of the random generator, for repeatable runs
+        """
+        self.cluster_name = cluster_name
+        self.latencies = dict(g_default_latencies)
+        self.latencies.update(latencies or {})
+        self.failure_rate = failure_rate
+        self.time_scale = time_scale
+        self.copy_rows_per_sec = copy_rows_per_sec
+        self.replicate_rows_per_sec = replicate_rows_per_sec
+        self.load_rows_per_sec = load_rows_per_sec
+        self.row_size = row_size
+        self.capacity = capacity
+        self.in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        # volume path -> volume name
+        self._volumes = {}
+        # table path -> number of rows
+        self._tables = {}
+        # source table path -> list of FakeReplica
+        self._replicas = {}
+        # directory -> set of paths directly under it, for listings
+        self._children = {}
+        self._start = time.time()
+
+    def now(self):
+        """
+        :return: simulated time in seconds since the cluster was created
+        """
+        return (time.time() - self._start) / self.time_scale
+
+    def _latency(self, operation):
+        median, sigma = self.latencies.get(operation, (0.1, 0.3))
+        with self._lock:
+            latency = median * math.exp(self._random.gauss(0.0, sigma))
+            is_failure = self._random.random() < self.failure_rate
+            if self.capacity is not None and self.in_flight > self.capacity:
+                latency *= float(self.in_flight) / self.capacity
+        return latency, is_failure
+
+    def run(self, argv):
+        """
+        Same as executor.run_command, against the model
+        :param argv: command as a list of arguments
+        :return: CommandResult
+        """
+        start = time.time()
+        operation = get_operation(argv)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            latency, is_failure = self._latency(operation)
+            if operation == 'loadtest':
+                latency += _get_option(argv, '-numrows', 0, int) / float(self.load_rows_per_sec)
+            time.sleep(latency * self.time_scale)
+            if is_failure:
+                returncode, stdout, stderr = 1, "", "ERROR (10003) : Simulated failure of " + operation
+            else:
+                returncode, stdout, stderr = self._execute(operation, argv)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return CommandResult(argv, returncode, stdout, stderr, time.time() - start)
+
+    def _execute(self, operation, argv):
+        handlers = {'volume create': self._volume_create,
+                    'volume remove': self._volume_remove,
+                    'table create': self._table_create,
+                    'table delete': self._table_delete,
+                    'table replica autosetup': self._replica_autosetup,
+                    'table replica list': self._replica_list,
+                    'fs -ls': self._fs_ls,
+                    'loadtest': self._loadtest}
+        handler = handlers.get(operation)
+        if handler is None:
+            return 127, "", "Not supported by the fake cluster: " + ' '.join(argv)
+        with self._lock:
+            return handler(argv)
+
+    def _exists(self, path):
+        path = path.rstrip('/') or '/'
+        return path == '/' or path in self._volumes or path in self._tables or path in self._children
+
+    def _add_path(self, path):
+        while path != '/':
+            parent = os.path.dirname(path)
+            children = self._children.setdefault(parent, set())
+            if path in children:
+                break
+            children.add(path)
+            path = parent
+
+    def _remove_path(self, path):
+        while path != '/':
+            parent = os.path.dirname(path)
+            children = self._children.get(parent)
+            if children is None:
+                break
+            children.discard(path)
+            if children or parent in self._volumes:
+                break
+            del self._children[parent]
+            path = parent
+
+    def _volume_create(self, argv):
+        name = _get_option(argv, '-name')
+        path = _get_option(argv, '-path')
+        if name in self._volumes.values():
+            return 1, "", "ERROR (10003) : Volume Name " + name + ", already in use"
+        if path in self._volumes or path in self._tables:
+            return 1, "", "ERROR (17) : Path " + path + " already exists"
+        if not self._exists(os.path.dirname(path)):
+            return 1, "", "ERROR (2) : No such file or directory: " + os.path.dirname(path)
+        self._volumes[path] = name
+        self._add_path(path)
+        return 0, "", ""
+
+    def _volume_remove(self, argv):
+        name = _get_option(argv, '-name')
+        paths = [path for path, vol_name in self._volumes.items() if vol_name == name]
+        if not paths:
+            return 1, "", "ERROR (10003) : Volume " + name + " does not exist"
+        prefix = paths[0] + '/'
+        removed = set(t for t in self._tables if t.startswith(prefix))
+        for table in removed:
+            del self._tables[table]
+            self._replicas.pop(table, None)
+            self._remove_path(table)
+        self._drop_replicas(removed)
+        del self._volumes[paths[0]]
+        self._remove_path(paths[0])
+        return 0, "", ""
+
+    def _table_create(self, argv):
+        path = _get_option(argv, '-path')
+        if path in self._tables or path in self._volumes:
+            return 1, "", "ERROR (17) : Table " + path + " already exists"
+        if not self._exists(os.path.dirname(path)):
+            return 1, "", "ERROR (2) : No such file or directory: " + os.path.dirname(path)
+        self._tables[path] = 0
+        self._add_path(path)
+        return 0, "", ""
+
+    def _table_delete(self, argv):
+        path = _get_option(argv, '-path')
+        if path not in self._tables:
+            return 1, "", "ERROR (2) : Table " + path + " does not exist"
+        del self._tables[path]
+        self._replicas.pop(path, None)
+        self._remove_path(path)
+        self._drop_replicas(set([path]))
+        return 0, "", ""
+
+    def _drop_replicas(self, removed_tables):
+        # Replicas whose table was removed are no longer listed by their source tables
+        for src_table, replicas in self._replicas.items():
+            self._replicas[src_table] = [replica for replica in replicas if replica.table not in removed_tables]
+
+    def _split_replica_path(self, repl_table):
+        if repl_table.startswith("/mapr/"):
+            parts = repl_table.split('/', 3)
+            return parts[2], "/" + (parts[3] if len(parts) > 3 else "")
+        return self.cluster_name, repl_table
+
+    def _replica_autosetup(self, argv):
+        src_table = _get_option(argv, '-path')
+        repl_table = _get_option(argv, '-replica')
+        if src_table not in self._tables:
+            return 1, "", "ERROR (2) : Table " + src_table + " does not exist"
+        if repl_table in self._tables:
+            return 1, "", "ERROR (17) : Table " + repl_table + " already exists"
+        cluster, path = self._split_replica_path(repl_table)
+        replicas = self._replicas.setdefault(src_table, [])
+        replicas.append(FakeReplica(repl_table, path, cluster, _get_option(argv, '-multimaster') == "true", self.now(),
+                                    self._tables[src_table], len(replicas)))
+        self._tables[repl_table] = 0
+        self._add_path(repl_table)
+        return 0, "", ""
+
+    def _replica_status(self, replica, now):
+        elapsed = max(0.0, now - replica.setup_at)
+        copy_time = replica.rows_to_copy / float(self.copy_rows_per_sec)
+        if replica.rows_to_copy == 0 or elapsed >= copy_time:
+            copy_percentage = 100
+            rows_copied = replica.rows_to_copy
+            replicated = int((elapsed - copy_time) * self.replicate_rows_per_sec)
+            rows_pending = max(0, replica.rows_put - replicated)
+        else:
+            copy_percentage = int(100 * elapsed / copy_time)
+            rows_copied = int(elapsed * self.copy_rows_per_sec)
+            rows_pending = replica.rows_put
+        now_ms = int((self._start + now * self.time_scale) * 1000)
+        pending_ts = now_ms if rows_pending else 0
+        return {'cluster': replica.cluster,
+                'table': replica.path,
+                'type': "MULTI_MASTER" if replica.is_multimaster else "MASTER_SLAVE",
+                'realTablePath': "/mapr/" + replica.cluster + replica.path,
+                'replicaState': "REPLICA_STATE_REPLICATING" if copy_percentage == 100 else
+                                "REPLICA_STATE_FULL_COPY",
+                'paused': False,
+                'throttle': False,
+                'idx': replica.idx,
+                'networkencryption': False,
+                'synchronous': False,
+                'networkcompression': "lz4",
+                'isUptodate': copy_percentage == 100 and rows_pending == 0,
+                'minPendingTS': pending_ts,
+                'maxPendingTS': pending_ts,
+                'bytesPending': (replica.rows_to_copy - rows_copied + rows_pending) * self.row_size,
+                'putsPending': rows_pending,
+                'bucketsPending': 1 if rows_pending else 0,
+                'uuid': "%016x" % (hash((replica.cluster, replica.path)) & 0xffffffffffffffff),
+                'copyTableCompletionPercentage': copy_percentage}
+
+    def _replica_list(self, argv):
+        src_table = _get_option(argv, '-path')
+        if src_table not in self._tables:
+            return 1, "", "ERROR (2) : Table " + src_table + " does not exist"
+        now = self.now()
+        list_of_data = [self._replica_status(replica, now) for replica in self._replicas.get(src_table, [])]
+        return 0, json.dumps({'timestamp': int(time.time() * 1000), 'status': "OK",
+                              'total': len(list_of_data), 'data': list_of_data}), ""
+
+    def _fs_ls(self, argv):
+        lines, errors = [], []
+        for path in argv[3:]:
+            path = path.rstrip('/') or '/'
+            if not self._exists(path):
+                errors.append("ls: `" + path + "': No such file or directory")
+                continue
+            children = self._children.get(path, ())
+            lines.append("Found " + str(len(children)) + " items")
+            for child in sorted(children):
+                kind = "tr--------" if child in self._tables else "drwxr-xr-x"
+                lines.append(kind + "   - mapr mapr          2 2016-10-01 12:00 " + child)
+        return 1 if errors else 0, "\n".join(lines) + ("\n" if lines else ""), "\n".join(errors)
+
+    def _loadtest(self, argv):
+        table = _get_option(argv, '-table')
+        if table not in self._tables:
+            return 1, "", "Table " + table + " does not exist"
+        num_rows = _get_option(argv, '-numrows', 0, int)
+        self._tables[table] += num_rows
+        for replica in self._replicas.get(table, []):
+            replica.rows_put += num_rows
+        return 0, "Inserted " + str(num_rows) + " rows into " + table + "\n", ""
+
+    def summary(self):
+        """
+        :return: number of volumes, tables and replicas in the model
+        """
+        with self._lock:
+            return {'volumes': len(self._volumes), 'tables': len(self._tables),
+                    'replicas': sum(len(replicas) for replicas in self._replicas.values())}
+
+
+def _get_option(argv, option, default=None, option_type=str):
+    try:
+        return option_type(argv[argv.index(option) + 1])
+    except (ValueError, IndexError):
+        return default
@@ -0,0 +1,370 @@
+#!/usr/bin/python
+
+"""
+Coordinator / agent mode: the coordinator keeps one global queue of table operations and hands them out
+to agents on several client nodes, which run them with the usual utils.py functions and report back.
+Agents connect to the coordinator over TCP and exchange one JSON object per line.
+Each agent connection (slot) runs one operation at a time, and pulls the next one when done.
+"""
+
+import json
+import logging
+import os
+import pipes
+import socket
+import subprocess
+import time
+import Queue
+import SocketServer
+from threading import Thread, Condition
+import executor
+import metrics
+import utils
+
+# Operations agents can run, name -> utils.py function
+g_operations = {'create_volume': utils.create_single_volume,
+                'create_table': utils.create_single_table,
+                'load_table': utils.load_table,
+                'autosetup_replica': utils.autosetup_single_replica}
+# Operations handed out first. Later steps of a table go before the first step of other tables,
+# so that tables move through create, load and autosetup while other tables are being created.
+g_priorities = {'autosetup_replica': 0,
+                'load_table': 1,
+                'create_table': 2,
+                'create_volume': 3}
+
+
+class Task(object):
+    """
+    One operation in the global queue
+    """
+
+    def __init__(self, task_id, op, args, on_done=None):
+        """
+        :param task_id: unique id
+        :param op: key of g_operations
+        :param args: list of arguments of the operation, must be JSON serializable
+        :param on_done: optional function called with (task, result dict) once the task is done
+        """
+        self.task_id = task_id
+        self.op = op
+        self.args = args
+        self.on_done = on_done
+        self.attempts = 0
+        self.sent_at = None
+
+
+def _send(wfile, message):
+    wfile.write(json.dumps(message) + "\n")
+    wfile.flush()
+
+
+def _receive(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def _encode_value(value):
+    if isinstance(value, executor.CommandResult):
+        return {'returncode': value.returncode, 'wall_time': value.wall_time, 'stderr': value.stderr[-2000:]}
+    return value
+
+
+def is_result_ok(result):
+    """
+    :param result: result dict reported by an agent
+    :return: True if the operation ran and its command succeeded (or was already done)
+    """
+    if not result.get('ok'):
+        return False
+    value = result.get('value')
+    if isinstance(value, dict) and 'returncode' in value:
+        return value['returncode'] == 0 or "already" in value.get('stderr', '').lower()
+    return True
+
+
+class _ThreadingTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator(object):
+    """
+    Global work queue served to agents
+    """
+
+    def __init__(self, address=('', 0), max_attempts=3, registry=None):
+        """
+        :param address: (host, port) to listen on, port 0 picks a free port
+        :param max_attempts: times a task is handed out again after its agent disconnected
+        :param registry: metrics.MetricsRegistry recording "fanout <op>" latencies (default = metrics.g_registry)
+        """
+        self.max_attempts = max_attempts
+        self.registry = registry if registry is not None else metrics.g_registry
+        # (priority, task id, task): earlier steps of the pipeline of a table wait behind later ones
+        self._queue = Queue.PriorityQueue()
+        self._cond = Condition()
+        self._outstanding = 0
+        self._next_id = 0
+        self._closing = False
+        self.agents = set()
+        # Number of agent connections open right now, and since when it is 0
+        self.connected = 0
+        self._idle_since = time.time()
+        coordinator = self
+
+        class AgentHandler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                coordinator._serve_agent(self.rfile, self.wfile, self.client_address)
+
+        self._server = _ThreadingTCPServer(address, AgentHandler)
+        self.address = self._server.server_address
+        self._thread = Thread(target=self._server.serve_forever, name="fanout-coordinator")
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info("Coordinator listening on port " + str(self.address[1]))
+
+    def submit(self, op, args, on_done=None):
+        """
+        Adds an operation to the global queue
+        :param op: key of g_operations
+        :param args: list of arguments
+        :param on_done: optional function called with (task, result dict), may submit more tasks
+        :return: Task
+        """
+        with self._cond:
+            self._next_id += 1
+            task = Task(self._next_id, op, args, on_done)
+            self._outstanding += 1
+        self._put(task)
+        return task
+
+    def _put(self, task):
+        self._queue.put((g_priorities.get(task.op, len(g_priorities)), task.task_id, task))
+
+    def wait(self, agents=None, connect_timeout=60):
+        """
+        Blocks till every submitted task, and every task they submitted, is done.
+        Gives up, failing the remaining tasks, when no agent is connected and either none of the agents
+        is running anymore or none has been connected for connect_timeout seconds.
+        :param agents: output of start_agents, to check that they are still running (default = not checked)
+        :param connect_timeout: seconds to wait without any agent connected
+        :return: True if every task was handed out and completed, False if tasks were failed
+        """
+        while True:
+            with self._cond:
+                if self._outstanding == 0:
+                    return True
+                self._cond.wait(1.0)
+                if self._outstanding == 0:
+                    return True
+                if self.connected > 0:
+                    continue
+                idle_time = time.time() - self._idle_since
+            if agents is not None and not agents_alive(agents):
+                reason = "all agents exited"
+            elif idle_time >= connect_timeout:
+                reason = "no agent connected for " + str(int(idle_time)) + "s"
+            else:
+                continue
+            self._fail_queued(reason)
+            return False
+
+    def _fail_queued(self, reason):
+        logging.error("Failing the remaining tasks: " + reason)
+        while True:
+            try:
+                _, _, task = self._queue.get_nowait()
+            except Queue.Empty:
+                break
+            self._complete(task, {'id': task.task_id, 'ok': False, 'error': reason})
+
+    def shutdown(self):
+        """
+        Tells the agents to exit once they ask for more work, and stops listening
+        :return: None
+        """
+        with self._cond:
+            self._closing = True
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_task(self):
+        while True:
+            with self._cond:
+                if self._closing:
+                    return None
+            try:
+                return self._queue.get(timeout=0.5)[2]
+            except Queue.Empty:
+                continue
+
+    def _complete(self, task, result):
+        if task.sent_at is not None:
+            self.registry.record("fanout " + task.op, time.time() - task.sent_at, is_result_ok(result))
+        if task.on_done is not None:
+            try:
+                task.on_done(task, result)
+            except Exception:
+                logging.exception("Callback failed for task " + task.op + " " + str(task.args))
+        with self._cond:
+            self._outstanding -= 1
+            self._cond.notify_all()
+
+    def _retry_or_fail(self, task, reason):
+        if task.attempts < self.max_attempts:
+            logging.warning("Handing out " + task.op + " " + str(task.args) + " again: " + reason)
+            self._put(task)
+        else:
+            self._complete(task, {'id': task.task_id, 'ok': False, 'error': reason})
+
+    def _serve_agent(self, rfile, wfile, client_address):
+        hello = _receive(rfile)
+        agent = (hello or {}).get('agent', str(client_address))
+        with self._cond:
+            self.agents.add(agent)
+            self.connected += 1
+        logging.debug("Agent connected: " + agent)
+        try:
+            self._serve_tasks(agent, rfile, wfile)
+        finally:
+            with self._cond:
+                self.connected -= 1
+                if self.connected == 0:
+                    self._idle_since = time.time()
+                self._cond.notify_all()
+
+    def _serve_tasks(self, agent, rfile, wfile):
+        while True:
+            task = self._next_task()
+            if task is None:
+                try:
+                    _send(wfile, {'type': 'exit'})
+                except socket.error:
+                    pass
+                return
+            task.attempts += 1
+            task.sent_at = time.time()
+            try:
+                _send(wfile, {'type': 'task', 'id': task.task_id, 'op': task.op, 'args': task.args})
+                result = _receive(rfile)
+            except (socket.error, ValueError):
+                result = None
+            if result is None:
+                self._retry_or_fail(task, "agent " + agent + " disconnected")
+                return
+            result['agent'] = agent
+            self._complete(task, result)
+
+
+def _agent_loop(host, port, name):
+    sock = socket.create_connection((host, port))
+    rfile = sock.makefile('rb')
+    wfile = sock.makefile('wb')
+    try:
+        _send(wfile, {'type': 'hello', 'agent': name})
+        while True:
+            message = _receive(rfile)
+            if message is None or message.get('type') == 'exit':
+                return
+            result = {'id': message['id'], 'ok': True}
+            func = g_operations.get(message['op'])
+            try:
+                if func is None:
+                    raise ValueError("Unknown operation: " + str(message['op']))
+                result['value'] = _encode_value(func(*message['args']))
+            except Exception as e:
+                logging.exception("Task failed: " + str(message['op']) + " " + str(message['args']))
+                result['ok'] = False
+                result['error'] = str(e)
+            _send(wfile, result)
+    finally:
+        sock.close()
+
+
+def run_agent(host, port, slots=1, name=None):
+    """
+    Runs operations handed out by a coordinator till it says to exit
+    :param host: coordinator host
+    :param port: coordinator port
+    :param slots: number of operations run at the same time
+    :param name: name of this agent in the coordinator logs (default = host name and process id)
+    :return: None
+    """
+    if name is None:
+        name = socket.gethostname() + ":" + str(os.getpid())
+    threads = [Thread(target=_agent_loop, args=(host, port, name + "/" + str(i)), name="agent-" + str(i))
+               for i in xrange(0, slots)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        # Joining with a timeout keeps the main thread responsive to Ctrl-C
+        while thread.is_alive():
+            thread.join(1.0)
+
+
+def start_agents(hosts, coordinator_host, coordinator_port, slots, remote_dir, global_args=None):
+    """
+    Starts agents on the given hosts. "local" starts agent threads in this process, sharing its executor,
+    which stands in for a remote node when testing. Other hosts are reached with ssh and run
+    "replication.py agent" from remote_dir.
+    :param hosts: list of host names
+    :param coordinator_host: address of the coordinator, as seen from the agents
+    :param coordinator_port: port of the coordinator
+    :param slots: operations run at the same time by each agent
+    :param remote_dir: directory of replication.py on the remote hosts
+    :param global_args: replication.py options given before "agent" on the remote hosts, so that remote agents
+                        run with the same settings as local ones, e.g. ["-statedb", "state.db"]
+    :return: list of ssh processes and local threads, pass it to wait_agents
+    """
+    agents = []
+    for host in hosts:
+        if host == "local":
+            thread = Thread(target=run_agent, args=("localhost", coordinator_port, slots, "local"),
+                            name="local-agent")
+            thread.daemon = True
+            thread.start()
+            agents.append(thread)
+            continue
+        remote_argv = ["python", "replication.py"] + list(global_args or []) + \
+                      ["agent", "-connect", coordinator_host + ":" + str(coordinator_port), "-slots", str(slots)]
+        remote_cmd = "cd " + pipes.quote(remote_dir) + " && " + ' '.join(pipes.quote(arg) for arg in remote_argv)
+        logging.info("ssh " + host + " " + remote_cmd)
+        agents.append(subprocess.Popen(["ssh", "-o", "BatchMode=yes", host, remote_cmd], close_fds=True))
+    return agents
+
+
+def agents_alive(agents):
+    """
+    :param agents: output of start_agents
+    :return: True if at least one of the agents is still running
+    """
+    for agent in agents:
+        if isinstance(agent, Thread):
+            if agent.is_alive():
+                return True
+        elif agent.poll() is None:
+            return True
+    return False
+
+
+def wait_agents(agents, timeout=30):
+    """
+    Waits for agents to exit after the coordinator shut down
+    :param agents: output of start_agents
+    :param timeout: seconds to wait before killing the remaining ssh processes
+    :return: None
+    """
+    deadline = time.time() + timeout
+    for agent in agents:
+        if isinstance(agent, Thread):
+            agent.join(max(0.0, deadline - time.time()))
+            continue
+        while agent.poll() is None and time.time() < deadline:
+            time.sleep(0.2)
+        if agent.poll() is None:
+            logging.warning("Killing agent process " + str(agent.pid))
+            agent.kill()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+"""
+In-process cache of the tables in each volume, so that repeated lookups
+do not have to start a new "hadoop fs -ls" every time.
+"""
+
+import os
+import time
+from threading import Lock
+
+
+class TableInventory(object):
+    """
+    Tables per volume (directory), with a time to live.
+    Kept up to date by the create / delete helpers in utils.py.
+    """
+
+    def __init__(self, ttl=300):
+        """
+        :param ttl: seconds after which a cached listing is considered stale (None: never)
+        """
+        self.ttl = ttl
+        self._lock = Lock()
+        # volume path -> (time of listing, set of table paths)
+        self._tables = {}
+        # volume path -> number of changes seen, used to drop listings that raced with a change
+        self._generation = {}
+
+    @staticmethod
+    def _key(volume_path):
+        return volume_path.rstrip('/') or '/'
+
+    def generation(self, volume_path):
+        """
+        :param volume_path: volume path
+        :return: change counter of the volume, to be passed back to put()
+        """
+        with self._lock:
+            return self._generation.get(self._key(volume_path), 0)
+
+    def get(self, volume_path):
+        """
+        :param volume_path: volume path
+        :return: sorted list of tables, or None if the volume is not cached or the entry expired
+        """
+        key = self._key(volume_path)
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self._tables[key]
+                return None
+            return sorted(entry[1])
+
+    def put(self, volume_path, list_of_tables, generation=None):
+        """
+        Stores a full listing of a volume
+        :param volume_path: volume path
+        :param list_of_tables: all tables in the volume
+        :param generation: value of generation() taken before listing. If the volume
+                           changed since then, the listing is stale and is dropped.
+        :return: None
+        """
+        key = self._key(volume_path)
+        with self._lock:
+            if generation is not None and generation != self._generation.get(key, 0):
+                return
+            self._tables[key] = (time.time(), set(list_of_tables))
+
+    def add_table(self, table_path):
+        """
+        Records a table created by us. Volumes that are not cached are left alone.
+        :param table_path: table path
+        :return: None
+        """
+        key = self._key(os.path.dirname(table_path))
+        with self._lock:
+            self._generation[key] = self._generation.get(key, 0) + 1
+            if key in self._tables:
+                self._tables[key][1].add(table_path)
+
+    def remove_table(self, table_path):
+        """
+        Records a table deleted by us
+        :param table_path: table path
+        :return: None
+        """
+        key = self._key(os.path.dirname(table_path))
+        with self._lock:
+            self._generation[key] = self._generation.get(key, 0) + 1
+            if key in self._tables:
+                self._tables[key][1].discard(table_path)
+
+    def invalidate(self, volume_path=None):
+        """
+        Drops the cached listing of a volume, or of all volumes
+        :param volume_path: volume path (default = all volumes)
+        :return: None
+        """
+        with self._lock:
+            if volume_path is None:
+                for key in self._tables:
+                    self._generation[key] = self._generation.get(key, 0) + 1
+                self._tables.clear()
+                return
+            key = self._key(volume_path)
+            self._generation[key] = self._generation.get(key, 0) + 1
+            self._tables.pop(key, None)
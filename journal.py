@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+"""
+Append-only journal of completed steps of a stress run,
+used to resume a run that was interrupted.
+"""
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+
+
+def rotate(path):
+    """
+    Renames a journal to path.YYYYmmdd-HHMMSS, with a counter appended if that name is taken
+    :param path: journal file
+    :return: new path
+    """
+    rotated = path + "." + time.strftime("%Y%m%d-%H%M%S", time.localtime(os.path.getmtime(path)))
+    candidate, count = rotated, 1
+    while os.path.exists(candidate):
+        candidate = rotated + "." + str(count)
+        count += 1
+    os.rename(path, candidate)
+    return candidate
+
+
+class Journal(object):
+    """
+    Each line is a JSON object describing one completed step, e.g.
+    {"obj": "/dbvolume00001/srctable00001", "step": "loaded", "time": 1475280000.0}
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        :param path: journal file
+        :param resume: keep the steps already in the file. Otherwise a non empty file is moved aside
+                       (see rotate) and the run starts a new one.
+        """
+        self.path = path
+        self._lock = Lock()
+        self._done = set()
+        if resume is True and os.path.exists(path):
+            self._load()
+            logging.info("Resuming from journal " + path + " with " + str(len(self._done)) + " completed steps")
+        elif os.path.exists(path) and os.path.getsize(path) > 0:
+            logging.info("Moved journal of a previous run to " + rotate(path))
+        self._file = open(path, 'a')
+
+    def _load(self):
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line may be cut short if the run was killed while writing it
+                    logging.warning("Skipping incomplete journal line: " + line.strip())
+                    continue
+                self._done.add((entry['obj'], entry['step'], entry.get('detail')))
+
+    def is_done(self, obj, step, detail=None):
+        """
+        :param obj: volume or table path
+        :param step: name of the step
+        :param detail: extra key of the step, e.g. replica path
+        :return: True if the step was recorded as completed
+        """
+        with self._lock:
+            return (obj, step, detail) in self._done
+
+    def record(self, obj, step, detail=None):
+        """
+        Appends a completed step to the journal
+        :param obj: volume or table path
+        :param step: name of the step
+        :param detail: extra key of the step, e.g. replica path
+        :return: None
+        """
+        entry = {'obj': obj, 'step': step, 'time': time.time()}
+        if detail is not None:
+            entry['detail'] = detail
+        with self._lock:
+            self._done.add((obj, step, detail))
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
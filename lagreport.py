@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+"""
+Aggregation of replica lag (bytesPending, putsPending) across polls, to find the volumes, tables,
+replica types and replicas holding back catch-up.
+"""
+
+import time
+from collections import deque
+from threading import Lock
+import utils
+
+
+def get_volume(src_table):
+    return src_table.rsplit('/', 1)[0] or '/'
+
+
+class ReplicaLag(object):
+    """
+    Latest lag samples of one replica
+    """
+
+    def __init__(self, src_table, cluster, replica, replica_type, window):
+        self.src_table = src_table
+        self.cluster = cluster
+        self.replica = replica
+        self.replica_type = replica_type
+        # (timestamp, bytesPending, putsPending), oldest first
+        self.samples = deque(maxlen=window)
+        # Number of consecutive polls in which the lag grew
+        self.growing_polls = 0
+
+    def add(self, timestamp, bytes_pending, puts_pending):
+        if self.samples:
+            _, last_bytes, last_puts = self.samples[-1]
+            grew = bytes_pending > last_bytes or puts_pending > last_puts
+            shrank = bytes_pending < last_bytes or puts_pending < last_puts
+            if grew and not shrank:
+                self.growing_polls += 1
+            elif shrank:
+                self.growing_polls = 0
+        self.samples.append((timestamp, bytes_pending, puts_pending))
+
+    def latest(self):
+        return self.samples[-1][1:] if self.samples else (0, 0)
+
+    def growth_rate(self):
+        """
+        :return: (bytesPending, putsPending) growth per second over the retained samples, negative if shrinking
+        """
+        if len(self.samples) < 2 or self.samples[-1][0] <= self.samples[0][0]:
+            return 0.0, 0.0
+        first, last = self.samples[0], self.samples[-1]
+        elapsed = last[0] - first[0]
+        return (last[1] - first[1]) / elapsed, (last[2] - first[2]) / elapsed
+
+
+class LagAggregator(object):
+    """
+    Thread safe collection of ReplicaLag, fed with "maprcli table replica list" results
+    """
+
+    def __init__(self, window=10, growing_polls=3):
+        """
+        :param window: number of latest polls kept per replica to compute growth rates
+        :param growing_polls: flag replicas whose lag grew in at least these many consecutive polls
+        """
+        self.window = window
+        self.growing_polls = growing_polls
+        self._lock = Lock()
+        self._replicas = {}
+
+    def add(self, src_table, list_of_data, timestamp=None):
+        """
+        :param src_table: source table path
+        :param list_of_data: replica entries of the table from a poll
+        :param timestamp: time of the poll (default = time.time())
+        :return: None
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for data in list_of_data:
+                key = (src_table, data.get('cluster'), data.get('table'))
+                lag = self._replicas.get(key)
+                if lag is None:
+                    lag = ReplicaLag(src_table, data.get('cluster'), data.get('table'), data.get('type'),
+                                     self.window)
+                    self._replicas[key] = lag
+                lag.add(timestamp,
+                        utils.get_replica_field(data, 'bytesPending') or 0,
+                        utils.get_replica_field(data, 'putsPending') or 0)
+
+    def rank(self, get_group, by_growth=False):
+        """
+        :param get_group: function returning the group of a ReplicaLag, e.g. its volume
+        :param by_growth: rank by growth rate instead of current lag
+        :return: list of dicts (group, replicas, bytes_pending, puts_pending, bytes_rate, puts_rate),
+                 largest bytes_pending (or bytes_rate) first
+        """
+        groups = {}
+        with self._lock:
+            for lag in self._replicas.values():
+                bytes_pending, puts_pending = lag.latest()
+                bytes_rate, puts_rate = lag.growth_rate()
+                totals = groups.setdefault(get_group(lag), [0, 0, 0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += bytes_pending
+                totals[2] += puts_pending
+                totals[3] += bytes_rate
+                totals[4] += puts_rate
+        ranked = [{'group': group, 'replicas': totals[0], 'bytes_pending': totals[1], 'puts_pending': totals[2],
+                   'bytes_rate': totals[3], 'puts_rate': totals[4]} for group, totals in groups.items()]
+        if by_growth is True:
+            return sorted(ranked, key=lambda row: (-row['bytes_rate'], -row['puts_rate'], str(row['group'])))
+        return sorted(ranked, key=lambda row: (-row['bytes_pending'], -row['puts_pending'], str(row['group'])))
+
+    def growing_replicas(self):
+        """
+        :return: list of ReplicaLag whose lag kept growing, longest growing first
+        """
+        with self._lock:
+            growing = [lag for lag in self._replicas.values() if lag.growing_polls >= self.growing_polls]
+        return sorted(growing, key=lambda lag: (-lag.growing_polls, -lag.latest()[0]))
+
+    def report(self, top=10):
+        """
+        :param top: number of entries shown in each ranking
+        :return: human readable rankings of volumes, tables, replica types and replicas
+        """
+        lines = []
+        get_replica = lambda lag: lag.src_table + " -> " + str(lag.cluster) + ":" + str(lag.replica)
+        for title, get_group, by_growth in (("volume", lambda lag: get_volume(lag.src_table), False),
+                                            ("table", lambda lag: lag.src_table, False),
+                                            ("replica type", lambda lag: lag.replica_type, False),
+                                            ("replica", get_replica, False),
+                                            ("growing volume", lambda lag: get_volume(lag.src_table), True),
+                                            ("growing replica", get_replica, True)):
+            lines.append("%-60s %8s %14s %12s %12s %10s" % ("top " + title, "replicas", "bytesPending",
+                                                            "putsPending", "bytes/s", "puts/s"))
+            for row in self.rank(get_group, by_growth)[:top]:
+                lines.append("%-60s %8d %14d %12d %12.1f %10.1f" % (str(row['group']), row['replicas'],
+                                                                    row['bytes_pending'], row['puts_pending'],
+                                                                    row['bytes_rate'], row['puts_rate']))
+            lines.append("")
+
+        growing = self.growing_replicas()
+        lines.append(str(len(growing)) + " replicas with lag growing for " + str(self.growing_polls) +
+                     " or more consecutive polls")
+        for lag in growing[:top]:
+            bytes_pending, puts_pending = lag.latest()
+            lines.append("sourceTable: " + lag.src_table + ", cluster: " + str(lag.cluster) +
+                         ", table: " + str(lag.replica) + ", polls: " + str(lag.growing_polls) +
+                         ", bytesPending: " + str(bytes_pending) + ", putsPending: " + str(puts_pending))
+        return "\n".join(lines)
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+
+"""
+Runs loadtest processes on a pool sized from the CPUs this process may use.
+Each process gets its own set of CPUs, is pinned to it with taskset when available,
+and its CPU time and peak RSS are collected with wait4.
+"""
+
+import logging
+import os
+import subprocess
+import time
+import Queue
+from threading import Thread, Lock
+from executor import CommandResult, get_operation
+import metrics
+
+
+def parse_cpu_list(cpu_list):
+    """
+    :param cpu_list: CPU list in the kernel format, e.g. "0-3,8,10-11"
+    :return: sorted list of CPU numbers
+    """
+    cpus = set()
+    for part in cpu_list.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(xrange(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def get_available_cpus():
+    """
+    :return: list of CPUs this process is allowed to run on
+    """
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("Cpus_allowed_list:"):
+                    return parse_cpu_list(line.split(':', 1)[1])
+    except IOError:
+        pass
+    import multiprocessing
+    return range(0, multiprocessing.cpu_count())
+
+
+def _find_taskset():
+    for directory in os.environ.get("PATH", "").split(os.pathsep) + ["/usr/bin", "/bin"]:
+        path = os.path.join(directory, "taskset")
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+class ProcessStats(object):
+    """
+    Resource usage of one finished process
+    """
+
+    def __init__(self, argv, cpus, wall_time, cpu_time, max_rss_kb, returncode):
+        self.argv = argv
+        self.cpus = cpus
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.max_rss_kb = max_rss_kb
+        self.returncode = returncode
+
+    def cpu_utilization(self):
+        """
+        :return: CPU time over wall time, e.g. 2.0 for a process keeping two cores busy
+        """
+        return self.cpu_time / self.wall_time if self.wall_time > 0 else 0.0
+
+
+class LoadRunner(object):
+    """
+    Pool of CPU sets. A command waits for a free set, runs pinned to it, and gives it back.
+    """
+
+    def __init__(self, cpus_per_process=1, max_processes=None, pin=True, cpus=None, registry=None):
+        """
+        :param cpus_per_process: CPUs given to each process
+        :param max_processes: upper bound on the number of processes (default = as many as the CPUs allow)
+        :param pin: pin each process to its CPUs with taskset, if taskset is installed
+        :param cpus: CPUs to use (default = all CPUs this process may run on)
+        :param registry: metrics.MetricsRegistry recording every command (default = metrics.g_registry)
+        """
+        cpus = list(cpus) if cpus is not None else get_available_cpus()
+        cpus_per_process = max(1, min(cpus_per_process, len(cpus)))
+        cpu_sets = [cpus[i:i + cpus_per_process] for i in xrange(0, len(cpus) - cpus_per_process + 1,
+                                                                 cpus_per_process)]
+        if max_processes is not None:
+            cpu_sets = cpu_sets[:max(1, max_processes)]
+        self.num_slots = len(cpu_sets)
+        self.registry = registry if registry is not None else metrics.g_registry
+        self.taskset = _find_taskset() if pin is True else None
+        if pin is True and self.taskset is None:
+            logging.warning("taskset not found, loadtest processes will not be pinned")
+        self._free_sets = Queue.Queue()
+        for cpu_set in cpu_sets:
+            self._free_sets.put(cpu_set)
+        self._lock = Lock()
+        self.stats = []
+        logging.info("Load runner: " + str(self.num_slots) + " processes of " + str(cpus_per_process) +
+                     " CPUs each")
+
+    def run(self, argv):
+        """
+        Runs a command on a free CPU set and waits for it
+        :param argv: command as a list of arguments
+        :return: CommandResult
+        """
+        cpu_set = self._free_sets.get()
+        try:
+            return self._run_on(argv, cpu_set)
+        finally:
+            self._free_sets.put(cpu_set)
+
+    def _run_on(self, argv, cpu_set):
+        full_argv = argv
+        if self.taskset is not None:
+            full_argv = [self.taskset, "-c", ",".join(str(cpu) for cpu in cpu_set)] + argv
+        logging.info(' '.join(full_argv))
+        start = time.time()
+        try:
+            proc = subprocess.Popen(full_argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+        except OSError as e:
+            result = CommandResult(argv, 127, "", str(e), time.time() - start)
+            self.registry.record(get_operation(argv), result.wall_time, False)
+            return result
+
+        # stderr is drained by a thread, so that neither pipe can fill up and block the process
+        stderr_chunks = []
+        stderr_thread = Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+        stderr_thread.daemon = True
+        stderr_thread.start()
+        stdout = proc.stdout.read()
+        stderr_thread.join()
+        # wait4 instead of proc.wait(), to get the resource usage of this very process
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status)
+        wall_time = time.time() - start
+
+        result = CommandResult(argv, proc.returncode, stdout, "".join(stderr_chunks), wall_time)
+        stats = ProcessStats(argv, cpu_set, wall_time, rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss,
+                             proc.returncode)
+        with self._lock:
+            self.stats.append(stats)
+        self.registry.record(get_operation(argv), wall_time, result.ok)
+        logging.debug("Process on CPUs " + str(cpu_set) + ": %.2fs wall, %.2fs CPU, %d KB max RSS" %
+                      (wall_time, stats.cpu_time, stats.max_rss_kb))
+        if not result.ok:
+            logging.error("Command failed (" + str(result.returncode) + "): " + ' '.join(argv))
+            if result.stderr:
+                logging.error(result.stderr.strip())
+        return result
+
+    def summary(self):
+        """
+        :return: human readable resource usage of the processes run so far
+        """
+        with self._lock:
+            stats = list(self.stats)
+        if not stats:
+            return "load runner: no processes"
+        utilization = [s.cpu_utilization() for s in stats]
+        return "load runner: %d processes on %d slots, CPU time %.1fs (mean %.2fs), " \
+               "CPU utilization mean %.2f max %.2f, max RSS %d KB" % (
+                   len(stats), self.num_slots, sum(s.cpu_time for s in stats),
+                   sum(s.cpu_time for s in stats) / len(stats),
+                   sum(utilization) / len(utilization), max(utilization), max(s.max_rss_kb for s in stats))
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+
+"""
+Throughput of loadtest runs: rows written, elapsed time, rows/sec and errors per table,
+parsed from the loadtest output and aggregated over a run.
+Only whole summary lines of the forms in the patterns below are read, and durations need a unit.
+Values missing from the output are taken from the command (requested rows, wall time),
+and every result says where its rows and elapsed time come from, so that derived throughput
+is not reported as measured.
+"""
+
+import logging
+import re
+import time
+from threading import Lock
+import metrics
+
+# Summary lines of loadtest, e.g. "Inserted 100000 rows into /vol/t", "Total puts: 100000",
+# "Elapsed time: 12.5 s", "Put rate: 8000.0 rows/sec", "Failed puts: 0", "Average latency: 1.2 ms"
+_ROWS_PATTERNS = [re.compile(r'^\s*(?:inserted|wrote|put)\s+(\d+)\s+(?:rows|records|puts)\b', re.I | re.M),
+                  re.compile(r'^\s*(?:total\s+)?(?:rows|records|puts)(?:\s+(?:written|inserted|put))?\s*[:=]\s*'
+                             r'(\d+)\s*$', re.I | re.M)]
+_ELAPSED_PATTERNS = [re.compile(r'^\s*(?:elapsed(?:\s+time)?|time\s+taken|total\s+time)\s*[:=]\s*([\d.]+)\s*'
+                                r'(ms|msec|milliseconds|s|sec|secs|seconds)\s*$', re.I | re.M)]
+_RATE_PATTERNS = [re.compile(r'^\s*(?:put\s+)?(?:rate|throughput)\s*[:=]\s*([\d.]+)\s*(?:rows|records|puts)\s*/\s*'
+                             r'(?:s|sec|second)\s*$', re.I | re.M)]
+_ERROR_PATTERNS = [re.compile(r'^\s*(?:errors|failures|failed\s+puts)\s*[:=]\s*(\d+)\s*$', re.I | re.M)]
+_LATENCY_PATTERNS = [re.compile(r'^\s*(?:avg|average|mean)\s+latency\s*[:=]\s*([\d.]+)\s*(us|ms|s)\s*$',
+                                re.I | re.M)]
+
+_TIME_UNITS = {'ms': 0.001, 'msec': 0.001, 'milliseconds': 0.001, 'us': 0.000001}
+
+# Where the rows of a LoadResult come from
+ROWS_FROM_OUTPUT = "output"
+ROWS_REQUESTED = "requested"
+ROWS_COUNTED = "counted"
+# Where its elapsed time comes from
+ELAPSED_FROM_OUTPUT = "output"
+ELAPSED_FROM_RATE = "rate"
+ELAPSED_WALL_TIME = "wall_time"
+
+# The patterns above were not checked against the output of every loadtest version:
+# the first load whose output they do not match is reported, once per run
+g_warned_unmatched = False
+_warned_lock = Lock()
+
+
+def _last_match(patterns, text):
+    # Summaries come at the end of the output, so the last match wins
+    found = None
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            if found is None or match.start() >= found.start():
+                found = match
+    return found
+
+
+def _seconds(value, unit):
+    return float(value) * _TIME_UNITS.get(unit.lower(), 1.0)
+
+
+def parse_loadtest_output(output):
+    """
+    :param output: stdout and stderr of loadtest
+    :return: dict with the values found among rows, elapsed (seconds), rows_per_sec, errors, mean_latency (seconds)
+    """
+    parsed = {}
+    match = _last_match(_ROWS_PATTERNS, output)
+    if match is not None:
+        parsed['rows'] = int(match.group(1))
+    match = _last_match(_ELAPSED_PATTERNS, output)
+    if match is not None:
+        parsed['elapsed'] = _seconds(match.group(1), match.group(2))
+    match = _last_match(_RATE_PATTERNS, output)
+    if match is not None:
+        parsed['rows_per_sec'] = float(match.group(1))
+    match = _last_match(_ERROR_PATTERNS, output)
+    if match is not None:
+        parsed['errors'] = int(match.group(1))
+    match = _last_match(_LATENCY_PATTERNS, output)
+    if match is not None:
+        parsed['mean_latency'] = _seconds(match.group(1), match.group(2))
+    return parsed
+
+
+class LoadResult(object):
+    """
+    Outcome of one load of a table
+    """
+
+    def __init__(self, table, rows, elapsed, errors, ok, rows_source, elapsed_source, mean_latency=None,
+                 end_time=None):
+        """
+        :param table: table path
+        :param rows: rows written
+        :param elapsed: seconds taken
+        :param errors: number of failed puts (1 if the command failed without reporting a count)
+        :param ok: whether the load succeeded
+        :param rows_source: ROWS_FROM_OUTPUT, ROWS_COUNTED (by the in-process loader) or
+                            ROWS_REQUESTED (-numrows, assumed written because the command succeeded)
+        :param elapsed_source: ELAPSED_FROM_OUTPUT, ELAPSED_FROM_RATE (rows / reported rate) or ELAPSED_WALL_TIME
+        :param mean_latency: mean put latency in seconds, if reported
+        :param end_time: time the load finished (default = time.time())
+        """
+        self.table = table
+        self.rows = rows
+        self.elapsed = elapsed
+        self.errors = errors
+        self.ok = ok
+        self.rows_source = rows_source
+        self.elapsed_source = elapsed_source
+        self.mean_latency = mean_latency
+        self.end_time = end_time if end_time is not None else time.time()
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def is_measured(self):
+        """
+        :return: True if the rows written were reported or counted, rather than assumed from the request
+        """
+        return self.rows_source != ROWS_REQUESTED
+
+    def to_dict(self):
+        return {'table': self.table, 'rows': self.rows, 'elapsed': self.elapsed, 'rows_per_sec': self.rows_per_sec,
+                'errors': self.errors, 'ok': self.ok, 'mean_latency': self.mean_latency,
+                'rows_source': self.rows_source, 'elapsed_source': self.elapsed_source}
+
+
+def _warn_unmatched(table, result):
+    global g_warned_unmatched
+    with _warned_lock:
+        if g_warned_unmatched is True:
+            return
+        g_warned_unmatched = True
+    logging.warning("No rows written found in the loadtest output of " + table + ", rows/sec of such loads are " +
+                    "assumed from -numrows and the command time, and not counted as measured. Output: " +
+                    (result.stdout + result.stderr).strip()[-500:])
+
+
+def make_load_result(table, num_rows, result):
+    """
+    :param table: table path
+    :param num_rows: rows requested from loadtest
+    :param result: executor.CommandResult of loadtest
+    :return: LoadResult
+    """
+    parsed = parse_loadtest_output(result.stdout + "\n" + result.stderr)
+    rows, rows_source = parsed.get('rows'), ROWS_FROM_OUTPUT
+    if rows is None:
+        rows, rows_source = (num_rows if result.ok else 0), ROWS_REQUESTED
+        if result.ok:
+            _warn_unmatched(table, result)
+    elapsed, elapsed_source = parsed.get('elapsed'), ELAPSED_FROM_OUTPUT
+    if elapsed is None and parsed.get('rows_per_sec'):
+        elapsed, elapsed_source = rows / parsed['rows_per_sec'], ELAPSED_FROM_RATE
+    if elapsed is None:
+        elapsed, elapsed_source = result.wall_time, ELAPSED_WALL_TIME
+    errors = parsed.get('errors')
+    if errors is None:
+        errors = 0 if result.ok else 1
+    return LoadResult(table, rows, elapsed, errors, result.ok, rows_source, elapsed_source,
+                      parsed.get('mean_latency'))
+
+
+class LoadStats(object):
+    """
+    Thread safe collection of LoadResult of a run
+    """
+
+    def __init__(self, registry=None):
+        """
+        :param registry: metrics.MetricsRegistry whose rows_loaded / load_errors counters are updated
+                         (default = metrics.g_registry)
+        """
+        self.registry = registry if registry is not None else metrics.g_registry
+        self._lock = Lock()
+        self.results = []
+
+    def add(self, load_result):
+        with self._lock:
+            self.results.append(load_result)
+        if load_result.is_measured:
+            self.registry.increment("rows_loaded", load_result.rows)
+        if load_result.errors:
+            self.registry.increment("load_errors", load_result.errors)
+
+    def aggregate(self):
+        """
+        Rows and throughput only cover measured results. Rows of loads that did not report what they wrote
+        are counted apart, as assumed_rows of unmeasured_tables (0 for a failed load).
+        :return: dict with tables, failed_tables, unmeasured_tables, rows, assumed_rows, errors,
+                 aggregate rows/sec over the span of the measured loads, and min / mean / max rows/sec per table
+        """
+        with self._lock:
+            results = list(self.results)
+        if not results:
+            return {'tables': 0}
+        measured = [r for r in results if r.is_measured]
+        rates = sorted(r.rows_per_sec for r in measured if r.ok)
+        rows = sum(r.rows for r in measured)
+        span = 0.0
+        if measured:
+            span = max(r.end_time for r in measured) - min(r.end_time - r.elapsed for r in measured)
+        return {'tables': len(results),
+                'failed_tables': sum(1 for r in results if not r.ok),
+                'unmeasured_tables': len(results) - len(measured),
+                'rows': rows,
+                'assumed_rows': sum(r.rows for r in results if not r.is_measured),
+                'errors': sum(r.errors for r in results),
+                'rows_per_sec': rows / span if span > 0 else 0.0,
+                'table_rows_per_sec_min': rates[0] if rates else None,
+                'table_rows_per_sec_mean': sum(rates) / len(rates) if rates else None,
+                'table_rows_per_sec_max': rates[-1] if rates else None}
+
+    def summary(self):
+        """
+        :return: human readable aggregate
+        """
+        stats = self.aggregate()
+        if stats['tables'] == 0:
+            return "load: no tables loaded"
+        line = "load: %d tables (%d failed), %d rows, %d errors, %.1f rows/sec overall" % (
+            stats['tables'], stats['failed_tables'], stats['rows'], stats['errors'], stats['rows_per_sec'])
+        if stats['table_rows_per_sec_mean'] is not None:
+            line += ", per table rows/sec min %.1f mean %.1f max %.1f" % (
+                stats['table_rows_per_sec_min'], stats['table_rows_per_sec_mean'], stats['table_rows_per_sec_max'])
+        if stats['unmeasured_tables']:
+            line += "; %d tables did not report rows written (%d rows assumed written), not counted above" % (
+                stats['unmeasured_tables'], stats['assumed_rows'])
+        return line
+
+
+# Every load_table call adds its result here
+g_load_stats = LoadStats()
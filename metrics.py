@@ -0,0 +1,282 @@
+#!/usr/bin/python
+
+"""
+Per-operation latency histograms and counters for the commands issued by the scripts.
+Can be exposed in the Prometheus text format over HTTP while a run is in progress.
+"""
+
+import json
+import logging
+import time
+import BaseHTTPServer
+import SocketServer
+from threading import Thread, Lock
+
+# Prefix of all metric names exposed to Prometheus
+g_metric_prefix = "directcopy_"
+
+# Upper bounds of the latency buckets in seconds: 1ms, 2ms, 4ms ... ~70 minutes
+g_bucket_bounds = [0.001 * (2 ** i) for i in xrange(0, 23)]
+
+
+class OperationStats(object):
+    """
+    Latency histogram, error count and throughput of one operation
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = None
+        # Last bucket holds everything above the largest bound
+        self.buckets = [0] * (len(g_bucket_bounds) + 1)
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, wall_time, ok=True):
+        now = time.time()
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total_time += wall_time
+        self.min_time = wall_time if self.min_time is None else min(self.min_time, wall_time)
+        self.max_time = wall_time if self.max_time is None else max(self.max_time, wall_time)
+        idx = 0
+        while idx < len(g_bucket_bounds) and wall_time > g_bucket_bounds[idx]:
+            idx += 1
+        self.buckets[idx] += 1
+        start = now - wall_time
+        self.first_start = start if self.first_start is None else min(self.first_start, start)
+        self.last_end = now
+
+    def percentile(self, fraction):
+        """
+        Estimates a latency percentile from the histogram, interpolating within the bucket
+        :param fraction: e.g. 0.95 for p95
+        :return: latency in seconds, None if nothing was recorded
+        """
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for idx, bucket_count in enumerate(self.buckets):
+            if bucket_count == 0:
+                continue
+            if seen + bucket_count >= rank:
+                lower = g_bucket_bounds[idx - 1] if idx > 0 else 0.0
+                upper = g_bucket_bounds[idx] if idx < len(g_bucket_bounds) else self.max_time
+                value = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(value, self.min_time), self.max_time)
+            seen += bucket_count
+        return self.max_time
+
+    def throughput(self):
+        """
+        :return: completed commands per second between the first start and the last end
+        """
+        if self.count == 0 or self.last_end <= self.first_start:
+            return 0.0
+        return self.count / (self.last_end - self.first_start)
+
+    def to_dict(self):
+        return {'count': self.count,
+                'errors': self.errors,
+                'total_time': self.total_time,
+                'mean': self.total_time / self.count if self.count else None,
+                'min': self.min_time,
+                'max': self.max_time,
+                'p50': self.percentile(0.5),
+                'p95': self.percentile(0.95),
+                'p99': self.percentile(0.99),
+                'throughput': self.throughput(),
+                'buckets': dict(zip([str(bound) for bound in g_bucket_bounds] + ['inf'], self.buckets))}
+
+
+class MetricsRegistry(object):
+    """
+    Thread safe collection of OperationStats, keyed by operation name
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stats = {}
+        # counter name -> value
+        self._counters = {}
+        # (gauge name, label tuple) -> function returning the current value
+        self._gauges = {}
+        self.start_time = time.time()
+
+    def increment(self, name, amount=1):
+        """
+        Increments a counter, e.g. tables_created
+        :param name: counter name
+        :param amount: increment
+        :return: None
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        """
+        :return: dict of counter name to value
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def register_gauge(self, name, func, labels=None):
+        """
+        Registers a gauge whose value is read by calling func when metrics are exposed
+        :param name: gauge name, e.g. queue_depth
+        :param func: function without arguments returning a number
+        :param labels: optional dict of label name to value
+        :return: None
+        """
+        with self._lock:
+            self._gauges[(name, tuple(sorted((labels or {}).items())))] = func
+
+    def unregister_gauge(self, name, labels=None):
+        with self._lock:
+            self._gauges.pop((name, tuple(sorted((labels or {}).items()))), None)
+
+    def record(self, operation, wall_time, ok=True):
+        """
+        :param operation: operation name, e.g. "table create"
+        :param wall_time: time taken in seconds
+        :param ok: whether the operation succeeded
+        :return: None
+        """
+        with self._lock:
+            stats = self._stats.get(operation)
+            if stats is None:
+                stats = OperationStats()
+                self._stats[operation] = stats
+            stats.record(wall_time, ok)
+
+    def snapshot(self):
+        """
+        :return: dict of operation to its statistics (as dicts)
+        """
+        with self._lock:
+            return dict((operation, stats.to_dict()) for operation, stats in self._stats.items())
+
+    def summary(self):
+        """
+        :return: human readable table of all operations
+        """
+        lines = ["%-28s %8s %7s %9s %9s %9s %9s %10s" % ("operation", "count", "errors", "mean(s)",
+                                                           "p50(s)", "p95(s)", "p99(s)", "ops/sec")]
+        for operation, stats in sorted(self.snapshot().items()):
+            lines.append("%-28s %8d %7d %9.3f %9.3f %9.3f %9.3f %10.2f" % (
+                operation, stats['count'], stats['errors'], stats['mean'],
+                stats['p50'], stats['p95'], stats['p99'], stats['throughput']))
+        lines.append("run time: %.1fs" % (time.time() - self.start_time))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """
+        Writes all statistics as JSON
+        :param path: output file
+        :return: None
+        """
+        with open(path, 'w') as out_file:
+            json.dump({'start_time': self.start_time,
+                       'end_time': time.time(),
+                       'counters': self.counters(),
+                       'operations': self.snapshot()}, out_file, indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """
+        :return: all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for name, value in sorted(self.counters().items()):
+            lines.append("# TYPE " + g_metric_prefix + name + "_total counter")
+            lines.append(g_metric_prefix + name + "_total " + str(value))
+
+        with self._lock:
+            gauges = sorted(self._gauges.items())
+        typed = set()
+        for (name, labels), func in gauges:
+            try:
+                value = func()
+            except Exception:
+                logging.exception("Failed to read gauge " + name)
+                continue
+            if name not in typed:
+                lines.append("# TYPE " + g_metric_prefix + name + " gauge")
+                typed.add(name)
+            lines.append(g_metric_prefix + name + _format_labels(labels) + " " + str(value))
+
+        stats = sorted(self.snapshot().items())
+        if stats:
+            histogram = g_metric_prefix + "command_duration_seconds"
+            lines.append("# TYPE " + histogram + " histogram")
+            for operation, op_stats in stats:
+                cumulative = 0
+                for bound in g_bucket_bounds:
+                    cumulative += op_stats['buckets'][str(bound)]
+                    lines.append(histogram + "_bucket" +
+                                 _format_labels((("operation", operation), ("le", repr(bound)))) +
+                                 " " + str(cumulative))
+                lines.append(histogram + "_bucket" + _format_labels((("operation", operation), ("le", "+Inf"))) +
+                             " " + str(op_stats['count']))
+                lines.append(histogram + "_sum" + _format_labels((("operation", operation),)) +
+                             " " + repr(op_stats['total_time']))
+                lines.append(histogram + "_count" + _format_labels((("operation", operation),)) +
+                             " " + str(op_stats['count']))
+            errors = g_metric_prefix + "command_errors_total"
+            lines.append("# TYPE " + errors + " counter")
+            for operation, op_stats in stats:
+                lines.append(errors + _format_labels((("operation", operation),)) + " " + str(op_stats['errors']))
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                          for key, value in labels) + "}"
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_http_server(port, registry=None, address=''):
+    """
+    Serves the metrics on http://<address>:<port>/metrics from a background thread
+    :param port: port to listen on
+    :param registry: MetricsRegistry to expose (default = g_registry)
+    :param address: address to bind (default = all interfaces)
+    :return: the server, call shutdown() on it to stop
+    """
+    if registry is None:
+        registry = g_registry
+
+    class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("metrics: " + format % args)
+
+    server = _ThreadingHTTPServer((address, port), MetricsHandler)
+    thread = Thread(target=server.serve_forever, name="metrics-http")
+    thread.daemon = True
+    thread.start()
+    logging.info("Serving metrics on port " + str(port))
+    return server
+
+
+# Registry every executor records its commands into
+g_registry = MetricsRegistry()
@@ -0,0 +1,283 @@
+#!/usr/bin/python
+
+"""
+Continuous monitoring of replica status.
+"""
+
+import logging
+import time
+import utils
+
+
+def get_replica_key(src_table, data):
+    """
+    :param src_table: source table path
+    :param data: one entry of "maprcli table replica list -json"
+    :return: key identifying the replica
+    """
+    return src_table, data.get('cluster'), data.get('table')
+
+
+def format_replica_key(key):
+    return "sourceTable: " + key[0] + ", cluster: " + str(key[1]) + ", table: " + str(key[2])
+
+
+class ReplicaWatcher(object):
+    """
+    Remembers the last seen value of the tracked fields of each replica
+    and reports only what changed since the previous poll.
+    """
+
+    def __init__(self, fields_to_track):
+        """
+        :param fields_to_track: list of replica status fields compared between polls
+        """
+        self.fields_to_track = fields_to_track
+        # source table -> {replica key -> {field: value}}
+        self._last = {}
+
+    def update(self, src_table, list_of_data):
+        """
+        :param src_table: source table path
+        :param list_of_data: replica entries of the table from the latest poll
+        :return: list of lines describing new, changed and removed replicas
+        """
+        lines = []
+        previous = self._last.get(src_table, {})
+        current = {}
+        for data in list_of_data:
+            key = get_replica_key(src_table, data)
+            values = dict((field, data.get(field)) for field in self.fields_to_track)
+            current[key] = values
+            old_values = previous.get(key)
+            if old_values is None:
+                lines.append(format_replica_key(key) + ", new replica, " +
+                             ", ".join(field + ": " + str(values[field]) for field in self.fields_to_track))
+                continue
+            changes = [field + ": " + str(old_values[field]) + " -> " + str(values[field])
+                       for field in self.fields_to_track if old_values[field] != values[field]]
+            if changes:
+                lines.append(format_replica_key(key) + ", " + ", ".join(changes))
+        for key in previous:
+            if key not in current:
+                lines.append(format_replica_key(key) + ", removed")
+        self._last[src_table] = current
+        return lines
+
+
+def is_replica_stable(data):
+    """
+    :param data: one entry of "maprcli table replica list -json"
+    :return: True if the replica is fully copied, up to date and has nothing pending
+    """
+    return utils.get_replica_field(data, 'isUptodate') is True and \
+        utils.get_replica_field(data, 'copyTableCompletionPercentage') in (None, 100) and \
+        not utils.get_replica_field(data, 'bytesPending') and \
+        not utils.get_replica_field(data, 'putsPending')
+
+
+def record_history(store, src_table, list_of_data, timestamp):
+    """
+    :param store: timeseries.TimeSeriesStore
+    :param src_table: source table path
+    :param list_of_data: replica entries of the table from a poll
+    :param timestamp: time of the poll
+    :return: None
+    """
+    for data in list_of_data:
+        store.record(get_replica_key(src_table, data), data, timestamp)
+
+
+class AdaptivePollScheduler(object):
+    """
+    Gives every source table its own polling interval.
+    Tables whose replicas are copying or changing are polled every min_interval,
+    stable tables back off up to max_interval. The total number of polls
+    ("maprcli table replica list" calls) is kept under a budget per minute.
+    """
+
+    def __init__(self, min_interval, max_interval, budget_per_minute=None):
+        """
+        :param min_interval: shortest interval between two polls of a table, in seconds
+        :param max_interval: longest interval between two polls of a table, in seconds
+        :param budget_per_minute: maximum number of polls per minute (default = unlimited)
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.budget_per_minute = budget_per_minute
+        self._interval = {}
+        self._next_due = {}
+        self._tokens = float(budget_per_minute) if budget_per_minute else None
+        self._last_refill = None
+
+    def set_tables(self, list_of_tables, now=None):
+        """
+        Adds new tables (due right away) and forgets tables that are gone
+        :param list_of_tables: current list of source tables
+        :param now: current time (default = time.time())
+        :return: None
+        """
+        now = time.time() if now is None else now
+        current = set(list_of_tables)
+        for table in list_of_tables:
+            if table not in self._next_due:
+                self._interval[table] = self.min_interval
+                self._next_due[table] = now
+        for table in self._next_due.keys():
+            if table not in current:
+                del self._next_due[table]
+                del self._interval[table]
+
+    def _refill(self, now):
+        if self._tokens is None:
+            return
+        if self._last_refill is None:
+            self._last_refill = now
+        rate = self.budget_per_minute / 60.0
+        self._tokens = min(float(self.budget_per_minute), self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+
+    def due_tables(self, now=None):
+        """
+        Tables to poll now, most overdue first, limited by the remaining budget
+        :param now: current time (default = time.time())
+        :return: list of tables
+        """
+        now = time.time() if now is None else now
+        self._refill(now)
+        due = sorted((due_at, table) for table, due_at in self._next_due.items() if due_at <= now)
+        list_of_tables = [table for _, table in due]
+        if self._tokens is not None:
+            list_of_tables = list_of_tables[:int(self._tokens)]
+            self._tokens -= len(list_of_tables)
+        return list_of_tables
+
+    def report(self, table, list_of_data, changed, now=None):
+        """
+        Sets the next poll of a table from its latest status
+        :param table: source table
+        :param list_of_data: replica entries from the poll, None if the poll failed
+        :param changed: whether any tracked field changed since the previous poll
+        :param now: current time (default = time.time())
+        :return: new interval of the table in seconds
+        """
+        now = time.time() if now is None else now
+        if table not in self._interval:
+            return None
+        interval = self._interval[table]
+        if list_of_data is None:
+            # Failed poll, try again after the same interval
+            pass
+        elif changed:
+            interval = self.min_interval
+        elif all(is_replica_stable(data) for data in list_of_data):
+            interval = interval * 2
+        else:
+            # Not done yet but not moving either
+            interval = interval * 1.5
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        self._interval[table] = interval
+        self._next_due[table] = now + interval
+        return interval
+
+    def next_wakeup(self, now=None):
+        """
+        :param now: current time (default = time.time())
+        :return: seconds till the next table is due
+        """
+        now = time.time() if now is None else now
+        if not self._next_due:
+            return self.min_interval
+        wait = max(0.0, min(self._next_due.values()) - now)
+        if self._tokens is not None and self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) * 60.0 / self.budget_per_minute)
+        return wait
+
+
+def watch_replica_status_adaptive(get_tables, fields, min_interval, max_interval,
+                                  budget_per_minute=None, table_refresh_interval=60, max_polls=None, store=None,
+                                  aggregator=None):
+    """
+    Same as watch_replica_status, but each table is polled on its own adaptive interval
+    given by AdaptivePollScheduler.
+    :param get_tables: function returning the list of source tables to poll
+    :param fields: filter fields (same as utils.get_replica_status)
+    :param min_interval: shortest interval between two polls of a table, in seconds
+    :param max_interval: longest interval between two polls of a table, in seconds
+    :param budget_per_minute: maximum number of "maprcli table replica list" calls per minute
+    :param table_refresh_interval: seconds between two refreshes of the table list
+    :param max_polls: stop after these many "replica list" calls (default = run till interrupted)
+    :param store: optional timeseries.TimeSeriesStore recording the lag fields of every poll
+    :param aggregator: optional lagreport.LagAggregator fed with every poll
+    :return: None
+    """
+    watcher = ReplicaWatcher(utils.get_fields_to_track(fields))
+    scheduler = AdaptivePollScheduler(min_interval, max_interval, budget_per_minute)
+    polls = 0
+    tables_refreshed_at = None
+    while max_polls is None or polls < max_polls:
+        now = time.time()
+        if tables_refreshed_at is None or now - tables_refreshed_at >= table_refresh_interval:
+            scheduler.set_tables(get_tables(), now)
+            tables_refreshed_at = now
+
+        list_of_tables = scheduler.due_tables(now)
+        if max_polls is not None:
+            list_of_tables = list_of_tables[:max_polls - polls]
+        list_of_status = utils.run_on_work_queue(utils.fetch_replica_status, list_of_tables)
+
+        lines = []
+        now = time.time()
+        for table, list_of_data in zip(list_of_tables, list_of_status):
+            table_lines = watcher.update(table, list_of_data) if list_of_data is not None else []
+            if store is not None and list_of_data is not None:
+                record_history(store, table, list_of_data, now)
+            if aggregator is not None and list_of_data is not None:
+                aggregator.add(table, list_of_data, now)
+            scheduler.report(table, list_of_data, len(table_lines) > 0, now)
+            lines.extend(table_lines)
+        if lines:
+            print "\n".join(lines)
+        polls += len(list_of_tables)
+
+        if max_polls is None or polls < max_polls:
+            time.sleep(max(0.05, scheduler.next_wakeup()))
+
+
+def watch_replica_status(get_tables, fields, interval, max_polls=None, store=None, aggregator=None):
+    """
+    Polls replica status of tables every interval seconds and prints
+    only the replicas whose tracked fields changed since the last poll.
+    :param get_tables: function returning the list of source tables to poll
+    :param fields: filter fields (same as utils.get_replica_status)
+    :param interval: seconds between the start of two polls
+    :param max_polls: stop after these many polls (default = run till interrupted)
+    :param store: optional timeseries.TimeSeriesStore recording the lag fields of every poll
+    :param aggregator: optional lagreport.LagAggregator fed with every poll
+    :return: None
+    """
+    watcher = ReplicaWatcher(utils.get_fields_to_track(fields))
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        start = time.time()
+        list_of_tables = get_tables()
+        list_of_status = utils.run_on_work_queue(utils.fetch_replica_status, list_of_tables)
+
+        lines = []
+        for table, list_of_data in zip(list_of_tables, list_of_status):
+            # Failed polls are skipped, so that they do not show up as removed replicas
+            if list_of_data is not None:
+                lines.extend(watcher.update(table, list_of_data))
+                if store is not None:
+                    record_history(store, table, list_of_data, start)
+                if aggregator is not None:
+                    aggregator.add(table, list_of_data, start)
+        # One print per poll, so output of different tables does not interleave
+        if lines:
+            print "\n".join(lines)
+        logging.debug("Poll " + str(polls) + ": " + str(len(lines)) + " replicas changed")
+
+        polls += 1
+        elapsed = time.time() - start
+        if max_polls is None or polls < max_polls:
+            time.sleep(max(0.0, interval - elapsed))
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+"""
+Staged pipeline: every stage has its own worker threads and hands its output
+to the next stage through a bounded queue, so all stages make progress at the same time.
+"""
+
+import logging
+import Queue
+from threading import Thread, Lock
+import metrics
+
+# Marks the end of input for a stage
+_END = object()
+
+
+class Stage(object):
+    """
+    One step of a pipeline.
+    func is called with an item and returns the item passed on to the next stage.
+    Returning None (or raising) drops the item from the rest of the pipeline, and counts as a failure.
+    """
+
+    def __init__(self, name, func, num_workers=1):
+        """
+        :param name: name of the stage, used for thread names and logs
+        :param func: function called with each item
+        :param num_workers: number of threads working on this stage
+        """
+        self.name = name
+        self.func = func
+        self.num_workers = num_workers
+        self.in_queue = None
+        self.next_stage = None
+        self._lock = Lock()
+        self._running = num_workers
+        # Number of items dropped by this stage
+        self.dropped = 0
+
+    def _worker(self):
+        while True:
+            item = self.in_queue.get()
+            if item is _END:
+                break
+            try:
+                out = self.func(item)
+            except Exception:
+                logging.exception("Stage " + self.name + " failed on: " + str(item))
+                out = None
+            if out is None:
+                logging.warning("Stage " + self.name + " dropped: " + str(item))
+                with self._lock:
+                    self.dropped += 1
+                metrics.g_registry.increment("pipeline_" + self.name + "_failed")
+            elif self.next_stage is not None:
+                self.next_stage.in_queue.put(out)
+
+        # The last worker to finish closes the next stage
+        with self._lock:
+            self._running -= 1
+            is_last = self._running == 0
+        if is_last and self.next_stage is not None:
+            for _ in xrange(0, self.next_stage.num_workers):
+                self.next_stage.in_queue.put(_END)
+
+
+def run_pipeline(list_of_items, stages, queue_size=10):
+    """
+    Runs all items through the stages. Returns once every stage has drained.
+    :param list_of_items: input of the first stage
+    :param stages: list of Stage, in order
+    :param queue_size: maximum number of items waiting in front of each stage
+    :return: None
+    """
+    for i, stage in enumerate(stages):
+        stage.in_queue = Queue.Queue(maxsize=queue_size)
+        stage.next_stage = stages[i + 1] if i + 1 < len(stages) else None
+
+    for stage in stages:
+        metrics.g_registry.register_gauge("queue_depth", stage.in_queue.qsize, {"queue": "pipeline_" + stage.name})
+
+    threads = [Thread(target=stage._worker, name=stage.name + "-" + str(i))
+               for stage in stages for i in xrange(0, stage.num_workers)]
+    for thread in threads:
+        thread.start()
+
+    first = stages[0]
+    for item in list_of_items:
+        first.in_queue.put(item)
+    for _ in xrange(0, first.num_workers):
+        first.in_queue.put(_END)
+
+    for thread in threads:
+        thread.join()
+
+    for stage in stages:
+        metrics.g_registry.unregister_gauge("queue_depth", {"queue": "pipeline_" + stage.name})
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+
+"""
+Reconcile mode for the stress profiles.
+Compares the desired volumes, tables and replicas with what already exists
+and runs only the missing create / load / autosetup operations.
+"""
+
+import logging
+import os
+import utils
+
+
+class ReconcilePlan(object):
+    """
+    Operations needed to reach the desired state
+    """
+
+    def __init__(self):
+        self.volumes_to_create = []
+        self.tables_to_create = []
+        self.tables_to_load = []
+        # list of (src_table, replica table, is_multimaster)
+        self.replicas_to_setup = []
+
+    def is_empty(self):
+        return not (self.volumes_to_create or self.tables_to_create or
+                    self.tables_to_load or self.replicas_to_setup)
+
+    def __str__(self):
+        return "volumes to create: " + str(len(self.volumes_to_create)) + \
+               ", tables to create: " + str(len(self.tables_to_create)) + \
+               ", tables to load: " + str(len(self.tables_to_load)) + \
+               ", replicas to setup: " + str(len(self.replicas_to_setup))
+
+
+def get_desired_state(volume_list, src_table_prefix, start_idx, num_tables, replica_specs):
+    """
+    :param volume_list: list of volume paths
+    :param src_table_prefix: source table name prefix
+    :param start_idx: start index of table
+    :param num_tables: number of tables per volume
+    :param replica_specs: list of (replica_parent, num_replica, is_multimaster) tuples
+    :return: list of (table path, list of (replica table, is_multimaster)), in creation order
+    """
+    desired = []
+    for volume in volume_list:
+        for i in xrange(start_idx, start_idx + num_tables):
+            table = volume + "/" + src_table_prefix + str(i).zfill(utils.g_zfill_width)
+            replicas = [(repl_table, is_multimaster)
+                        for replica_parent, num_replica, is_multimaster in replica_specs
+                        for repl_table in utils.get_replica_table_names(table, replica_parent,
+                                                                        num_replica, is_multimaster)]
+            desired.append((table, replicas))
+    return desired
+
+
+def get_actual_state_from_listing(volume_list, replica_parents):
+    """
+    Finds existing volumes, tables and replica tables with a single "hadoop fs -ls"
+    over the parents of the volumes, the volumes and the replica parents.
+    :param volume_list: list of volume paths
+    :param replica_parents: list of replica parent directories
+    :return: set of existing paths, None if hadoop could not be run at all
+    """
+    parents = sorted(set(os.path.dirname(vol.rstrip('/')) or '/' for vol in volume_list))
+    replica_parents = sorted(set(parent.rstrip('/') for parent in replica_parents))
+    result = utils.g_executor.run(["hadoop", "fs", "-ls"] + parents + list(volume_list) + replica_parents)
+    # Missing volumes make the command fail, but the listing of everything else is still printed
+    if not result.stdout:
+        return None
+    existing = set(utils.parse_fs_listing(result.stdout))
+
+    # The listing is complete for every volume that exists, so keep it in the inventory
+    tables_by_volume = dict((vol, []) for vol in volume_list if vol in existing)
+    for path in existing:
+        parent = os.path.dirname(path)
+        if parent in tables_by_volume:
+            tables_by_volume[parent].append(path)
+    for vol, list_of_tables in tables_by_volume.items():
+        utils.g_inventory.put(vol, list_of_tables)
+    return existing
+
+
+def make_plan(volume_list, desired, existing, loaded_tables=None):
+    """
+    :param volume_list: list of volume paths
+    :param desired: output of get_desired_state
+    :param existing: set of paths that exist
+    :param loaded_tables: set of tables known to be loaded. If None, a table is taken to be
+                          loaded when any of its replicas exists, as load always precedes autosetup.
+    :return: ReconcilePlan
+    """
+    plan = ReconcilePlan()
+    plan.volumes_to_create = [vol for vol in volume_list if vol not in existing]
+    for table, replicas in desired:
+        missing_replicas = [(table, repl_table, is_multimaster) for repl_table, is_multimaster in replicas
+                            if repl_table not in existing]
+        if table not in existing:
+            plan.tables_to_create.append(table)
+            plan.tables_to_load.append(table)
+        elif loaded_tables is not None:
+            if table not in loaded_tables:
+                plan.tables_to_load.append(table)
+        elif len(missing_replicas) == len(replicas):
+            plan.tables_to_load.append(table)
+        plan.replicas_to_setup.extend(missing_replicas)
+    return plan
+
+
+def make_plan_from_index(state_index, volume_list, desired):
+    """
+    Same as make_plan, with the actual state taken from the state index instead of the cluster
+    :param state_index: stateindex.StateIndex
+    :param volume_list: list of volume paths
+    :param desired: output of get_desired_state
+    :return: ReconcilePlan
+    """
+    volumes = set(row['path'] for row in state_index.list_volumes(status="created"))
+    existing = set(volumes)
+    loaded_tables = set()
+    # Tables of a volume that is not there anymore are gone too, whatever their own rows say
+    for row in state_index.list_tables():
+        if row['volume'] not in volumes:
+            continue
+        if row['status'] in ("created", "loaded", "load_failed"):
+            existing.add(row['path'])
+        if row['status'] == "loaded":
+            loaded_tables.add(row['path'])
+    existing.update(row['replica'] for row in state_index.list_replicas(status="setup")
+                    if row['src_table'] in existing)
+    return make_plan(volume_list, desired, existing, loaded_tables)
+
+
+def apply_plan(plan, num_cfs, num_cols, num_rows, is_json=False):
+    """
+    Runs the operations of the plan: volumes, then tables, then loads, then replicas
+    :param plan: ReconcilePlan
+    :param num_cfs: number of column families per table
+    :param num_cols: number of columns in a table
+    :param num_rows: number of rows to load in a table
+    :param is_json: puts data in to json table if specified
+    :return: None
+    """
+    logging.info("Reconcile plan: " + str(plan))
+    utils.run_on_work_queue(utils.create_single_volume, plan.volumes_to_create)
+    utils.run_on_work_queue(utils.create_single_table, plan.tables_to_create)
+    utils.run_on_work_queue(lambda tab: utils.load_table(tab, num_cfs, num_cols, num_rows, is_json),
+                            plan.tables_to_load)
+    utils.run_on_work_queue(lambda item: utils.autosetup_single_replica(item[0], item[1], item[2]),
+                            plan.replicas_to_setup)
+    logging.debug("Done")
+
+
+def reconcile(volume_list, src_table_prefix, start_idx, num_tables, replica_specs,
+              num_cfs, num_cols, num_rows, dry_run=False):
+    """
+    Brings the cluster to the desired state, running only the missing operations.
+    Uses the state index when one is configured, otherwise one listing of the cluster.
+    :param volume_list: list of volume paths
+    :param src_table_prefix: source table name prefix
+    :param start_idx: start index of table
+    :param num_tables: number of tables per volume
+    :param replica_specs: list of (replica_parent, num_replica, is_multimaster) tuples
+    :param num_cfs: number of column families per table
+    :param num_cols: number of columns in a table
+    :param num_rows: number of rows to load in a table
+    :param dry_run: only log the plan
+    :return: ReconcilePlan
+    """
+    desired = get_desired_state(volume_list, src_table_prefix, start_idx, num_tables, replica_specs)
+    if utils.g_state_index is not None:
+        plan = make_plan_from_index(utils.g_state_index, volume_list, desired)
+    else:
+        existing = get_actual_state_from_listing(volume_list, [spec[0] for spec in replica_specs])
+        if existing is None:
+            logging.error("Could not list the cluster, every operation will be run")
+            existing = set()
+        plan = make_plan(volume_list, desired, existing)
+
+    if dry_run is True:
+        logging.info("Reconcile plan: " + str(plan))
+        return plan
+    apply_plan(plan, num_cfs, num_cols, num_rows)
+    return plan
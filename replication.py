@@ -2,25 +2,39 @@
 
 # Created by aravi
 
+import os
 import sys
+import socket
 import logging
 import argparse
-from threading import Thread, Lock
 import utils
 import config
+import executor
+import concurrency
+import stateindex
+import reconcile
+import journal
+import metrics
+import monitor
+import uptodate
+import statusoutput
+import timeseries
+import lagreport
+import fakecluster
+import sharding
+import fanout
+import loadrunner
+import loadstats
+import bulkload
 
 logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] (%(threadName)-10s) %(message)s', )
 
 
-def execute_stress_bulk():
+def get_replica_parent_paths():
     """
-    Executes bulk profile of stress.
-    Various parameters are configured on config.py
-    Creates all the tables with data first and does autosetup in bulk.
-    :return:
+    Builds the parent directories of cross-cluster and intracluster replicas from config.py
+    :return: (remote path, local path)
     """
-    logging.debug("Executing bulk profile")
-
     remote_path = "/"
     if config.remote_cluster_name is not None:
         remote_path += "mapr/" + config.remote_cluster_name + "/"
@@ -29,21 +43,62 @@ def execute_stress_bulk():
     local_path = "/"
     if config.local_replica_volume_name is not None:
         local_path += config.local_replica_volume_name
+    return remote_path, local_path
+
+
+def execute_stress_reconcile(dry_run=False):
+    """
+    Reconciles the bulk profile of stress.
+    Compares the volumes, tables and replicas configured on config.py with the ones
+    that exist, and runs only the missing operations.
+    :param dry_run: only log what would be done
+    :return:
+    """
+    logging.debug("Reconciling bulk profile")
+
+    remote_path, local_path = get_replica_parent_paths()
+    volume_list = ["/" + config.src_volume_prefix + str(config.vol_start_index + i).zfill(utils.g_zfill_width)
+                   for i in xrange(0, config.num_src_vols)]
+    replica_specs = [(remote_path, config.num_replica, False),
+                     (local_path, config.num_local, False),
+                     (remote_path, config.num_replica, True)]
+    reconcile.reconcile(volume_list,
+                        config.src_table_prefix,
+                        config.table_start_index,
+                        config.num_src_tables,
+                        replica_specs,
+                        config.num_cfs,
+                        config.num_cols,
+                        config.num_rows,
+                        dry_run=dry_run)
+
+
+def execute_stress_bulk(is_concurrent_replica=False):
+    """
+    Executes bulk profile of stress.
+    Various parameters are configured on config.py
+    Creates all the tables with data first and does autosetup in bulk.
+    :param is_concurrent_replica: set up all replica types of a table at the same time,
+                                  in a single pass over the tables
+    :return:
+    """
+    logging.debug("Executing bulk profile")
 
+    remote_path, local_path = get_replica_parent_paths()
     logging.info("Replica path prefix: " + remote_path)
 
-    # Create volumes
+    # Create volumes, and tables on each volume as soon as it exists
     logging.debug("Creating " + str(config.num_src_vols) + " Volumes.. ")
-    volume_list = utils.create_volume(volume_path_prefix="/" + config.src_volume_prefix,
-                                      num_volumes=config.num_src_vols,
-                                      start_idx=config.vol_start_index)
-
-    # Create tables
-    table_path_prefix_list = [volume + "/" + config.src_table_prefix for volume in volume_list]
-    logging.info(table_path_prefix_list)
-    utils.create_tables_multithread(table_path_prefix_list=table_path_prefix_list,
-                                    num_tables=config.num_src_tables,
-                                    start_idx=config.table_start_index)
+    volume_results = utils.create_volume_multithread(
+        volume_path_prefix="/" + config.src_volume_prefix,
+        num_volumes=config.num_src_vols,
+        start_idx=config.vol_start_index,
+        parallelism=config.volume_parallelism,
+        on_created=lambda volume: utils.create_tables_multithread(
+            table_path_prefix_list=[volume + "/" + config.src_table_prefix],
+            num_tables=config.num_src_tables,
+            start_idx=config.table_start_index))
+    volume_list = sorted(volume_results.keys())
 
     # Load tables
     for volume in volume_list:
@@ -54,6 +109,16 @@ def execute_stress_bulk():
                                              is_json=False)
 
     # Autosetup replica
+    if is_concurrent_replica is True:
+        replica_specs = [(remote_path, config.num_replica, False),
+                         (local_path, config.num_local, False),
+                         (remote_path, config.num_replica, True)]
+        for volume in volume_list:
+            utils.autosetup_replica_volume_concurrent(volume_path=volume,
+                                                      replica_specs=replica_specs,
+                                                      max_concurrent=config.replica_setup_concurrency)
+        return
+
     for volume in volume_list:
         utils.autosetup_replica_table_multithread(volume_path=volume,
                                                   replica_parent=remote_path,
@@ -71,62 +136,163 @@ def execute_stress_bulk():
                                                   is_multimaster=True)
 
 
-def execute_stress_incremental():
+def execute_stress_incremental(is_pipelined=False, is_concurrent_replica=False):
     """
     Executes incremental profile of stress.
     Various parameters are configured on config.py
     Creates a table, loads data, does autosetup; before moving to next table.
     Parallelism is achieved based on number of volumes.
+    When pipelined, create, load and autosetup run as concurrent stages instead.
+    :param is_pipelined: run create / load / autosetup as pipeline stages
+    :param is_concurrent_replica: set up all replica types of a table at the same time
     :return:
     """
     logging.debug("Executing incremental profile")
 
-    remote_path = "/"
-    if config.remote_cluster_name is not None:
-        remote_path += "mapr/" + config.remote_cluster_name + "/"
-    if config.remote_volume_name is not None:
-        remote_path += config.remote_volume_name
-    local_path = "/"
-    if config.local_replica_volume_name is not None:
-        local_path += config.local_replica_volume_name
-
+    remote_path, local_path = get_replica_parent_paths()
     logging.info("Replica path prefix: " + remote_path)
 
     # Create volumes
     logging.debug("Creating " + str(config.num_src_vols) + " Volumes.. ")
-    volume_list = utils.create_volume(volume_path_prefix="/" + config.src_volume_prefix,
-                                      num_volumes=config.num_src_vols,
-                                      start_idx=config.vol_start_index)
-
-    get_chunks = lambda l, n: [l[x: x + n] for x in xrange(0, len(l), n)]
-    num_sublist = (len(volume_list) / utils.g_thread_count) + 1
-    volume_sublist = get_chunks(volume_list, num_sublist)
-
-    threads = [Thread(target=utils.do_incremental_setup,
-                      args=(volume_sublist[i],
-                            config.src_table_prefix,
-                            config.num_src_tables,
-                            config.table_start_index,
-                            config.num_cfs,
-                            config.num_cols,
-                            config.num_rows,
-                            remote_path,
-                            local_path,
-                            config.num_replica
-                            ))
-               for i in xrange(0, len(volume_sublist))]
-
-    for thread in threads:
-        thread.start()
-
-    for thread in threads:
-        thread.join()
+    volume_results = utils.create_volume_multithread(volume_path_prefix="/" + config.src_volume_prefix,
+                                                     num_volumes=config.num_src_vols,
+                                                     start_idx=config.vol_start_index,
+                                                     parallelism=config.volume_parallelism)
+    volume_list = sorted(volume_results.keys())
+
+    replica_concurrency = config.replica_setup_concurrency if is_concurrent_replica is True else None
+
+    if is_pipelined is True:
+        utils.do_incremental_setup_pipelined(volume_list,
+                                             config.src_table_prefix,
+                                             config.num_src_tables,
+                                             config.table_start_index,
+                                             config.num_cfs,
+                                             config.num_cols,
+                                             config.num_rows,
+                                             remote_path,
+                                             local_path,
+                                             config.num_replica,
+                                             create_workers=config.pipeline_create_workers,
+                                             load_workers=config.pipeline_load_workers,
+                                             autosetup_workers=config.pipeline_autosetup_workers,
+                                             queue_size=config.pipeline_queue_size,
+                                             replica_concurrency=replica_concurrency)
+        logging.debug("Done")
+        return
+
+    # Volumes are handed out one at a time, so idle threads pick up the next volume
+    utils.run_on_work_queue(lambda volume: utils.do_incremental_setup([volume],
+                                                                      config.src_table_prefix,
+                                                                      config.num_src_tables,
+                                                                      config.table_start_index,
+                                                                      config.num_cfs,
+                                                                      config.num_cols,
+                                                                      config.num_rows,
+                                                                      remote_path,
+                                                                      local_path,
+                                                                      config.num_replica,
+                                                                      replica_concurrency),
+                            volume_list)
+
+    logging.debug("Done")
 
+
+def execute_stress_fanout(hosts, global_args=None):
+    """
+    Executes incremental profile of stress, with the table operations run by agents on other nodes.
+    Volumes are created here. Creating, loading and setting up replicas of each table are
+    handed out one at a time from a global queue, each step once the previous one succeeded.
+    :param hosts: hosts to start agents on ("local" for agent threads in this process)
+    :param global_args: options of this run passed on to the agents started with ssh
+    :return:
+    """
+    logging.debug("Executing incremental profile on agents: " + ', '.join(hosts))
+
+    remote_path, local_path = get_replica_parent_paths()
+    volume_results = utils.create_volume_multithread(volume_path_prefix="/" + config.src_volume_prefix,
+                                                     num_volumes=config.num_src_vols,
+                                                     start_idx=config.vol_start_index,
+                                                     parallelism=config.volume_parallelism)
+    replica_specs = [(remote_path, config.num_replica, False),
+                     (local_path, config.num_local, False),
+                     (remote_path, config.num_replica, True)]
+
+    coordinator = fanout.Coordinator(('', config.fanout_port))
+
+    def on_loaded(task, result):
+        if not fanout.is_result_ok(result):
+            logging.error("Load failed on " + str(result.get('agent')) + ": " + task.args[0])
+            return
+        for replica_parent, num_replica, is_multimaster in replica_specs:
+            for repl_table in utils.get_replica_table_names(task.args[0], replica_parent, num_replica,
+                                                            is_multimaster):
+                coordinator.submit('autosetup_replica', [task.args[0], repl_table, is_multimaster])
+
+    def on_created(task, result):
+        if not fanout.is_result_ok(result):
+            logging.error("Create failed on " + str(result.get('agent')) + ": " + task.args[0])
+            return
+        coordinator.submit('load_table', [task.args[0], config.num_cfs, config.num_cols, config.num_rows],
+                           on_done=on_loaded)
+
+    for volume in sorted(volume_results.keys()):
+        for i in xrange(config.table_start_index, config.table_start_index + config.num_src_tables):
+            table = volume + "/" + config.src_table_prefix + str(i).zfill(utils.g_zfill_width)
+            coordinator.submit('create_table', [table], on_done=on_created)
+
+    agents = fanout.start_agents(hosts, socket.getfqdn(), coordinator.address[1], config.fanout_slots,
+                                 config.fanout_remote_dir or os.path.dirname(os.path.abspath(__file__)),
+                                 global_args)
+    if not coordinator.wait(agents, config.fanout_connect_timeout):
+        logging.error("Not every table operation was run, see the errors above")
+    coordinator.shutdown()
+    fanout.wait_agents(agents)
+    logging.info("Agents used: " + ', '.join(sorted(coordinator.agents)))
     logging.debug("Done")
 
 
+def get_agent_global_args(args):
+    """
+    :param args: parsed command line
+    :return: options of this run that agents started with ssh need to run with the same settings
+    """
+    global_args = []
+    if args.statedb is not None:
+        global_args += ["-statedb", args.statedb]
+    if args.metricsport is not None:
+        global_args += ["-metricsport", str(args.metricsport)]
+    if args.cpuaware is True:
+        global_args += ["-cpuaware"]
+    if args.bulkload is not None:
+        global_args += ["-bulkload", args.bulkload]
+    return global_args
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
+    parser.add_argument('-statedb',
+                        default=config.state_db_path,
+                        help='sqlite file in which created objects and their status are recorded')
+    parser.add_argument('-metricsport',
+                        type=int,
+                        default=config.metrics_port,
+                        help='Serve live metrics in the Prometheus text format on this port')
+    parser.add_argument('-metricsfile',
+                        help='Write per-operation latency statistics as JSON to this file at the end of the run')
+    parser.add_argument('-cpuaware',
+                        action='store_true',
+                        help='Run loadtest on a process pool sized from the CPUs of this node, each process ' +
+                             'pinned to its own CPUs, if specified (see load_* in config.py)')
+    parser.add_argument('-bulkload',
+                        choices=['memory', 'file'],
+                        help='Generate and write the rows in process through this sink instead of running ' +
+                             'loadtest. The sinks are not MapR tables, so this requires -fake ' +
+                             '(see bulkload_* in config.py)')
+    parser.add_argument('-fake',
+                        action='store_true',
+                        help='Run against an in-memory fake cluster instead of maprcli / hadoop / loadtest ' +
+                             'if specified (see fake_* in config.py)')
 
     sub_parsers = parser.add_subparsers(help='command',
                                         dest='cmd_name')
@@ -166,6 +332,11 @@ if __name__ == "__main__":
                                    type=int,
                                    default=1,
                                    help='Start index of volume (default: 1)')
+    create_vol_parser.add_argument('-parallelism',
+                                   type=int,
+                                   default=config.volume_parallelism,
+                                   help='Number of volumes to create at the same time (default: ' +
+                                        str(config.volume_parallelism) + ')')
 
     # delete command
     delete_parser = sub_parsers.add_parser('delete',
@@ -202,6 +373,11 @@ if __name__ == "__main__":
                                    type=int,
                                    default=1,
                                    help='Start index of volume (default: 1)')
+    delete_vol_parser.add_argument('-parallelism',
+                                   type=int,
+                                   default=config.volume_parallelism,
+                                   help='Number of volumes to delete at the same time (default: ' +
+                                        str(config.volume_parallelism) + ')')
 
     # autopsetup command
     autosetup_parser = sub_parsers.add_parser('autosetup',
@@ -309,6 +485,30 @@ if __name__ == "__main__":
     repl_table_parser.add_argument('-filter',
                                    help='Filter required fields (comma separated)',
                                    type=str)
+    repl_table_parser.add_argument('-watch',
+                                   type=float,
+                                   metavar='INTERVAL',
+                                   help='Poll every INTERVAL seconds and print only replicas that changed')
+    repl_table_parser.add_argument('-adaptive',
+                                   action='store_true',
+                                   help='With -watch, poll each table on its own interval: every INTERVAL seconds ' +
+                                        'while its replicas change, backing off to ' + str(config.replstatus_max_interval) +
+                                        's once they are up to date')
+    repl_table_parser.add_argument('-output',
+                                   metavar='FILE',
+                                   help='Write status of every replica to FILE, with typed fields, instead of printing it')
+    repl_table_parser.add_argument('-format',
+                                   choices=statusoutput.g_formats,
+                                   default='jsonl',
+                                   help='Format of -output (default: jsonl)')
+    repl_table_parser.add_argument('-history',
+                                   metavar='FILE',
+                                   help='With -watch, keep the history of lag fields of every replica and ' +
+                                        'write it as CSV to FILE when interrupted')
+    repl_table_parser.add_argument('-lagreport',
+                                   action='store_true',
+                                   help='Rank by bytesPending / putsPending and their growth instead of printing status ' +
+                                        '(at the end of -watch).')
 
     # track replica volume command
     repl_vol_parser = repl_sub_parser.add_parser('volume',
@@ -320,6 +520,30 @@ if __name__ == "__main__":
     repl_vol_parser.add_argument('-filter',
                                  help='Filter required fields (comma separated)',
                                  type=str)
+    repl_vol_parser.add_argument('-watch',
+                                 type=float,
+                                 metavar='INTERVAL',
+                                 help='Poll every INTERVAL seconds and print only replicas that changed')
+    repl_vol_parser.add_argument('-adaptive',
+                                 action='store_true',
+                                 help='With -watch, poll each table on its own interval: every INTERVAL seconds ' +
+                                      'while its replicas change, backing off to ' + str(config.replstatus_max_interval) +
+                                      's once they are up to date')
+    repl_vol_parser.add_argument('-output',
+                                 metavar='FILE',
+                                 help='Write status of every replica to FILE, with typed fields, instead of printing it')
+    repl_vol_parser.add_argument('-format',
+                                 choices=statusoutput.g_formats,
+                                 default='jsonl',
+                                 help='Format of -output (default: jsonl)')
+    repl_vol_parser.add_argument('-history',
+                                 metavar='FILE',
+                                 help='With -watch, keep the history of lag fields of every replica and ' +
+                                      'write it as CSV to FILE when interrupted')
+    repl_vol_parser.add_argument('-lagreport',
+                                 action='store_true',
+                                 help='Rank by bytesPending / putsPending and their growth instead of printing status ' +
+                                      '(at the end of -watch). Several volumes can be given to -path, comma separated')
 
     # execute stress profile
     stress_parser = sub_parsers.add_parser('stress',
@@ -329,14 +553,155 @@ if __name__ == "__main__":
     # bulk stress profile
     stress_bulk_parser = stress_sub_parser.add_parser('bulk',
                                                       help='Bulk profile of stress')
+    stress_bulk_parser.add_argument('-concurrentreplica',
+                                    action='store_true',
+                                    help='Set up all replicas of a table at the same time if specified')
+    stress_bulk_parser.add_argument('-resume',
+                                    action='store_true',
+                                    help='Skip steps recorded in the journal of a previous run if specified')
+    stress_bulk_parser.add_argument('-uptodate',
+                                    action='store_true',
+                                    help='Wait till every replica is up to date and report copy and catch-up times if specified')
+    stress_bulk_parser.add_argument('-shardid',
+                                    type=int,
+                                    default=0,
+                                    help='Shard run by this instance, from 0 to SHARDCOUNT - 1')
+    stress_bulk_parser.add_argument('-shardcount',
+                                    type=int,
+                                    default=1,
+                                    help='Number of instances sharing the profile. Each one owns a disjoint range of volumes ' +
+                                         '(or of tables, when there are fewer volumes than instances)')
+    stress_bulk_parser.add_argument('-reconcile',
+                                    action='store_true',
+                                    help='Only run operations for objects that do not exist yet if specified')
+    stress_bulk_parser.add_argument('-dryrun',
+                                    action='store_true',
+                                    help='With -reconcile, only show what would be done')
 
     # incremental stress profile
     stress_incr_parser = stress_sub_parser.add_parser('increment',
                                                       help='Incremental profile of stress')
+    stress_incr_parser.add_argument('-pipeline',
+                                    action='store_true',
+                                    help='Create, load and autosetup as concurrent stages if specified')
+    stress_incr_parser.add_argument('-concurrentreplica',
+                                    action='store_true',
+                                    help='Set up all replicas of a table at the same time if specified')
+    stress_incr_parser.add_argument('-resume',
+                                    action='store_true',
+                                    help='Skip steps recorded in the journal of a previous run if specified')
+    stress_incr_parser.add_argument('-uptodate',
+                                    action='store_true',
+                                    help='Wait till every replica is up to date and report copy and catch-up times if specified')
+    stress_incr_parser.add_argument('-shardid',
+                                    type=int,
+                                    default=0,
+                                    help='Shard run by this instance, from 0 to SHARDCOUNT - 1')
+    stress_incr_parser.add_argument('-shardcount',
+                                    type=int,
+                                    default=1,
+                                    help='Number of instances sharing the profile. Each one owns a disjoint range of volumes ' +
+                                         '(or of tables, when there are fewer volumes than instances)')
+    stress_incr_parser.add_argument('-agents',
+                                    help='Comma separated hosts to run table operations on, through agents started with ssh ' +
+                                         '("local" for agents in this process). This instance only creates volumes and hands out work. ' +
+                                         '-fake, -resume and -uptodate only work with "local" agents')
+
+    # agent for stress increment -agents
+    agent_parser = sub_parsers.add_parser('agent',
+                                          help='Run table operations handed out by a coordinator (stress increment -agents)')
+    agent_parser.add_argument('-connect',
+                              required=True,
+                              metavar='HOST:PORT',
+                              help='Address of the coordinator')
+    agent_parser.add_argument('-slots',
+                              type=int,
+                              default=config.fanout_slots,
+                              help='Number of operations run at the same time')
+
+    # query state index command
+    index_parser = sub_parsers.add_parser('index',
+                                          help='Query the state index (needs -statedb)')
+    index_sub_parser = index_parser.add_subparsers(help='type',
+                                                   dest='obj_type')
+    index_vol_parser = index_sub_parser.add_parser('volumes',
+                                                   help='List recorded volumes')
+    index_vol_parser.add_argument('-status',
+                                  help='Only volumes with this status')
+    index_table_parser = index_sub_parser.add_parser('tables',
+                                                     help='List recorded tables')
+    index_table_parser.add_argument('-volume',
+                                    help='Only tables in this volume')
+    index_table_parser.add_argument('-status',
+                                    help='Only tables with this status')
+    index_repl_parser = index_sub_parser.add_parser('replicas',
+                                                    help='List recorded replicas')
+    index_repl_parser.add_argument('-table',
+                                   help='Only replicas of this source table')
+    index_repl_parser.add_argument('-status',
+                                   help='Only replicas with this status')
+    index_status_parser = index_sub_parser.add_parser('status',
+                                                      help='List last observed replica status')
+    index_status_parser.add_argument('-table',
+                                     help='Only replicas of this source table')
+    index_loads_parser = index_sub_parser.add_parser('loads',
+                                                     help='List write throughput of loadtest per table')
+    index_loads_parser.add_argument('-volume',
+                                    help='Only tables in this volume')
+    index_uptodate_parser = index_sub_parser.add_parser('uptodate',
+                                                        help='List time taken by replicas to become up to date')
+    index_uptodate_parser.add_argument('-table',
+                                       help='Only replicas of this source table')
 
     args = parser.parse_args()
     print args
 
+    limiters = None
+    num_workers = config.num_workers
+    if config.adaptive_concurrency is True:
+        limiters = concurrency.LimiterGroup(initial=config.adaptive_initial_concurrency,
+                                            max_limit=config.adaptive_max_limit,
+                                            latency_tolerance=config.adaptive_latency_tolerance,
+                                            error_threshold=config.adaptive_error_threshold)
+        # The limiters decide how many commands run, the pool must not be what stops them from growing
+        num_workers = config.adaptive_max_limit
+        # Enough threads to keep the limits busy
+        utils.g_thread_count = num_workers
+    runner = None
+    if args.fake is True:
+        fake_cluster = fakecluster.FakeCluster(latencies=config.fake_latencies,
+                                               failure_rate=config.fake_failure_rate,
+                                               time_scale=config.fake_time_scale,
+                                               capacity=config.fake_capacity,
+                                               seed=config.fake_seed)
+        runner = fake_cluster.run
+    utils.g_executor = executor.CommandExecutor(num_workers=num_workers, limiters=limiters, runner=runner)
+    if args.cpuaware is True and args.fake is False:
+        utils.g_load_runner = loadrunner.LoadRunner(cpus_per_process=config.load_cpus_per_process,
+                                                    max_processes=config.load_max_processes,
+                                                    pin=config.load_pin_cpus)
+    if args.bulkload is not None:
+        if args.fake is False:
+            logging.error('-bulkload writes to a ' + args.bulkload + ' sink, not to the tables: use it with -fake')
+            sys.exit(-1)
+        utils.g_bulk_loader = bulkload.BulkLoader(bulkload.make_sink(args.bulkload, config.bulkload_dir),
+                                                  key_distribution=config.bulkload_key_distribution,
+                                                  key_space=config.bulkload_key_space,
+                                                  zipf_theta=config.bulkload_zipf_theta,
+                                                  columns=config.bulkload_columns,
+                                                  value_size=config.bulkload_value_size,
+                                                  value_size_max=config.bulkload_value_size_max,
+                                                  batch_size=config.bulkload_batch_size,
+                                                  seed=config.bulkload_seed)
+    utils.g_inventory.ttl = config.inventory_ttl
+    if args.statedb is not None:
+        utils.g_state_index = stateindex.StateIndex(args.statedb)
+    if args.metricsport is not None:
+        metrics.g_registry.register_gauge("commands_in_flight", lambda: utils.g_executor.in_flight)
+        metrics.g_registry.register_gauge("queue_depth", lambda: utils.g_executor.queue_depth(),
+                                          {"queue": "executor"})
+        metrics.start_http_server(args.metricsport)
+
     if args.cmd_name == 'create':
         logging.debug('Create command')
         if args.obj_type == 'table':
@@ -344,9 +709,10 @@ if __name__ == "__main__":
                                start_idx=args.startidx,
                                num_tables=args.numtables)
         elif args.obj_type == 'volume':
-            utils.create_volume(volume_path_prefix=args.prefix,
-                                start_idx=args.startidx,
-                                num_volumes=args.numvolumes)
+            utils.create_volume_multithread(volume_path_prefix=args.prefix,
+                                            start_idx=args.startidx,
+                                            num_volumes=args.numvolumes,
+                                            parallelism=args.parallelism)
         else:
             logging.error('Unrecognized object. Cannot create.')
             sys.exit(-1)
@@ -357,9 +723,10 @@ if __name__ == "__main__":
                                start_idx=args.startidx,
                                num_tables=args.numtables)
         elif args.obj_type == 'volume':
-            utils.delete_volume(volume_path_prefix=args.prefix,
-                                start_idx=args.startidx,
-                                num_volumes=args.numvolumes)
+            utils.delete_volume_multithread(volume_path_prefix=args.prefix,
+                                            start_idx=args.startidx,
+                                            num_volumes=args.numvolumes,
+                                            parallelism=args.parallelism)
         else:
             logging.error('Unrecognized object. Cannot create.')
             sys.exit(-1)
@@ -397,7 +764,56 @@ if __name__ == "__main__":
             sys.exit(-1)
     elif args.cmd_name == 'replstatus':
         logging.debug('Replica status tracking')
-        if args.obj_type == 'table':
+        if args.output is not None:
+            utils.g_status_writer = statusoutput.StatusWriter(args.output,
+                                                              utils.get_fields_to_track(args.filter),
+                                                              output_format=args.format)
+        if args.watch is not None:
+            if args.obj_type == 'table':
+                get_tables = lambda: [args.path]
+            else:
+                get_tables = lambda: [table for volume in args.path.split(',')
+                                      for table in utils.get_tables_in_volume(volume)]
+            aggregator = lagreport.LagAggregator(growing_polls=config.lag_growing_polls) \
+                if args.lagreport is True else None
+            store = None
+            if args.history is not None:
+                store = timeseries.TimeSeriesStore(capacity=config.history_capacity,
+                                                   coarse_capacity=config.history_coarse_capacity,
+                                                   downsample_factor=config.history_downsample_factor)
+            try:
+                if args.adaptive is True:
+                    monitor.watch_replica_status_adaptive(get_tables, args.filter,
+                                                          min_interval=args.watch,
+                                                          max_interval=config.replstatus_max_interval,
+                                                          budget_per_minute=config.replstatus_poll_budget,
+                                                          store=store,
+                                                          aggregator=aggregator)
+                else:
+                    monitor.watch_replica_status(get_tables, args.filter, args.watch,
+                                                 store=store, aggregator=aggregator)
+            except KeyboardInterrupt:
+                logging.info('Stopped watching')
+            finally:
+                if store is not None:
+                    rows = store.export_csv(args.history)
+                    logging.info("Wrote " + str(rows) + " samples of " + str(len(store.keys())) +
+                                 " replicas to " + args.history)
+                if aggregator is not None:
+                    print aggregator.report(top=config.lag_report_top)
+        elif args.lagreport is True:
+            aggregator = lagreport.LagAggregator(growing_polls=config.lag_growing_polls)
+            if args.obj_type == 'table':
+                list_of_data = utils.fetch_replica_status(args.path)
+                if list_of_data is not None:
+                    aggregator.add(args.path, list_of_data)
+            else:
+                for volume in args.path.split(','):
+                    utils.get_replica_status_multithread(volume_path=volume,
+                                                         fields=args.filter,
+                                                         aggregator=aggregator)
+            print aggregator.report(top=config.lag_report_top)
+        elif args.obj_type == 'table':
             utils.get_replica_status(table_name=args.path,
                                      fields=args.filter)
         elif args.obj_type == 'volume':
@@ -406,10 +822,99 @@ if __name__ == "__main__":
         else:
             logging.error('Unrecognized object. Cannot create.')
             sys.exit(-1)
+        if utils.g_status_writer is not None:
+            utils.g_status_writer.close()
 
     elif args.cmd_name == 'stress':
         logging.debug('Executing stress profile')
-        if args.obj_type == 'bulk':
-            execute_stress_bulk()
-        elif args.obj_type == 'increment':
-            execute_stress_incremental()
+        if args.obj_type == 'increment' and args.agents is not None and \
+                [host for host in args.agents.split(',') if host != "local"]:
+            # Remote agents run the table operations in their own process, with their own fake cluster,
+            # journal and up to date tracker, which this instance never sees
+            for option, is_set in [('-fake', args.fake), ('-resume', args.resume), ('-uptodate', args.uptodate)]:
+                if is_set is True:
+                    logging.error(option + ' only works with "local" agents, remote agents run the table '
+                                           'operations in their own process')
+                    sys.exit(-1)
+        journal_path = config.journal_path
+        leases = None
+        if args.shardcount > 1:
+            try:
+                assignment = sharding.ShardAssignment(args.shardid, args.shardcount,
+                                                      config.vol_start_index, config.num_src_vols,
+                                                      config.table_start_index, config.num_src_tables)
+            except ValueError as e:
+                logging.error(str(e))
+                sys.exit(-1)
+            logging.info(str(assignment))
+            config.vol_start_index, config.num_src_vols = assignment.vol_start_index, assignment.num_vols
+            config.table_start_index, config.num_src_tables = assignment.table_start_index, assignment.num_tables
+            if journal_path is not None:
+                journal_path += ".shard" + str(args.shardid)
+            if config.lease_dir is not None:
+                leases = sharding.LeaseSet(config.lease_dir, sharding.get_owner(args.shardid), config.lease_ttl)
+                try:
+                    leases.acquire(assignment.lease_names())
+                except sharding.LeaseError as e:
+                    logging.error(str(e))
+                    sys.exit(-1)
+        # A dry run completes no step, and must not move aside the journal a later -resume relies on
+        if journal_path is not None and not (args.obj_type == 'bulk' and args.dryrun is True):
+            utils.g_journal = journal.Journal(journal_path, resume=args.resume)
+        if args.uptodate is True:
+            utils.g_uptodate_tracker = uptodate.UptodateTracker()
+        try:
+            if config.num_src_vols == 0 or config.num_src_tables == 0:
+                logging.info('Nothing to do for this shard')
+            elif args.obj_type == 'bulk' and args.reconcile is True:
+                execute_stress_reconcile(dry_run=args.dryrun)
+            elif args.obj_type == 'bulk':
+                execute_stress_bulk(is_concurrent_replica=args.concurrentreplica)
+            elif args.obj_type == 'increment' and args.agents is not None:
+                execute_stress_fanout(args.agents.split(','), get_agent_global_args(args))
+            elif args.obj_type == 'increment':
+                execute_stress_incremental(is_pipelined=args.pipeline,
+                                           is_concurrent_replica=args.concurrentreplica)
+        finally:
+            if leases is not None:
+                leases.release()
+        if utils.g_uptodate_tracker is not None:
+            uptodate.wait_until_uptodate(utils.g_uptodate_tracker,
+                                         interval=config.uptodate_poll_interval,
+                                         timeout=config.uptodate_timeout)
+            print utils.g_uptodate_tracker.report()
+
+    elif args.cmd_name == 'agent':
+        coordinator_host, coordinator_port = args.connect.rsplit(':', 1)
+        fanout.run_agent(coordinator_host, int(coordinator_port), slots=args.slots)
+
+    elif args.cmd_name == 'index':
+        if utils.g_state_index is None:
+            logging.error('No state index. Specify -statedb or set state_db_path in config.py')
+            sys.exit(-1)
+        if args.obj_type == 'volumes':
+            rows = utils.g_state_index.list_volumes(status=args.status)
+        elif args.obj_type == 'tables':
+            rows = utils.g_state_index.list_tables(volume=args.volume, status=args.status)
+        elif args.obj_type == 'replicas':
+            rows = utils.g_state_index.list_replicas(src_table=args.table, status=args.status)
+        elif args.obj_type == 'loads':
+            rows = utils.g_state_index.list_table_loads(volume=args.volume)
+        elif args.obj_type == 'uptodate':
+            rows = utils.g_state_index.list_replica_uptodate(src_table=args.table)
+        else:
+            rows = utils.g_state_index.list_replica_status(src_table=args.table)
+        for row in rows:
+            print ", ".join(key + ": " + str(row[key]) for key in sorted(row.keys()))
+
+    # Per-operation latency summary of the commands issued during this run
+    if metrics.g_registry.snapshot():
+        print metrics.g_registry.summary()
+    if utils.g_bulk_loader is not None:
+        utils.g_bulk_loader.sink.close()
+    if loadstats.g_load_stats.results:
+        print loadstats.g_load_stats.summary()
+    if utils.g_load_runner is not None and utils.g_load_runner.stats:
+        print utils.g_load_runner.summary()
+    if args.metricsfile is not None:
+        metrics.g_registry.dump(args.metricsfile)
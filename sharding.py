@@ -0,0 +1,211 @@
+#!/usr/bin/python
+
+"""
+Splits the stress profiles across several instances of replication.py.
+Each instance (shard) owns a disjoint range of volume indexes, or of table indexes when there are fewer
+volumes than shards, and claims it with lease files in a directory shared by all instances.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+from threading import Thread, Event
+
+
+def get_shard_range(start_idx, count, shard_id, shard_count):
+    """
+    Splits [start_idx, start_idx + count) into shard_count contiguous ranges, as evenly as possible
+    :param start_idx: first index
+    :param count: number of indexes
+    :param shard_id: this shard, from 0 to shard_count - 1
+    :param shard_count: number of shards
+    :return: (first index, number of indexes) of the shard, the number may be 0
+    """
+    if shard_count < 1 or not 0 <= shard_id < shard_count:
+        raise ValueError("Shard id " + str(shard_id) + " out of range for " + str(shard_count) + " shards")
+    base, extra = divmod(count, shard_count)
+    first = start_idx + shard_id * base + min(shard_id, extra)
+    return first, base + (1 if shard_id < extra else 0)
+
+
+class ShardAssignment(object):
+    """
+    Part of the stress profile owned by one shard
+    """
+
+    def __init__(self, shard_id, shard_count, vol_start_index, num_vols, table_start_index, num_tables):
+        """
+        :param shard_id: this shard, from 0 to shard_count - 1
+        :param shard_count: number of shards
+        :param vol_start_index: first volume index of the whole profile
+        :param num_vols: number of volumes of the whole profile
+        :param table_start_index: first table index of the whole profile
+        :param num_tables: number of tables per volume of the whole profile
+        """
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        # Volumes are split when there are enough of them, otherwise every shard
+        # works on all volumes and the tables within them are split
+        self.by_volume = num_vols >= shard_count
+        if self.by_volume:
+            self.vol_start_index, self.num_vols = get_shard_range(vol_start_index, num_vols, shard_id, shard_count)
+            self.table_start_index, self.num_tables = table_start_index, num_tables
+        else:
+            self.vol_start_index, self.num_vols = vol_start_index, num_vols
+            self.table_start_index, self.num_tables = get_shard_range(table_start_index, num_tables,
+                                                                      shard_id, shard_count)
+
+    def lease_names(self):
+        """
+        :return: names of the leases covering the objects of this shard, one per volume or table index
+        """
+        if self.by_volume:
+            return ["volume-" + str(idx) for idx in xrange(self.vol_start_index, self.vol_start_index + self.num_vols)]
+        return ["table-" + str(idx) for idx in xrange(self.table_start_index, self.table_start_index + self.num_tables)]
+
+    def __str__(self):
+        return "shard " + str(self.shard_id) + "/" + str(self.shard_count) + \
+               ": volumes " + str(self.vol_start_index) + "+" + str(self.num_vols) + \
+               ", tables " + str(self.table_start_index) + "+" + str(self.num_tables)
+
+
+class LeaseError(Exception):
+    pass
+
+
+class LeaseSet(object):
+    """
+    Lease files held by this instance. A lease is a file created exclusively, kept alive by
+    updating its modification time. A lease not renewed for ttl seconds may be taken over.
+    """
+
+    def __init__(self, lease_dir, owner, ttl=60):
+        """
+        :param lease_dir: directory shared by all instances, e.g. on an NFS or /mapr mount
+        :param owner: identifies this instance, written into the lease files
+        :param ttl: seconds after which a lease that was not renewed is considered abandoned
+        """
+        self.lease_dir = lease_dir
+        self.owner = owner
+        self.ttl = ttl
+        self._held = []
+        self._stop = Event()
+        self._thread = None
+        if not os.path.isdir(lease_dir):
+            try:
+                os.makedirs(lease_dir)
+            except OSError:
+                # Created by another instance in the meantime
+                if not os.path.isdir(lease_dir):
+                    raise
+
+    def _path(self, name):
+        return os.path.join(self.lease_dir, name + ".lease")
+
+    def _try_acquire(self, name):
+        path = self._path(name)
+        content = json.dumps({'owner': self.owner, 'time': time.time()})
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0644)
+        except OSError:
+            try:
+                observed = os.stat(path)
+                with open(path) as lease_file:
+                    holder = json.load(lease_file).get('owner')
+            except (OSError, IOError, ValueError):
+                # Being written or removed right now
+                return False
+            if holder == self.owner:
+                return True
+            age = time.time() - observed.st_mtime
+            if age < self.ttl:
+                logging.error("Lease " + name + " is held by " + str(holder))
+                return False
+            logging.warning("Taking over lease " + name + " of " + str(holder) + ", not renewed for %.0fs" % age)
+            if not self._take_over(name, observed):
+                return False
+            return self._try_acquire(name)
+        with os.fdopen(fd, 'w') as lease_file:
+            lease_file.write(content)
+        return True
+
+    def _take_over(self, name, observed):
+        """
+        Removes a stale lease file, unless another instance took it over since it was observed.
+        The file is first renamed, which only one instance can do, and then checked to be the one observed:
+        an instance that saw the same stale lease may already have replaced it with its own.
+        :param name: lease name
+        :param observed: os.stat of the stale lease file
+        :return: True if the stale lease was removed
+        """
+        path = self._path(name)
+        moved = path + ".takeover." + self.owner
+        try:
+            os.rename(path, moved)
+        except OSError:
+            # Moved by another instance first
+            return False
+        try:
+            current = os.stat(moved)
+            if (current.st_ino, current.st_mtime) == (observed.st_ino, observed.st_mtime):
+                return True
+            # A fresh lease of the instance that took over first: put it back
+            logging.error("Lease " + name + " was taken over by another instance")
+            try:
+                os.link(moved, path)
+            except OSError:
+                logging.error("Could not restore lease " + name + " of another instance")
+            return False
+        finally:
+            try:
+                os.remove(moved)
+            except OSError:
+                pass
+
+    def acquire(self, list_of_names):
+        """
+        Acquires all leases, or none of them
+        :param list_of_names: lease names
+        :return: None. Raises LeaseError if a lease is held by another instance
+        """
+        for name in list_of_names:
+            if not self._try_acquire(name):
+                self.release()
+                raise LeaseError("Could not acquire lease " + name + " in " + self.lease_dir)
+            self._held.append(name)
+        self._thread = Thread(target=self._renew_loop, name="lease-renewal")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.ttl / 3.0):
+            for name in list(self._held):
+                try:
+                    os.utime(self._path(name), None)
+                except OSError:
+                    logging.error("Lost lease " + name)
+
+    def release(self):
+        """
+        Removes the lease files held by this instance
+        :return: None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for name in self._held:
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+        self._held = []
+
+
+def get_owner(shard_id):
+    """
+    :param shard_id: shard of this instance
+    :return: identifier of this instance: host, process id and shard
+    """
+    return socket.gethostname() + ":" + str(os.getpid()) + ":shard" + str(shard_id)
@@ -0,0 +1,289 @@
+#!/usr/bin/python
+
+"""
+Persistent sqlite index of the volumes, tables and replicas created by utils.py,
+with their status, timings and the last observed replica status fields.
+"""
+
+import json
+import sqlite3
+import time
+from threading import Lock
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    path TEXT PRIMARY KEY,
+    status TEXT,
+    duration REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS tables (
+    path TEXT PRIMARY KEY,
+    volume TEXT,
+    status TEXT,
+    create_duration REAL,
+    load_duration REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS tables_volume ON tables (volume);
+CREATE TABLE IF NOT EXISTS replicas (
+    src_table TEXT,
+    replica TEXT,
+    replica_type TEXT,
+    status TEXT,
+    setup_at REAL,
+    setup_duration REAL,
+    updated_at REAL,
+    PRIMARY KEY (src_table, replica)
+);
+CREATE TABLE IF NOT EXISTS replica_status (
+    src_table TEXT,
+    cluster TEXT,
+    replica TEXT,
+    replica_state TEXT,
+    is_uptodate INTEGER,
+    copy_percentage INTEGER,
+    bytes_pending INTEGER,
+    puts_pending INTEGER,
+    fields TEXT,
+    observed_at REAL,
+    PRIMARY KEY (src_table, cluster, replica)
+);
+CREATE TABLE IF NOT EXISTS replica_uptodate (
+    src_table TEXT,
+    replica TEXT,
+    replica_type TEXT,
+    setup_at REAL,
+    copy_duration REAL,
+    catchup_duration REAL,
+    PRIMARY KEY (src_table, replica)
+);
+CREATE TABLE IF NOT EXISTS table_loads (
+    path TEXT PRIMARY KEY,
+    volume TEXT,
+    num_rows INTEGER,
+    elapsed REAL,
+    rows_per_sec REAL,
+    rows_source TEXT,
+    errors INTEGER,
+    loaded_at REAL
+);
+"""
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return None
+    return str(value).lower() == "true"
+
+
+class StateIndex(object):
+    """
+    Thread safe wrapper around the sqlite database
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: path of the sqlite file (created if it does not exist)
+        """
+        self.db_path = db_path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record_volume(self, path, status, duration=None):
+        """
+        Deleting a volume deletes its tables, and the replicas of and in those tables, so they are marked deleted too.
+        :param path: volume path
+        :param status: created / deleted / failed
+        :param duration: time taken by the command in seconds
+        :return: None
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO volumes (path, status, duration, updated_at) "
+                               "VALUES (?, ?, ?, ?)", (path, status, duration, now))
+            if status == "deleted":
+                # Prefix compared as is: with LIKE, _ and % in the path would be wildcards
+                prefix = path.rstrip('/') + "/"
+                self._conn.execute("UPDATE tables SET status = 'deleted', updated_at = ? "
+                                   "WHERE volume = ? OR substr(path, 1, ?) = ?", (now, path, len(prefix), prefix))
+                self._conn.execute("UPDATE replicas SET status = 'deleted', updated_at = ? "
+                                   "WHERE substr(src_table, 1, ?) = ? OR substr(replica, 1, ?) = ?",
+                                   (now, len(prefix), prefix, len(prefix), prefix))
+            self._conn.commit()
+
+    def record_table(self, path, status, duration=None):
+        """
+        :param path: table path
+        :param status: created / loaded / deleted / failed / load_failed
+        :param duration: time taken by the command in seconds
+        :return: None
+        """
+        volume = path.rsplit('/', 1)[0] or '/'
+        duration_column = "load_duration" if status in ("loaded", "load_failed") else "create_duration"
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO tables (path, volume) VALUES (?, ?)", (path, volume))
+            self._conn.execute("UPDATE tables SET status = ?, " + duration_column + " = ?, updated_at = ? "
+                               "WHERE path = ?", (status, duration, time.time(), path))
+            self._conn.commit()
+
+    def record_replica(self, src_table, replica, replica_type, status, duration=None):
+        """
+        :param src_table: source table path
+        :param replica: replica table path, as given to autosetup
+        :param replica_type: crosscluster / intracluster / multimaster
+        :param status: setup / failed
+        :param duration: time taken by autosetup in seconds
+        :return: None
+        """
+        now = time.time()
+        setup_at = now - duration if duration is not None else now
+        self._write("INSERT OR REPLACE INTO replicas "
+                    "(src_table, replica, replica_type, status, setup_at, setup_duration, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (src_table, replica, replica_type, status, setup_at, duration, now))
+
+    def record_replica_status(self, src_table, data):
+        """
+        Stores the last observed status of a replica
+        :param src_table: source table path
+        :param data: one entry of "maprcli table replica list -json"
+        :return: None
+        """
+        self._write("INSERT OR REPLACE INTO replica_status "
+                    "(src_table, cluster, replica, replica_state, is_uptodate, copy_percentage, "
+                    "bytes_pending, puts_pending, fields, observed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (src_table, data.get('cluster'), data.get('table'), data.get('replicaState'),
+                     _to_bool(data.get('isUptodate')), _to_int(data.get('copyTableCompletionPercentage')),
+                     _to_int(data.get('bytesPending')), _to_int(data.get('putsPending')),
+                     json.dumps(data), time.time()))
+
+    def record_replica_uptodate(self, src_table, replica, replica_type, setup_at, copy_duration,
+                                catchup_duration):
+        """
+        :param src_table: source table path
+        :param replica: replica table path, as given to autosetup
+        :param replica_type: crosscluster / intracluster / multimaster
+        :param setup_at: time at which autosetup was started
+        :param copy_duration: seconds from autosetup till the copy was complete
+        :param catchup_duration: seconds from the end of the copy till the replica was up to date
+        :return: None
+        """
+        self._write("INSERT OR REPLACE INTO replica_uptodate "
+                    "(src_table, replica, replica_type, setup_at, copy_duration, catchup_duration) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (src_table, replica, replica_type, setup_at, copy_duration, catchup_duration))
+
+    def record_table_load(self, path, num_rows, elapsed, rows_per_sec, rows_source, errors):
+        """
+        :param path: table path
+        :param num_rows: rows written by loadtest
+        :param elapsed: seconds taken by loadtest
+        :param rows_per_sec: write throughput
+        :param rows_source: where num_rows comes from, see loadstats.LoadResult
+        :param errors: number of failed puts
+        :return: None
+        """
+        volume = path.rsplit('/', 1)[0] or '/'
+        self._write("INSERT OR REPLACE INTO table_loads "
+                    "(path, volume, num_rows, elapsed, rows_per_sec, rows_source, errors, loaded_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, volume, num_rows, elapsed, rows_per_sec, rows_source, errors, time.time()))
+
+    def list_volumes(self, status=None):
+        """
+        :param status: only volumes with this status (default = all)
+        :return: list of dicts
+        """
+        if status is None:
+            return self._read("SELECT * FROM volumes ORDER BY path")
+        return self._read("SELECT * FROM volumes WHERE status = ? ORDER BY path", (status,))
+
+    def list_tables(self, volume=None, status=None):
+        """
+        :param volume: only tables in this volume (default = all)
+        :param status: only tables with this status (default = all)
+        :return: list of dicts
+        """
+        clauses, params = [], []
+        if volume is not None:
+            clauses.append("volume = ?")
+            params.append(volume.rstrip('/'))
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return self._read("SELECT * FROM tables" + where + " ORDER BY path", params)
+
+    def list_replicas(self, src_table=None, status=None):
+        """
+        :param src_table: only replicas of this table (default = all)
+        :param status: only replicas with this status (default = all)
+        :return: list of dicts
+        """
+        clauses, params = [], []
+        if src_table is not None:
+            clauses.append("src_table = ?")
+            params.append(src_table)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return self._read("SELECT * FROM replicas" + where + " ORDER BY src_table, replica", params)
+
+    def list_replica_status(self, src_table=None):
+        """
+        :param src_table: only replicas of this table (default = all)
+        :return: list of dicts, without the raw fields
+        """
+        columns = "src_table, cluster, replica, replica_state, is_uptodate, copy_percentage, " \
+                  "bytes_pending, puts_pending, observed_at"
+        if src_table is None:
+            return self._read("SELECT " + columns + " FROM replica_status ORDER BY src_table, replica")
+        return self._read("SELECT " + columns + " FROM replica_status WHERE src_table = ? ORDER BY replica",
+                          (src_table,))
+
+    def list_table_loads(self, volume=None):
+        """
+        :param volume: only tables in this volume (default = all)
+        :return: list of dicts
+        """
+        if volume is None:
+            return self._read("SELECT * FROM table_loads ORDER BY path")
+        return self._read("SELECT * FROM table_loads WHERE volume = ? ORDER BY path", (volume,))
+
+    def list_replica_uptodate(self, src_table=None):
+        """
+        :param src_table: only replicas of this table (default = all)
+        :return: list of dicts
+        """
+        if src_table is None:
+            return self._read("SELECT * FROM replica_uptodate ORDER BY src_table, replica")
+        return self._read("SELECT * FROM replica_uptodate WHERE src_table = ? ORDER BY replica", (src_table,))
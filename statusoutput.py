@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+"""
+Structured (JSON Lines or CSV) output of replica status.
+Records are queued by any thread and written to the file by a single writer thread.
+"""
+
+import csv
+import json
+import logging
+import time
+import Queue
+from threading import Thread
+import utils
+
+g_formats = ['jsonl', 'csv']
+
+# Marks the end of the records
+_END = object()
+
+
+def make_status_record(src_table, data, fields_to_track, observed_at=None):
+    """
+    :param src_table: source table path
+    :param data: one entry of "maprcli table replica list -json"
+    :param fields_to_track: fields to keep, in order
+    :param observed_at: time of the poll (default = time.time())
+    :return: dict of typed fields (ints and bools instead of strings), missing fields are None
+    """
+    record = {'sourceTable': src_table, 'observedAt': observed_at if observed_at is not None else time.time()}
+    for field in fields_to_track:
+        record[field] = utils.get_replica_field(data, field)
+    if 'errors' in data:
+        record['errors'] = data['errors']
+    return record
+
+
+class StatusWriter(object):
+    """
+    Writes replica status records to a file, one record per line.
+    Call close() to flush the remaining records.
+    """
+
+    def __init__(self, path, fields_to_track, output_format='jsonl'):
+        """
+        :param path: output file
+        :param fields_to_track: replica status fields written, in order
+        :param output_format: jsonl or csv
+        """
+        if output_format not in g_formats:
+            raise ValueError("Unknown output format: " + str(output_format))
+        self.path = path
+        self.fields_to_track = list(fields_to_track)
+        self.columns = ['observedAt', 'sourceTable'] + list(fields_to_track) + ['errors']
+        self.output_format = output_format
+        self.count = 0
+        self._queue = Queue.Queue(maxsize=10000)
+        self._file = open(path, 'wb' if output_format == 'csv' else 'w')
+        self._thread = Thread(target=self._write_loop, name="status-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, record):
+        """
+        Queues a record, see make_status_record
+        :param record: dict of field name to value
+        :return: None
+        """
+        self._queue.put(record)
+
+    def write_status(self, src_table, list_of_data):
+        """
+        Queues one record per replica of a table
+        :param src_table: source table path
+        :param list_of_data: replica entries of "maprcli table replica list -json"
+        :return: None
+        """
+        observed_at = time.time()
+        for data in list_of_data:
+            self.write(make_status_record(src_table, data, self.fields_to_track, observed_at))
+
+    def _write_loop(self):
+        csv_writer = None
+        if self.output_format == 'csv':
+            csv_writer = csv.writer(self._file)
+            csv_writer.writerow(self.columns)
+        while True:
+            record = self._queue.get()
+            if record is _END:
+                break
+            try:
+                if csv_writer is not None:
+                    csv_writer.writerow([_to_csv_value(record.get(column)) for column in self.columns])
+                else:
+                    self._file.write(json.dumps(record, sort_keys=True) + "\n")
+                self.count += 1
+                # Keeps the file readable while a long -watch run is in progress
+                if self._queue.empty():
+                    self._file.flush()
+            except Exception:
+                logging.exception("Failed to write status record of " + str(record.get('sourceTable')))
+        self._file.close()
+
+    def close(self):
+        """
+        Writes the queued records and closes the file
+        :return: None
+        """
+        self._queue.put(_END)
+        self._thread.join()
+        logging.info("Wrote " + str(self.count) + " status records to " + self.path)
+
+
+def _to_csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
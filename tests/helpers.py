@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+"""
+Fixtures shared by the tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import executor
+import fakecluster
+import stateindex
+import utils
+
+
+class GlobalsTestCase(unittest.TestCase):
+    """
+    Test case with a temporary directory, and module globals (e.g. utils.g_executor) that are put back
+    as they were once the test is done
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def swap(self, module, name, value):
+        """
+        Sets module.name to value for the duration of the test
+        :return: value
+        """
+        self.addCleanup(setattr, module, name, getattr(module, name))
+        setattr(module, name, value)
+        return value
+
+    def use_fake_cluster(self, num_workers=4):
+        """
+        Runs the commands of utils.g_executor against a new fake cluster
+        :return: fakecluster.FakeCluster
+        """
+        cluster = fakecluster.FakeCluster(time_scale=0.0001, seed=1)
+        pool = self.swap(utils, 'g_executor', executor.CommandExecutor(num_workers=num_workers, runner=cluster.run))
+        self.addCleanup(pool.shutdown)
+        return cluster
+
+    def use_state_index(self):
+        """
+        Sets utils.g_state_index to a new state index in the temporary directory
+        :return: stateindex.StateIndex
+        """
+        index = self.swap(utils, 'g_state_index', stateindex.StateIndex(os.path.join(self.tmp_dir, "state.db")))
+        self.addCleanup(index.close)
+        return index
@@ -0,0 +1,39 @@
+#!/usr/bin/python
+
+"""
+Tests of the aggregation and comparison of benchmark runs
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+
+
+def _run(wall_time, commands_per_sec):
+    return {'wall_time': wall_time, 'cpu_time': 1.0, 'rss_growth_kb': 0, 'commands_per_sec': commands_per_sec}
+
+
+class BenchmarkCompareTest(unittest.TestCase):
+
+    def test_median_of_runs(self):
+        result = benchmark.summarize_runs([_run(1.0, 100.0), _run(3.0, 90.0), _run(2.0, 95.0)])
+        self.assertEqual((result['wall_time'], result['commands_per_sec'], result['runs']), (2.0, 95.0, 3))
+        self.assertEqual(result['spread']['wall_time'], 1.0)
+
+    def test_regression(self):
+        baseline = {'load': benchmark.summarize_runs([_run(1.0, 100.0)] * 3)}
+        results = {'load': benchmark.summarize_runs([_run(1.5, 66.0)] * 3)}
+        self.assertEqual(len(benchmark.compare(results, baseline, 0.2)), 2)
+
+    def test_noisy_runs_are_not_compared(self):
+        baseline = {'load': benchmark.summarize_runs([_run(1.0, 100.0)] * 3)}
+        results = {'load': benchmark.summarize_runs([_run(1.0, 100.0), _run(1.5, 66.0), _run(2.0, 50.0)])}
+        self.assertEqual(benchmark.compare(results, baseline, 0.2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
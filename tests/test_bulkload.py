@@ -0,0 +1,41 @@
+#!/usr/bin/python
+
+"""
+Tests of utils.load_table with the in-process bulk loader
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulkload
+import helpers
+import loadstats
+import metrics
+import utils
+
+
+class BulkLoadTableTest(helpers.GlobalsTestCase):
+
+    def setUp(self):
+        helpers.GlobalsTestCase.setUp(self)
+        self.sink = bulkload.MemorySink()
+        self.swap(utils, 'g_bulk_loader', bulkload.BulkLoader(self.sink, batch_size=100, seed=1,
+                                                             registry=metrics.MetricsRegistry()))
+        self.use_state_index()
+        self.swap(loadstats, 'g_load_stats', loadstats.LoadStats(metrics.MetricsRegistry()))
+
+    def test_sink_load_is_not_a_table_load(self):
+        result = utils.load_table("/vol/t", num_rows=250)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.argv[0], "bulkload")
+        self.assertEqual(self.sink.rows_written, {"/vol/t": 250})
+        self.assertEqual(loadstats.g_load_stats.results[0].rows_source, loadstats.ROWS_COUNTED)
+        self.assertEqual(utils.g_state_index.list_tables(), [])
+        self.assertEqual(utils.g_state_index.list_table_loads(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+"""
+Tests of the AIMD concurrency limits
+"""
+
+import os
+import sys
+import time
+import unittest
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import concurrency
+
+
+def _run_window(limiter, wall_time, ok=True):
+    # Commands run one after the other: the window is min(window, 2 * limit) commands
+    for _ in xrange(min(limiter.window, 2 * limiter.limit)):
+        limiter.acquire()
+        limiter.release(wall_time, ok)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_additive_increase_up_to_max(self):
+        limiter = concurrency.AdaptiveLimiter("table create", initial=2, max_limit=5, window=10)
+        _run_window(limiter, 0.1)
+        self.assertEqual(limiter.limit, 3)
+        for _ in xrange(5):
+            _run_window(limiter, 0.1)
+        self.assertEqual(limiter.limit, 5)
+
+    def test_errors_halve_the_limit(self):
+        limiter = concurrency.AdaptiveLimiter("table create", initial=8, window=10, error_threshold=0.1)
+        _run_window(limiter, 0.1, ok=False)
+        self.assertEqual(limiter.limit, 4)
+        for _ in xrange(5):
+            _run_window(limiter, 0.1, ok=False)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_latency_above_baseline_halves_the_limit(self):
+        limiter = concurrency.AdaptiveLimiter("table create", initial=8, window=10, latency_tolerance=2.0)
+        _run_window(limiter, 0.1)
+        self.assertEqual(limiter.limit, 9)
+        _run_window(limiter, 0.5)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_acquire_blocks_at_the_limit(self):
+        limiter = concurrency.AdaptiveLimiter("loadtest", initial=1, max_limit=1)
+        limiter.acquire()
+        acquired = []
+        waiter = Thread(target=lambda: acquired.append(limiter.acquire()))
+        waiter.daemon = True
+        waiter.start()
+        time.sleep(0.05)
+        self.assertEqual(acquired, [])
+        limiter.release(0.1)
+        waiter.join(5)
+        self.assertEqual((acquired, limiter.in_flight), ([None], 1))
+
+    def test_group_has_one_limiter_per_operation(self):
+        group = concurrency.LimiterGroup(initial=3)
+        self.assertIs(group.get("loadtest"), group.get("loadtest"))
+        group.get("table create")
+        self.assertEqual(group.limits(), {"loadtest": 3, "table create": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+
+"""
+Tests of executor.CommandExecutor
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import concurrency
+import executor
+import metrics
+
+
+def _failing_runner(argv):
+    raise OSError("No such file or directory: " + argv[0])
+
+
+class CommandExecutorTest(unittest.TestCase):
+
+    def test_runner_exception_gives_failed_result(self):
+        limiters = concurrency.LimiterGroup(initial=1, max_limit=1)
+        pool = executor.CommandExecutor(num_workers=1, limiters=limiters, registry=metrics.MetricsRegistry(),
+                                        runner=_failing_runner)
+        try:
+            result = pool.run(["/no/such/loadtest", "-table", "/t"])
+            self.assertFalse(result.ok)
+            self.assertNotEqual(result.returncode, 0)
+            self.assertIn("No such file or directory", result.stderr)
+            # The worker and the limit slot survived, the next command runs too
+            self.assertFalse(pool.run(["/no/such/loadtest", "-table", "/t2"]).ok)
+            self.assertEqual(pool.in_flight, 0)
+        finally:
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
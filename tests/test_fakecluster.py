@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+"""
+Tests of the fake cluster model
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakecluster
+
+
+class FakeClusterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cluster = fakecluster.FakeCluster(time_scale=0.0001, seed=1)
+
+    def _run(self, *argv):
+        result = self.cluster.run(list(argv))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result
+
+    def _replicas(self, src_table):
+        result = self._run("maprcli", "table", "replica", "list", "-path", src_table, "-json")
+        return [data['table'] for data in json.loads(result.stdout)['data']]
+
+    def test_volume_remove_drops_replicas_in_it(self):
+        for name in ["src", "repl"]:
+            self._run("maprcli", "volume", "create", "-name", name, "-path", "/" + name)
+        self._run("maprcli", "table", "create", "-path", "/src/t")
+        self._run("maprcli", "table", "replica", "autosetup", "-path", "/src/t", "-replica", "/repl/r1")
+        self._run("maprcli", "table", "replica", "autosetup", "-path", "/src/t", "-replica", "/src/r2")
+        self.assertEqual(self._replicas("/src/t"), ["/repl/r1", "/src/r2"])
+
+        self._run("maprcli", "volume", "remove", "-name", "repl")
+        self.assertEqual(self._replicas("/src/t"), ["/src/r2"])
+        self._run("maprcli", "table", "delete", "-path", "/src/r2")
+        self.assertEqual(self._replicas("/src/t"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+"""
+Tests of the coordinator / agent work queue
+"""
+
+import json
+import os
+import socket
+import sys
+import unittest
+from threading import Lock, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fanout
+import helpers
+import metrics
+
+
+class CoordinatorTest(helpers.GlobalsTestCase):
+
+    def setUp(self):
+        helpers.GlobalsTestCase.setUp(self)
+        self.swap(fanout, 'g_operations', dict(fanout.g_operations, echo=lambda value: value))
+        self.results = []
+        self._lock = Lock()
+
+    def _start(self, max_attempts=3):
+        coordinator = fanout.Coordinator(('localhost', 0), max_attempts, metrics.MetricsRegistry())
+        self.addCleanup(coordinator.shutdown)
+        return coordinator
+
+    def _on_done(self, task, result):
+        with self._lock:
+            self.results.append((task.args[0], task.attempts, fanout.is_result_ok(result), result.get('value')))
+
+    def _take_task_and_disconnect(self, coordinator):
+        # Agent that dies while running its task
+        sock = socket.create_connection(('localhost', coordinator.address[1]))
+        rfile = sock.makefile('rb')
+        sock.sendall(json.dumps({'type': 'hello', 'agent': "dying"}) + "\n")
+        task = json.loads(rfile.readline())
+        rfile.close()
+        sock.close()
+        return task
+
+    def test_task_of_disconnected_agent_is_handed_out_again(self):
+        coordinator = self._start()
+        coordinator.submit('echo', [1], on_done=self._on_done)
+        self.assertEqual(self._take_task_and_disconnect(coordinator)['args'], [1])
+        agents = fanout.start_agents(["local"], "localhost", coordinator.address[1], 1, self.tmp_dir)
+        self.assertTrue(coordinator.wait(agents, connect_timeout=10))
+        coordinator.shutdown()
+        fanout.wait_agents(agents, timeout=10)
+        self.assertEqual(self.results, [(1, 2, True, 1)])
+        self.assertEqual(coordinator.agents, set(["dying", "local/0"]))
+
+    def test_task_fails_after_max_attempts(self):
+        coordinator = self._start(max_attempts=1)
+        coordinator.submit('echo', [1], on_done=self._on_done)
+        self._take_task_and_disconnect(coordinator)
+        self.assertTrue(coordinator.wait(None, connect_timeout=10))
+        self.assertEqual(self.results, [(1, 1, False, None)])
+
+    def test_dead_agents_fail_the_queue(self):
+        coordinator = self._start()
+        for value in [1, 2]:
+            coordinator.submit('echo', [value], on_done=self._on_done)
+        dead = Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        self.assertFalse(coordinator.wait([dead], connect_timeout=60))
+        self.assertEqual(sorted(self.results), [(1, 0, False, None), (2, 0, False, None)])
+
+    def test_no_agent_connecting_fails_the_queue(self):
+        coordinator = self._start()
+        coordinator.submit('echo', [1], on_done=self._on_done)
+        self.assertFalse(coordinator.wait(None, connect_timeout=0.5))
+        self.assertEqual(self.results, [(1, 0, False, None)])
+
+    def test_later_steps_go_first(self):
+        coordinator = self._start()
+        for op in ['create_table', 'autosetup_replica', 'load_table']:
+            coordinator.submit(op, [op])
+        self.assertEqual([coordinator._next_task().op for _ in xrange(3)],
+                         ['autosetup_replica', 'load_table', 'create_table'])
+
+
+if __name__ == '__main__':
+    unittest.main()
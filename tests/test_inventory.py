@@ -0,0 +1,55 @@
+#!/usr/bin/python
+
+"""
+Tests of the cache of tables per volume
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inventory
+
+
+class TableInventoryTest(unittest.TestCase):
+
+    def test_changes_update_cached_listings(self):
+        tables = inventory.TableInventory(ttl=300)
+        self.assertIsNone(tables.get("/vol"))
+        tables.put("/vol/", ["/vol/t2", "/vol/t1"])
+        tables.add_table("/vol/t3")
+        tables.remove_table("/vol/t1")
+        # Volumes that are not cached stay unknown
+        tables.add_table("/other/t1")
+        self.assertEqual(tables.get("/vol"), ["/vol/t2", "/vol/t3"])
+        self.assertIsNone(tables.get("/other"))
+
+    def test_listing_racing_with_a_change_is_dropped(self):
+        tables = inventory.TableInventory(ttl=300)
+        generation = tables.generation("/vol")
+        tables.add_table("/vol/t2")
+        tables.put("/vol", ["/vol/t1"], generation)
+        self.assertIsNone(tables.get("/vol"))
+        tables.put("/vol", ["/vol/t1", "/vol/t2"], tables.generation("/vol"))
+        self.assertEqual(tables.get("/vol"), ["/vol/t1", "/vol/t2"])
+
+    def test_expiry_and_invalidate(self):
+        tables = inventory.TableInventory(ttl=0.01)
+        tables.put("/vol", ["/vol/t1"])
+        time.sleep(0.02)
+        self.assertIsNone(tables.get("/vol"))
+        tables.ttl = None
+        tables.put("/vol", ["/vol/t1"])
+        tables.put("/vol2", ["/vol2/t1"])
+        tables.invalidate("/vol")
+        self.assertIsNone(tables.get("/vol"))
+        self.assertEqual(tables.get("/vol2"), ["/vol2/t1"])
+        tables.invalidate()
+        self.assertIsNone(tables.get("/vol2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+"""
+Tests of the journal of completed steps
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "stress.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _record(self, resume, obj):
+        steps = journal.Journal(self.path, resume=resume)
+        steps.record(obj, "created")
+        steps.close()
+
+    def test_resume_keeps_steps(self):
+        self._record(False, "/vol1")
+        self._record(True, "/vol2")
+        steps = journal.Journal(self.path, resume=True)
+        self.assertTrue(steps.is_done("/vol1", "created"))
+        self.assertTrue(steps.is_done("/vol2", "created"))
+        steps.close()
+
+    def test_new_run_moves_previous_journal_aside(self):
+        self._record(False, "/vol1")
+        self._record(False, "/vol2")
+        self._record(False, "/vol3")
+        rotated = sorted(name for name in os.listdir(self.tmp_dir) if name != "stress.journal")
+        self.assertEqual(len(rotated), 2)
+        for name, obj in zip(rotated, ["/vol1", "/vol2"]):
+            steps = journal.Journal(os.path.join(self.tmp_dir, name), resume=True)
+            self.assertTrue(steps.is_done(obj, "created"))
+            steps.close()
+        steps = journal.Journal(self.path, resume=True)
+        self.assertFalse(steps.is_done("/vol1", "created"))
+        self.assertTrue(steps.is_done("/vol3", "created"))
+        steps.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+"""
+Tests of the parsing of loadtest output. The samples are the summary line forms the patterns accept,
+no real loadtest output was available to capture them from: loads whose output is not matched are reported.
+"""
+
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import executor
+import loadstats
+import metrics
+
+LOADTEST_CMD = "/opt/mapr/server/tools/loadtest -mode put -table /vol/t -numrows 1000 -numfamilies 1 -numcols 3"
+
+SUMMARY_OUTPUT = """Connecting to /vol/t
+Inserted 1000 rows into /vol/t
+Elapsed time: 2.5 s
+Put rate: 400.0 rows/sec
+Failed puts: 0
+Average latency: 1.5 ms
+"""
+
+
+class ParseLoadtestOutputTest(unittest.TestCase):
+
+    def test_summary(self):
+        self.assertEqual(loadstats.parse_loadtest_output(SUMMARY_OUTPUT),
+                         {'rows': 1000, 'elapsed': 2.5, 'rows_per_sec': 400.0, 'errors': 0, 'mean_latency': 0.0015})
+
+    def test_alternative_forms(self):
+        parsed = loadstats.parse_loadtest_output("Total puts: 500\nElapsed: 1200 ms\nErrors: 3\n")
+        self.assertEqual(parsed, {'rows': 500, 'elapsed': 1.2, 'errors': 3})
+
+    def test_echoed_command_is_not_a_summary(self):
+        self.assertEqual(loadstats.parse_loadtest_output(LOADTEST_CMD + "\n"), {})
+
+    def test_durations_need_a_unit(self):
+        self.assertEqual(loadstats.parse_loadtest_output("Elapsed: 12\nAverage latency: 3\n"), {})
+
+    def test_last_summary_wins(self):
+        parsed = loadstats.parse_loadtest_output("Inserted 10 rows\nInserted 1000 rows into /vol/t\n")
+        self.assertEqual(parsed['rows'], 1000)
+
+
+class MakeLoadResultTest(unittest.TestCase):
+
+    def test_measured(self):
+        result = executor.CommandResult(LOADTEST_CMD.split(), 0, SUMMARY_OUTPUT, "", 3.0)
+        load_result = loadstats.make_load_result("/vol/t", 1000, result)
+        self.assertTrue(load_result.is_measured)
+        self.assertEqual(load_result.rows_source, loadstats.ROWS_FROM_OUTPUT)
+        self.assertEqual(load_result.elapsed_source, loadstats.ELAPSED_FROM_OUTPUT)
+        self.assertEqual(load_result.rows_per_sec, 400.0)
+
+    def test_elapsed_from_rate(self):
+        result = executor.CommandResult(LOADTEST_CMD.split(), 0, "Inserted 1000 rows\nPut rate: 500 rows/sec\n", "",
+                                        3.0)
+        load_result = loadstats.make_load_result("/vol/t", 1000, result)
+        self.assertEqual(load_result.elapsed_source, loadstats.ELAPSED_FROM_RATE)
+        self.assertEqual(load_result.elapsed, 2.0)
+
+    def test_no_summary_is_derived(self):
+        result = executor.CommandResult(LOADTEST_CMD.split(), 0, LOADTEST_CMD + "\nElapsed: 12\n", "", 4.0)
+        load_result = loadstats.make_load_result("/vol/t", 1000, result)
+        self.assertFalse(load_result.is_measured)
+        self.assertEqual(load_result.rows_source, loadstats.ROWS_REQUESTED)
+        self.assertEqual(load_result.elapsed_source, loadstats.ELAPSED_WALL_TIME)
+        self.assertEqual((load_result.rows, load_result.elapsed, load_result.errors), (1000, 4.0, 0))
+
+    def test_unmatched_output_is_reported_once(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logging.getLogger().addHandler(handler)
+        loadstats.g_warned_unmatched = False
+        try:
+            for table in ["/vol/t1", "/vol/t2"]:
+                result = executor.CommandResult(LOADTEST_CMD.split(), 0, "Done\n", "", 1.0)
+                loadstats.make_load_result(table, 1000, result)
+        finally:
+            logging.getLogger().removeHandler(handler)
+        warnings = [record for record in records if record.levelno == logging.WARNING]
+        self.assertEqual(len(warnings), 1)
+        self.assertTrue("/vol/t1" in warnings[0].getMessage())
+
+    def test_failure_without_summary(self):
+        result = executor.CommandResult(LOADTEST_CMD.split(), 1, "", "table not found", 0.5)
+        load_result = loadstats.make_load_result("/vol/t", 1000, result)
+        self.assertEqual((load_result.rows, load_result.errors, load_result.ok), (0, 1, False))
+
+
+class LoadStatsTest(unittest.TestCase):
+
+    def test_derived_rows_are_not_throughput(self):
+        registry = metrics.MetricsRegistry()
+        stats = loadstats.LoadStats(registry)
+        stats.add(loadstats.LoadResult("/vol/t1", 1000, 2.0, 0, True, loadstats.ROWS_FROM_OUTPUT,
+                                       loadstats.ELAPSED_FROM_OUTPUT, end_time=10.0))
+        stats.add(loadstats.LoadResult("/vol/t2", 5000, 1.0, 0, True, loadstats.ROWS_REQUESTED,
+                                       loadstats.ELAPSED_WALL_TIME, end_time=10.0))
+        aggregate = stats.aggregate()
+        self.assertEqual((aggregate['tables'], aggregate['unmeasured_tables']), (2, 1))
+        self.assertEqual((aggregate['rows'], aggregate['assumed_rows']), (1000, 5000))
+        self.assertEqual(aggregate['rows_per_sec'], 500.0)
+        self.assertEqual(aggregate['table_rows_per_sec_max'], 500.0)
+        self.assertTrue("1 tables did not report rows written (5000 rows assumed written)" in stats.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
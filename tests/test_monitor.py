@@ -0,0 +1,60 @@
+#!/usr/bin/python
+
+"""
+Tests of the adaptive replica status polling
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import monitor
+
+STABLE = {'isUptodate': True, 'copyTableCompletionPercentage': 100, 'bytesPending': 0, 'putsPending': 0}
+COPYING = {'isUptodate': False, 'copyTableCompletionPercentage': 40, 'bytesPending': 1000, 'putsPending': 0}
+
+
+class AdaptivePollSchedulerTest(unittest.TestCase):
+
+    def test_stable_tables_back_off_and_changes_reset(self):
+        scheduler = monitor.AdaptivePollScheduler(min_interval=5, max_interval=60)
+        scheduler.set_tables(["/t1"], now=0)
+        self.assertEqual(scheduler.due_tables(now=0), ["/t1"])
+        intervals = [scheduler.report("/t1", [STABLE], False, now=0) for _ in xrange(5)]
+        self.assertEqual(intervals, [10, 20, 40, 60, 60])
+        self.assertEqual(scheduler.report("/t1", [COPYING], True, now=0), 5)
+        self.assertEqual(scheduler.report("/t1", [COPYING], False, now=0), 7.5)
+        # A failed poll keeps the interval
+        self.assertEqual(scheduler.report("/t1", None, False, now=0), 7.5)
+
+    def test_due_tables_most_overdue_first(self):
+        scheduler = monitor.AdaptivePollScheduler(min_interval=5, max_interval=60)
+        scheduler.set_tables(["/t1", "/t2", "/t3"], now=0)
+        scheduler.report("/t1", [COPYING], True, now=0)
+        scheduler.report("/t2", [STABLE], False, now=0)
+        scheduler.report("/t3", [COPYING], True, now=1)
+        self.assertEqual(scheduler.due_tables(now=4), [])
+        self.assertEqual(scheduler.next_wakeup(now=4), 1)
+        self.assertEqual(scheduler.due_tables(now=10), ["/t1", "/t3", "/t2"])
+        scheduler.set_tables(["/t2"], now=10)
+        self.assertEqual(scheduler.due_tables(now=10), ["/t2"])
+
+    def test_budget_limits_polls(self):
+        scheduler = monitor.AdaptivePollScheduler(min_interval=1, max_interval=60, budget_per_minute=2)
+        scheduler.set_tables(["/t1", "/t2", "/t3"], now=0)
+        self.assertEqual(len(scheduler.due_tables(now=0)), 2)
+        self.assertEqual(scheduler.due_tables(now=1), [])
+        self.assertEqual(scheduler.next_wakeup(now=1), 29)
+        self.assertEqual(len(scheduler.due_tables(now=30)), 1)
+
+    def test_missing_copy_percentage_is_stable(self):
+        data = dict(STABLE)
+        del data['copyTableCompletionPercentage']
+        self.assertTrue(monitor.is_replica_stable(data))
+        self.assertFalse(monitor.is_replica_stable(COPYING))
+
+
+if __name__ == '__main__':
+    unittest.main()
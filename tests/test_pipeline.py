@@ -0,0 +1,65 @@
+#!/usr/bin/python
+
+"""
+Tests of the staged pipeline
+"""
+
+import os
+import sys
+import unittest
+from threading import Lock, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+
+
+def _run_with_timeout(items, stages, timeout=10):
+    runner = Thread(target=pipeline.run_pipeline, args=(items, stages), kwargs={'queue_size': 2})
+    runner.daemon = True
+    runner.start()
+    runner.join(timeout)
+    return not runner.is_alive()
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_items_go_through_every_stage(self):
+        done, lock = [], Lock()
+
+        def collect(item):
+            with lock:
+                done.append(item)
+            return item
+
+        stages = [pipeline.Stage("double", lambda item: item * 2, num_workers=3),
+                  pipeline.Stage("increment", lambda item: item + 1, num_workers=2),
+                  pipeline.Stage("collect", collect)]
+        self.assertTrue(_run_with_timeout(range(20), stages))
+        self.assertEqual(sorted(done), [2 * i + 1 for i in range(20)])
+
+    def test_failed_items_are_dropped_and_counted(self):
+        def fail_odd(item):
+            if item % 2:
+                raise ValueError("odd")
+            return item
+
+        seen = []
+        stages = [pipeline.Stage("none_on_3", lambda item: None if item == 3 else item, num_workers=2),
+                  pipeline.Stage("fail_odd", fail_odd, num_workers=2),
+                  pipeline.Stage("collect", lambda item: seen.append(item) or item)]
+        self.assertTrue(_run_with_timeout(range(10), stages))
+        self.assertEqual(sorted(seen), [0, 2, 4, 6, 8])
+        self.assertEqual([stage.dropped for stage in stages], [1, 4, 0])
+
+    def test_shuts_down_when_every_item_fails(self):
+        def fail(item):
+            raise RuntimeError("down")
+
+        stages = [pipeline.Stage("fail", fail, num_workers=4), pipeline.Stage("never", lambda item: item)]
+        self.assertTrue(_run_with_timeout(range(50), stages))
+        self.assertEqual(stages[0].dropped, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+
+"""
+Tests of reconcile with the state index, against the fake cluster
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+import inventory
+import reconcile
+import utils
+
+
+class ReconcileAfterDeleteTest(helpers.GlobalsTestCase):
+
+    def setUp(self):
+        helpers.GlobalsTestCase.setUp(self)
+        self.cluster = self.use_fake_cluster()
+        self.use_state_index()
+        self.swap(utils, 'g_inventory', inventory.TableInventory(ttl=300))
+        self.volumes = ["/src00001", "/src00002"]
+        self.replica_specs = [("/repl00001", 1, False)]
+
+    def _reconcile(self, dry_run=False):
+        return reconcile.reconcile(self.volumes, "table", 1, 3, self.replica_specs, 1, 1, 10, dry_run=dry_run)
+
+    def test_delete_then_reconcile_recreates_children(self):
+        utils.create_single_volume("/repl00001")
+        self._reconcile()
+        self.assertTrue(self._reconcile(dry_run=True).is_empty())
+
+        utils.delete_single_volume("/src00001")
+        utils.delete_single_volume("/repl00001")
+        self.assertEqual(set(row['status'] for row in utils.g_state_index.list_tables(volume="/src00001")),
+                         set(["deleted"]))
+
+        utils.create_single_volume("/repl00001")
+        plan = self._reconcile(dry_run=True)
+        self.assertEqual(plan.volumes_to_create, ["/src00001"])
+        self.assertEqual(sorted(plan.tables_to_create), ["/src00001/table0000" + str(i) for i in (1, 2, 3)])
+        self.assertEqual(sorted(plan.tables_to_load), ["/src00001/table0000" + str(i) for i in (1, 2, 3)])
+        self.assertEqual(len(plan.replicas_to_setup), 6)
+
+        self._reconcile()
+        for i in (1, 2, 3):
+            table = "/src00001/table0000" + str(i)
+            self.assertEqual(self.cluster.run(["maprcli", "table", "replica", "list", "-path", table,
+                                               "-json"]).returncode, 0)
+        self.assertTrue(self._reconcile(dry_run=True).is_empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+"""
+Tests of shard ranges and lease files
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sharding
+
+
+class ShardRangeTest(unittest.TestCase):
+
+    def test_ranges_cover_all_indexes_once(self):
+        ranges = [sharding.get_shard_range(1, 10, shard_id, 3) for shard_id in xrange(3)]
+        self.assertEqual(ranges, [(1, 4), (5, 3), (8, 3)])
+
+    def test_fewer_volumes_than_shards_splits_tables(self):
+        assignment = sharding.ShardAssignment(1, 2, 1, 1, 1, 5)
+        self.assertFalse(assignment.by_volume)
+        self.assertEqual(assignment.lease_names(), ["table-4", "table-5"])
+
+
+class LeaseSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lease_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.lease_dir, "volume-1.lease")
+
+    def tearDown(self):
+        shutil.rmtree(self.lease_dir)
+
+    def _write_stale_lease(self, owner):
+        with open(self.path, 'w') as lease_file:
+            json.dump({'owner': owner, 'time': 0}, lease_file)
+        old = time.time() - 3600
+        os.utime(self.path, (old, old))
+
+    def _holder(self):
+        with open(self.path) as lease_file:
+            return json.load(lease_file)['owner']
+
+    def test_lease_held_by_another_instance(self):
+        first = sharding.LeaseSet(self.lease_dir, "first", ttl=60)
+        first.acquire(["volume-1"])
+        second = sharding.LeaseSet(self.lease_dir, "second", ttl=60)
+        self.assertRaises(sharding.LeaseError, second.acquire, ["volume-1"])
+        self.assertEqual(self._holder(), "first")
+        first.release()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_lease_is_taken_over(self):
+        self._write_stale_lease("dead")
+        leases = sharding.LeaseSet(self.lease_dir, "alive", ttl=60)
+        leases.acquire(["volume-1"])
+        self.assertEqual(self._holder(), "alive")
+        leases.release()
+
+    def test_concurrent_takeover_has_one_winner(self):
+        # Both instances saw the same stale lease, the first one takes it over before the second one acts
+        self._write_stale_lease("dead")
+        observed = os.stat(self.path)
+        first = sharding.LeaseSet(self.lease_dir, "first", ttl=60)
+        first.acquire(["volume-1"])
+        second = sharding.LeaseSet(self.lease_dir, "second", ttl=60)
+        self.assertFalse(second._take_over("volume-1", observed))
+        self.assertEqual(self._holder(), "first")
+        self.assertEqual(os.listdir(self.lease_dir), ["volume-1.lease"])
+        first.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+"""
+Tests of the state index
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stateindex
+
+
+class VolumeDeleteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index = stateindex.StateIndex(os.path.join(self.tmp_dir, "state.db"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _statuses(self):
+        return dict((row['path'], row['status']) for row in self.index.list_tables())
+
+    def test_delete_marks_only_children(self):
+        for table in ["/vol_1/t1", "/volX1/t1", "/vol%/t1", "/vol_10/t1"]:
+            self.index.record_table(table, "created")
+        self.index.record_replica("/vol_1/t1", "/repl/r1", "intracluster", "setup")
+        self.index.record_replica("/volX1/t1", "/vol_1/r2", "intracluster", "setup")
+        self.index.record_replica("/volX1/t1", "/repl/r3", "intracluster", "setup")
+        self.index.record_volume("/vol_1", "deleted")
+        self.index.record_volume("/vol%", "deleted")
+        self.assertEqual(self._statuses(), {"/vol_1/t1": "deleted", "/volX1/t1": "created",
+                                            "/vol%/t1": "deleted", "/vol_10/t1": "created"})
+        self.assertEqual(dict((row['replica'], row['status']) for row in self.index.list_replicas()),
+                         {"/repl/r1": "deleted", "/vol_1/r2": "deleted", "/repl/r3": "setup"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+#!/usr/bin/python
+
+"""
+Tests of the typed replica status records
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statusoutput
+import utils
+
+
+class StatusRecordTest(unittest.TestCase):
+
+    def test_field_types(self):
+        data = {'table': '/repl/t', 'paused': "false", 'isUptodate': "true", 'networkcompression': "lz4",
+                'bytesPending': "1024", 'copyTableCompletionPercentage': "not a number"}
+        record = statusoutput.make_status_record("/src/t", data, utils.g_all_replica_fields, observed_at=1.0)
+        self.assertEqual(record['table'], '/repl/t')
+        self.assertIs(record['paused'], False)
+        self.assertIs(record['isUptodate'], True)
+        self.assertEqual(record['networkcompression'], "lz4")
+        self.assertEqual(record['bytesPending'], 1024)
+        self.assertIsNone(record['copyTableCompletionPercentage'])
+        self.assertIsNone(record['uuid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+"""
+Tests of the replica lag history
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import timeseries
+
+
+class ReplicaSeriesTest(unittest.TestCase):
+
+    def test_evicted_samples_are_downsampled_to_their_max(self):
+        series = timeseries.ReplicaSeries(1, capacity=2, coarse_capacity=2, downsample_factor=2)
+        for i, value in enumerate([5, 1, 2, 7, 3, 4, 9]):
+            series.append(float(i), [value])
+        # 5, 1 -> 5 at t=1, 2, 7 -> 7 at t=3, then 3 pending, 4 and 9 raw
+        self.assertEqual(series.samples(0), [(1.0, 5), (3.0, 7), (5.0, 4), (6.0, 9)])
+
+    def test_rings_grow_with_samples(self):
+        series = timeseries.ReplicaSeries(5, capacity=120, coarse_capacity=288, downsample_factor=360)
+        series.append(0.0, [0] * 5)
+        self.assertEqual(series.raw.nbytes() + series.coarse.nbytes(), 48)
+
+    def test_default_retention_covers_days(self):
+        # -watch 5 for a week
+        interval = 5
+        series = timeseries.ReplicaSeries(1, config.history_capacity, config.history_coarse_capacity,
+                                          config.history_downsample_factor)
+        for i in xrange(7 * 86400 / interval):
+            series.append(float(i * interval), [i])
+        samples = series.samples(0)
+        self.assertEqual(len(samples), config.history_capacity + config.history_coarse_capacity)
+        oldest_covered = samples[0][0] - (config.history_downsample_factor - 1) * interval
+        self.assertTrue(samples[-1][0] - oldest_covered >= 6 * 86400)
+        self.assertTrue(series.raw.nbytes() + series.coarse.nbytes() <= 20 * 1024)
+
+
+class TimeSeriesStoreTest(unittest.TestCase):
+
+    def test_missing_values_and_since(self):
+        store = timeseries.TimeSeriesStore(fields=['bytesPending'], capacity=10)
+        key = ("/src/t", "c", "/repl/t")
+        store.record(key, {'bytesPending': "100"}, 1.0)
+        store.record(key, {}, 2.0)
+        self.assertEqual(store.get(key, 'bytesPending'), [(1.0, 100), (2.0, timeseries.g_missing)])
+        self.assertEqual(store.get(key, 'bytesPending', since=2.0), [(2.0, timeseries.g_missing)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+
+"""
+Tests of the tracking of replicas till they are up to date
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uptodate
+
+
+class UptodateTrackerTest(unittest.TestCase):
+
+    def test_copy_then_catch_up(self):
+        tracker = uptodate.UptodateTracker()
+        tracker.replica_setup("/src/t", "/mapr/zoom/repl/r", "crosscluster", 100.0)
+        tracker.replica_setup("/src/t", "/localvol/r", "intracluster", 100.0)
+        tracker.table_loaded("/src/t", 1000)
+        remote = {'cluster': "zoom", 'table': "/repl/r", 'copyTableCompletionPercentage': "50", 'isUptodate': "false"}
+        local = {'cluster': "local", 'table': "/localvol/r", 'isUptodate': "true"}
+
+        # The local replica reports no copy percentage: it counts as copied
+        finished = tracker.observe("/src/t", [remote, local], observed_at=105.0)
+        self.assertEqual([progress.repl_table for progress in finished], ["/localvol/r"])
+        self.assertEqual(tracker.pending_tables(), ["/src/t"])
+
+        remote['copyTableCompletionPercentage'] = "100"
+        tracker.observe("/src/t", [remote], observed_at=110.0)
+        remote['isUptodate'] = "true"
+        tracker.observe("/src/t", [remote], observed_at=112.0)
+        self.assertEqual(tracker.pending_tables(), [])
+
+        results = dict((result['replica'], result) for result in tracker.results())
+        remote_result = results["/mapr/zoom/repl/r"]
+        self.assertEqual((remote_result['copy_duration'], remote_result['catchup_duration'],
+                          remote_result['total_duration'], remote_result['num_rows']), (10.0, 2.0, 12.0, 1000))
+        self.assertEqual(results["/localvol/r"]['total_duration'], 5.0)
+        self.assertTrue("crosscluster" in tracker.report())
+
+    def test_replica_of_another_cluster_is_not_matched(self):
+        self.assertTrue(uptodate.is_same_replica("/mapr/zoom/repl/r", {'cluster': "zoom", 'table': "/repl/r"}))
+        self.assertFalse(uptodate.is_same_replica("/mapr/zoom/repl/r", {'cluster': "other", 'table': "/repl/r"}))
+        self.assertTrue(uptodate.is_same_replica("/repl/r", {'cluster': "any", 'table': "/repl/r"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+
+"""
+Compact in-memory history of replica lag metrics.
+Each replica keeps its samples in ring buffers backed by arrays of machine numbers:
+a raw ring with the latest samples, and a coarse ring into which samples falling off the raw ring
+are downsampled (max of every downsample_factor samples).
+The arrays grow as samples arrive, up to the ring capacities. A sample takes 8 bytes for its time and
+8 per field, so 48 bytes with g_lag_fields: a full replica holds (capacity + coarse_capacity) * 48 bytes,
+about 20KB with the defaults, i.e. about 600MB for 30000 replicas.
+"""
+
+import csv
+from array import array
+from threading import Lock
+import utils
+
+g_lag_fields = ['bytesPending', 'putsPending', 'bucketsPending', 'minPendingTS', 'maxPendingTS']
+
+# Stored in place of values that are missing from a poll
+g_missing = -1
+
+
+class Ring(object):
+    """
+    Ring of samples: one array of timestamps and one array per field.
+    The arrays grow with the first capacity samples, then the oldest sample is overwritten.
+    """
+
+    def __init__(self, capacity, num_fields):
+        self.capacity = capacity
+        self.size = 0
+        self._next = 0
+        self.times = array('d')
+        self.values = [array('l') for _ in xrange(0, num_fields)]
+
+    def append(self, timestamp, list_of_values):
+        """
+        :return: (timestamp, values) of the sample that was overwritten, None while the ring is not full
+        """
+        if self.size < self.capacity:
+            self.times.append(timestamp)
+            for values, value in zip(self.values, list_of_values):
+                values.append(value)
+            self.size += 1
+            self._next = self.size % self.capacity
+            return None
+        evicted = (self.times[self._next], [values[self._next] for values in self.values])
+        self.times[self._next] = timestamp
+        for values, value in zip(self.values, list_of_values):
+            values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        return evicted
+
+    def samples(self, field_idx):
+        """
+        :return: list of (timestamp, value) of a field, oldest first
+        """
+        start = (self._next - self.size) % self.capacity
+        values = self.values[field_idx]
+        return [(self.times[(start + i) % self.capacity], values[(start + i) % self.capacity])
+                for i in xrange(0, self.size)]
+
+    def nbytes(self):
+        return self.times.itemsize * len(self.times) + sum(v.itemsize * len(v) for v in self.values)
+
+
+class ReplicaSeries(object):
+    """
+    Raw and coarse rings of one replica
+    """
+
+    def __init__(self, num_fields, capacity, coarse_capacity, downsample_factor):
+        self.raw = Ring(capacity, num_fields)
+        self.coarse = Ring(coarse_capacity, num_fields)
+        self.downsample_factor = downsample_factor
+        # Running max of the samples evicted from the raw ring, not yet pushed to the coarse ring
+        self._pending = [g_missing] * num_fields
+        self._pending_count = 0
+
+    def append(self, timestamp, list_of_values):
+        evicted = self.raw.append(timestamp, list_of_values)
+        if evicted is None:
+            return
+        evicted_time, evicted_values = evicted
+        self._pending = [max(a, b) for a, b in zip(self._pending, evicted_values)]
+        self._pending_count += 1
+        if self._pending_count == self.downsample_factor:
+            # Coarse sample is stamped with the time of the last raw sample it covers
+            self.coarse.append(evicted_time, self._pending)
+            self._pending = [g_missing] * len(self._pending)
+            self._pending_count = 0
+
+    def samples(self, field_idx):
+        return self.coarse.samples(field_idx) + self.raw.samples(field_idx)
+
+
+class TimeSeriesStore(object):
+    """
+    Thread safe history of lag fields of every replica, keyed by monitor.get_replica_key
+    """
+
+    def __init__(self, fields=None, capacity=120, coarse_capacity=288, downsample_factor=360):
+        """
+        :param fields: fields to record, integers only (default = g_lag_fields)
+        :param capacity: number of latest samples kept at full resolution, per replica
+        :param coarse_capacity: number of downsampled samples kept, per replica
+        :param downsample_factor: number of raw samples merged into one downsampled sample
+        """
+        self.fields = list(fields) if fields is not None else list(g_lag_fields)
+        self.capacity = capacity
+        self.coarse_capacity = coarse_capacity
+        self.downsample_factor = downsample_factor
+        self._lock = Lock()
+        self._series = {}
+
+    def record(self, key, data, timestamp):
+        """
+        :param key: replica key, see monitor.get_replica_key
+        :param data: one entry of "maprcli table replica list -json"
+        :param timestamp: time of the poll
+        :return: None
+        """
+        list_of_values = []
+        for field in self.fields:
+            value = utils.get_replica_field(data, field)
+            list_of_values.append(g_missing if value is None else value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ReplicaSeries(len(self.fields), self.capacity, self.coarse_capacity,
+                                       self.downsample_factor)
+                self._series[key] = series
+            series.append(timestamp, list_of_values)
+
+    def keys(self):
+        with self._lock:
+            return sorted(self._series.keys())
+
+    def get(self, key, field, since=None, step=None):
+        """
+        :param key: replica key
+        :param field: one of the recorded fields
+        :param since: only samples at or after this time (default = all)
+        :param step: downsample to one sample (the max) per step seconds (default = as stored)
+        :return: list of (timestamp, value), oldest first. Missing values are g_missing.
+        """
+        field_idx = self.fields.index(field)
+        with self._lock:
+            series = self._series.get(key)
+            points = series.samples(field_idx) if series is not None else []
+        if since is not None:
+            points = [point for point in points if point[0] >= since]
+        if step is not None:
+            points = downsample(points, step)
+        return points
+
+    def nbytes(self):
+        """
+        :return: memory held by the sample arrays, in bytes
+        """
+        with self._lock:
+            return sum(series.raw.nbytes() + series.coarse.nbytes() for series in self._series.values())
+
+    def export_csv(self, path, since=None, step=None):
+        """
+        Writes every sample as a CSV row: sourceTable, cluster, table, time, then one column per field
+        :param path: output file
+        :param since: only samples at or after this time (default = all)
+        :param step: downsample to one sample per step seconds (default = as stored)
+        :return: number of rows written
+        """
+        rows = 0
+        with open(path, 'wb') as out_file:
+            writer = csv.writer(out_file)
+            writer.writerow(['sourceTable', 'cluster', 'table', 'time'] + self.fields)
+            for key in self.keys():
+                columns = [self.get(key, field, since, step) for field in self.fields]
+                for i in xrange(0, len(columns[0])):
+                    values = [column[i][1] for column in columns]
+                    writer.writerow([_to_str(part) for part in key] + [repr(columns[0][i][0])] +
+                                    ["" if value == g_missing else value for value in values])
+                    rows += 1
+        return rows
+
+
+def _to_str(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return "" if value is None else value
+
+
+def downsample(points, step):
+    """
+    :param points: list of (timestamp, value), oldest first
+    :param step: width of a bucket in seconds
+    :return: one (bucket start, max value) per non empty bucket
+    """
+    result = []
+    for timestamp, value in points:
+        bucket = timestamp - timestamp % step
+        if result and result[-1][0] == bucket:
+            result[-1] = (bucket, max(result[-1][1], value))
+        else:
+            result.append((bucket, value))
+    return result
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+
+"""
+Time from autosetup to a fully copied, up to date replica.
+Each replica goes through two phases after autosetup:
+copy (till copyTableCompletionPercentage reaches 100) and catch-up (till isUptodate is true).
+Completion times are those of the first poll that sees them, so they are only as precise as the poll interval.
+"""
+
+import logging
+import time
+from threading import Lock
+import utils
+
+
+def split_replica_path(repl_table):
+    """
+    :param repl_table: replica table path as given to autosetup, e.g. /mapr/zoom/replvol/rtable1
+    :return: (cluster, path within the cluster), cluster is None for replicas on the local cluster
+    """
+    if repl_table.startswith("/mapr/"):
+        parts = repl_table.split('/', 3)
+        return parts[2], "/" + (parts[3] if len(parts) > 3 else "")
+    return None, repl_table
+
+
+def is_same_replica(repl_table, data):
+    """
+    :param repl_table: replica table path as given to autosetup
+    :param data: one entry of "maprcli table replica list -json"
+    :return: True if the entry describes that replica
+    """
+    if data.get('table') == repl_table:
+        return True
+    cluster, path = split_replica_path(repl_table)
+    return data.get('table') == path and (cluster is None or data.get('cluster') == cluster)
+
+
+class ReplicaProgress(object):
+    """
+    Timestamps of one replica, from autosetup till up to date
+    """
+
+    def __init__(self, src_table, repl_table, replica_type, setup_at):
+        self.src_table = src_table
+        self.repl_table = repl_table
+        self.replica_type = replica_type
+        self.setup_at = setup_at
+        self.copied_at = None
+        self.uptodate_at = None
+
+    @property
+    def done(self):
+        return self.uptodate_at is not None
+
+    def copy_duration(self):
+        return self.copied_at - self.setup_at if self.copied_at is not None else None
+
+    def catchup_duration(self):
+        if self.uptodate_at is None or self.copied_at is None:
+            return None
+        return self.uptodate_at - self.copied_at
+
+    def total_duration(self):
+        return self.uptodate_at - self.setup_at if self.uptodate_at is not None else None
+
+
+class UptodateTracker(object):
+    """
+    Thread safe record of the progress of every replica set up during a run.
+    utils.py reports autosetups and replica status polls to it through utils.g_uptodate_tracker.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # (source table, replica table) -> ReplicaProgress
+        self._replicas = {}
+        # source table -> number of rows loaded
+        self._table_rows = {}
+
+    def replica_setup(self, src_table, repl_table, replica_type, setup_at):
+        """
+        :param src_table: source table path
+        :param repl_table: replica table path, as given to autosetup
+        :param replica_type: crosscluster / intracluster / multimaster
+        :param setup_at: time at which the autosetup command started running
+        :return: None
+        """
+        with self._lock:
+            self._replicas[(src_table, repl_table)] = ReplicaProgress(src_table, repl_table, replica_type, setup_at)
+
+    def table_loaded(self, table_name, num_rows):
+        """
+        :param table_name: source table path
+        :param num_rows: number of rows loaded, used to group results by table size
+        :return: None
+        """
+        with self._lock:
+            self._table_rows[table_name] = self._table_rows.get(table_name, 0) + num_rows
+
+    def observe(self, src_table, list_of_data, observed_at=None):
+        """
+        Updates the progress of the replicas of a table from a "replica list" poll
+        :param src_table: source table path
+        :param list_of_data: replica entries of the table
+        :param observed_at: time of the poll (default = time.time())
+        :return: list of ReplicaProgress that became up to date with this poll
+        """
+        observed_at = time.time() if observed_at is None else observed_at
+        finished = []
+        with self._lock:
+            list_of_progress = [progress for (table, _), progress in self._replicas.items()
+                                if table == src_table and not progress.done]
+            for progress in list_of_progress:
+                for data in list_of_data:
+                    if not is_same_replica(progress.repl_table, data):
+                        continue
+                    # Some versions do not report the copy percentage: then the copy counts as done,
+                    # as in monitor.is_replica_stable, and isUptodate alone decides
+                    copy_percentage = utils.get_replica_field(data, 'copyTableCompletionPercentage')
+                    if progress.copied_at is None and (copy_percentage is None or copy_percentage >= 100):
+                        progress.copied_at = observed_at
+                    if progress.copied_at is not None and utils.get_replica_field(data, 'isUptodate') is True:
+                        progress.uptodate_at = observed_at
+                        finished.append(progress)
+                    break
+        for progress in finished:
+            logging.debug("Replica " + progress.repl_table + " of " + src_table + " up to date after %.1fs" %
+                          progress.total_duration())
+        return finished
+
+    def pending_tables(self):
+        """
+        :return: sorted list of source tables with at least one replica not yet up to date
+        """
+        with self._lock:
+            return sorted(set(progress.src_table for progress in self._replicas.values() if not progress.done))
+
+    def results(self):
+        """
+        :return: list of dicts, one per replica, sorted by source table and replica
+        """
+        with self._lock:
+            list_of_progress = sorted(self._replicas.values(), key=lambda p: (p.src_table, p.repl_table))
+            table_rows = dict(self._table_rows)
+        return [{'src_table': progress.src_table,
+                 'replica': progress.repl_table,
+                 'replica_type': progress.replica_type,
+                 'num_rows': table_rows.get(progress.src_table),
+                 'setup_at': progress.setup_at,
+                 'copy_duration': progress.copy_duration(),
+                 'catchup_duration': progress.catchup_duration(),
+                 'total_duration': progress.total_duration()} for progress in list_of_progress]
+
+    def report(self):
+        """
+        :return: human readable per replica durations, followed by aggregates
+                 by replica type and by table size
+        """
+        results = self.results()
+        lines = ["%-40s %-40s %-13s %10s %10s %10s" % ("source table", "replica", "type",
+                                                       "copy(s)", "catchup(s)", "total(s)")]
+        for result in results:
+            lines.append("%-40s %-40s %-13s %10s %10s %10s" % (
+                result['src_table'], result['replica'], result['replica_type'],
+                _format_duration(result['copy_duration']), _format_duration(result['catchup_duration']),
+                _format_duration(result['total_duration'])))
+        lines.append("")
+        lines.extend(_aggregate_lines("replica type", results, lambda result: result['replica_type']))
+        lines.append("")
+        lines.extend(_aggregate_lines("rows", results, lambda result: result['num_rows']))
+        return "\n".join(lines)
+
+
+def _format_duration(value):
+    return "-" if value is None else "%.1f" % value
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _aggregate_lines(group_name, results, get_group):
+    lines = ["%-13s %7s %9s %10s %10s %10s %10s" % (group_name, "done", "pending", "copy p50",
+                                                    "catchup p50", "total p50", "total max")]
+    groups = {}
+    for result in results:
+        groups.setdefault(get_group(result), []).append(result)
+    for group, group_results in sorted(groups.items()):
+        done = [result for result in group_results if result['total_duration'] is not None]
+        if done:
+            copy = sorted(result['copy_duration'] for result in done)
+            catchup = sorted(result['catchup_duration'] for result in done)
+            total = sorted(result['total_duration'] for result in done)
+            durations = (_percentile(copy, 0.5), _percentile(catchup, 0.5), _percentile(total, 0.5), total[-1])
+        else:
+            durations = (None, None, None, None)
+        lines.append("%-13s %7d %9d %10s %10s %10s %10s" % ((str(group), len(done), len(group_results) - len(done)) +
+                                                           tuple(_format_duration(d) for d in durations)))
+    return lines
+
+
+def wait_until_uptodate(tracker, interval=10, timeout=None):
+    """
+    Polls the replica status of tables with pending replicas till every replica is up to date.
+    Polls are reported to the tracker through utils.fetch_replica_status.
+    :param tracker: UptodateTracker, must be utils.g_uptodate_tracker
+    :param interval: seconds between two polls
+    :param timeout: give up after these many seconds (default = wait forever)
+    :return: True if all replicas became up to date
+    """
+    start = time.time()
+    while True:
+        list_of_tables = tracker.pending_tables()
+        if not list_of_tables:
+            return True
+        if timeout is not None and time.time() - start >= timeout:
+            logging.error(str(len(list_of_tables)) + " tables still have replicas that are not up to date")
+            return False
+        logging.debug("Waiting for replicas of " + str(len(list_of_tables)) + " tables")
+        utils.run_on_work_queue(utils.fetch_replica_status, list_of_tables)
+        if tracker.pending_tables():
+            time.sleep(interval)
@@ -3,18 +3,131 @@
 # Created by aravi
 
 import json
-import os
-import subprocess
 import logging
-from threading import Thread, Lock
+import time
+import Queue
+from threading import Thread
+import executor
+import inventory
+import loadstats
+import metrics
+import pipeline
 
 g_zfill_width = 5
 
 g_thread_count = 10
+# Shared pool on which every maprcli / hadoop / loadtest command is executed
+g_executor = executor.CommandExecutor(num_workers=g_thread_count)
+# Cached listing of tables per volume, kept up to date by the create / delete helpers below
+g_inventory = inventory.TableInventory(ttl=300)
+# Optional stateindex.StateIndex in which created objects and their status are recorded
+g_state_index = None
+# Optional journal.Journal of completed steps. Steps already in it are skipped.
+g_journal = None
+# uptodate.UptodateTracker timing replicas from autosetup till up to date, None if disabled
+g_uptodate_tracker = None
+# statusoutput.StatusWriter receiving every replica status poll, None to print status as text
+g_status_writer = None
+# loadrunner.LoadRunner running loadtest on CPU sets of this node, None to run it on g_executor
+g_load_runner = None
+# bulkload.BulkLoader generating the rows in process instead of running loadtest, None to run loadtest
+g_bulk_loader = None
+# Metrics counter incremented for each completed step
+g_step_counters = {'volume_created': 'volumes_created',
+                   'created': 'tables_created',
+                   'loaded': 'tables_loaded',
+                   'replica': 'replicas_setup'}
 g_all_replica_fields = ['cluster', 'table', 'type', 'realTablePath', 'replicaState', 'paused',
                         'throttle', 'idx', 'networkencryption', 'synchronous', 'networkcompression',
                         'isUptodate', 'minPendingTS', 'maxPendingTS', 'bytesPending', 'putsPending',
                         'bucketsPending', 'uuid', 'copyTableCompletionPercentage']
+# Fields missing here are kept as reported, e.g. networkcompression is the compression algorithm
+g_replica_field_types = {'paused': bool, 'throttle': bool, 'networkencryption': bool, 'synchronous': bool,
+                         'isUptodate': bool, 'idx': int, 'minPendingTS': int, 'maxPendingTS': int,
+                         'bytesPending': int, 'putsPending': int, 'bucketsPending': int,
+                         'copyTableCompletionPercentage': int}
+
+
+def run_on_work_queue(func, list_of_items, num_threads=None):
+    """
+    Calls func on every item using a shared work queue.
+    Each thread picks the next item as soon as it is done with the previous one,
+    so a slow item only holds up the thread working on it.
+    :param func: function called with a single item
+    :param list_of_items: items to be processed
+    :param num_threads: number of threads (default = g_thread_count)
+    :return: list of values returned by func, in the same order as the items
+    """
+    if num_threads is None:
+        num_threads = g_thread_count
+    work_queue = Queue.Queue()
+    for idx, item in enumerate(list_of_items):
+        work_queue.put((idx, item))
+    results = [None] * len(list_of_items)
+
+    def worker():
+        while True:
+            try:
+                idx, item = work_queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[idx] = func(item)
+            except Exception:
+                logging.exception("Failed to process: " + str(item))
+
+    threads = [Thread(target=worker) for _ in xrange(0, min(num_threads, len(list_of_items)))]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def _record_state(method_name, *args):
+    """
+    Records an event in g_state_index, if one is configured.
+    Failures are logged and never interrupt the operation being recorded.
+    """
+    if g_state_index is None:
+        return
+    try:
+        getattr(g_state_index, method_name)(*args)
+    except Exception:
+        logging.exception("Failed to update state index")
+
+
+def _skip_if_done(argv, obj, step, detail=None):
+    """
+    Checks g_journal for a completed step
+    :return: a successful CommandResult standing in for the command if the step is done, else None
+    """
+    if g_journal is None or not g_journal.is_done(obj, step, detail):
+        return None
+    logging.debug("Already done, skipping: " + ' '.join(argv))
+    return executor.CommandResult(argv, 0, "", "", 0.0)
+
+
+def _step_completed(obj, step, detail=None):
+    """
+    Counts a completed step in the metrics and records it in g_journal, if one is configured
+    """
+    metrics.g_registry.increment(g_step_counters[step])
+    if g_journal is not None:
+        g_journal.record(obj, step, detail)
+
+
+def get_replica_type(repl_table, is_multimaster=False):
+    """
+    :param repl_table: replica table path
+    :param is_multimaster: is it a multimaster replica
+    :return: multimaster, crosscluster (replica under /mapr/<cluster>) or intracluster
+    """
+    if is_multimaster is True:
+        return "multimaster"
+    return "crosscluster" if repl_table.startswith("/mapr/") else "intracluster"
 
 
 def create_volume(volume_path_prefix, start_idx, num_volumes):
@@ -28,12 +141,32 @@ def create_volume(volume_path_prefix, start_idx, num_volumes):
     list_of_volumes = [volume_path_prefix + str(start_idx + i).zfill(g_zfill_width) for i in xrange(0, num_volumes)]
     logging.debug(list_of_volumes)
     for vol in list_of_volumes:
-        create_vol_cmd = "maprcli volume create -name " + vol[1:] + " -path " + vol + " -replication 3 -topology /data"
-        logging.info(create_vol_cmd)
-        os.system(create_vol_cmd)
+        create_single_volume(vol)
     return list_of_volumes
 
 
+def create_single_volume(vol):
+    """
+    Create one volume, mounted at the given path
+    :param vol: volume mount path (volume name is the path without the leading slash)
+    :return: CommandResult
+    """
+    create_vol_cmd = ["maprcli", "volume", "create", "-name", vol[1:], "-path", vol,
+                      "-replication", "3", "-topology", "/data"]
+    skipped = _skip_if_done(create_vol_cmd, vol, "volume_created")
+    if skipped is not None:
+        return skipped
+    result = g_executor.run(create_vol_cmd)
+    if result.ok:
+        # A new volume has no tables
+        g_inventory.put(vol, [])
+    if result.ok or is_already_exists(result):
+        _step_completed(vol, "volume_created")
+    _record_state("record_volume", vol, "created" if result.ok or is_already_exists(result) else "failed",
+                  result.wall_time)
+    return result
+
+
 def delete_volume(volume_path_prefix, start_idx, num_volumes):
     """
     Delete volume(s) with specified path as prefix.
@@ -45,12 +178,73 @@ def delete_volume(volume_path_prefix, start_idx, num_volumes):
     list_of_volumes = [volume_path_prefix + str(start_idx + i).zfill(g_zfill_width) for i in xrange(0, num_volumes)]
     logging.debug(list_of_volumes)
     for vol in list_of_volumes:
-        delete_vol_cmd = "maprcli volume remove -name " + vol[1:] + " -force true"
-        logging.info(delete_vol_cmd)
-        os.system(delete_vol_cmd)
+        delete_single_volume(vol)
     return list_of_volumes
 
 
+def delete_single_volume(vol):
+    """
+    Delete one volume, with the tables in it
+    :param vol: volume mount path (volume name is the path without the leading slash)
+    :return: CommandResult
+    """
+    delete_vol_cmd = ["maprcli", "volume", "remove", "-name", vol[1:], "-force", "true"]
+    result = g_executor.run(delete_vol_cmd)
+    g_inventory.invalidate(vol)
+    if result.ok:
+        _record_state("record_volume", vol, "deleted", result.wall_time)
+    return result
+
+
+def is_already_exists(result):
+    """
+    Checks if a failed maprcli command failed only because the object already exists
+    :param result: CommandResult of the command
+    :return: True if the object already exists
+    """
+    output = (result.stdout + result.stderr).lower()
+    return "already in use" in output or "already exists" in output
+
+
+def create_volume_multithread(volume_path_prefix, start_idx, num_volumes, parallelism=None, on_created=None):
+    """
+    Create volume(s) with specified path as prefix. Volumes are created concurrently.
+    :param volume_path_prefix: volume mount path (will be used as prefix for volume name)
+    :param start_idx: start index appended to volume prefix
+    :param num_volumes: number of volumes to be created
+    :param parallelism: number of volumes created at the same time (default = g_thread_count)
+    :param on_created: optional function called with the volume path as soon as that volume exists
+    :return: dict of volume path to CommandResult
+    """
+    list_of_volumes = [volume_path_prefix + str(start_idx + i).zfill(g_zfill_width) for i in xrange(0, num_volumes)]
+    logging.debug(list_of_volumes)
+
+    def create_one(vol):
+        result = create_single_volume(vol)
+        if on_created is not None and (result.ok or is_already_exists(result)):
+            on_created(vol)
+        return result
+
+    list_of_results = run_on_work_queue(create_one, list_of_volumes, parallelism)
+    return dict(zip(list_of_volumes, list_of_results))
+
+
+def delete_volume_multithread(volume_path_prefix, start_idx, num_volumes, parallelism=None):
+    """
+    Delete volume(s) with specified path as prefix. Volumes are deleted concurrently.
+    :param volume_path_prefix: volume mount path (used as prefix for volume name)
+    :param start_idx: start index appended to volume prefix
+    :param num_volumes: number of volumes to be deleted
+    :param parallelism: number of volumes deleted at the same time (default = g_thread_count)
+    :return: dict of volume path to CommandResult
+    """
+    list_of_volumes = [volume_path_prefix + str(start_idx + i).zfill(g_zfill_width) for i in xrange(0, num_volumes)]
+    logging.debug(list_of_volumes)
+
+    list_of_results = run_on_work_queue(delete_single_volume, list_of_volumes, parallelism)
+    return dict(zip(list_of_volumes, list_of_results))
+
+
 def create_table(table_path_prefix, start_idx=1, num_tables=1):
     """
     Create table(s) with specified path as prefix.
@@ -63,13 +257,31 @@ def create_table(table_path_prefix, start_idx=1, num_tables=1):
     list_of_tables = [table_path_prefix + str(start_idx + i).zfill(g_zfill_width) for i in xrange(0, num_tables)]
     logging.debug(list_of_tables)
     for table_name in list_of_tables:
-        # create_cmd = "maprcli table create -path " + g_volume_prefix + g_table_prefix + str(i).zfill(g_zfill_width)
-        create_cmd = "maprcli table create -path " + table_name
-        logging.info(create_cmd)
-        os.system(create_cmd)
+        create_single_table(table_name)
     return list_of_tables
 
 
+def create_single_table(table_name):
+    """
+    Create one table
+    :param table_name: table path
+    :return: CommandResult
+    """
+    # create_cmd = "maprcli table create -path " + g_volume_prefix + g_table_prefix + str(i).zfill(g_zfill_width)
+    create_cmd = ["maprcli", "table", "create", "-path", table_name]
+    skipped = _skip_if_done(create_cmd, table_name, "created")
+    if skipped is not None:
+        return skipped
+    result = g_executor.run(create_cmd)
+    if result.ok or is_already_exists(result):
+        g_inventory.add_table(table_name)
+        _step_completed(table_name, "created")
+        _record_state("record_table", table_name, "created", result.wall_time)
+    else:
+        _record_state("record_table", table_name, "failed", result.wall_time)
+    return result
+
+
 def create_table_many(table_path_prefix_list, start_idx=1, num_tables=1):
     """
     Create table(s) with specified paths as prefixes.
@@ -90,22 +302,13 @@ def create_tables_multithread(table_path_prefix_list, start_idx=1, num_tables=1)
     :return: list of table names created
     """
     logging.debug("Creating tables from a list of prefixes")
-    prefix_list_length = (len(table_path_prefix_list) / g_thread_count) + 1
-    # if prefix_list_length is 0:
-    #     prefix_list_length = 1
-    sublist_of_prefixes = [table_path_prefix_list[i:i + prefix_list_length] for i in
-                           xrange(0, len(table_path_prefix_list), prefix_list_length)]
-    logging.info(sublist_of_prefixes)
-
-    threads = [Thread(target=create_table_many, args=(sublist_of_prefixes[i], start_idx, num_tables))
-               for i in xrange(0, len(sublist_of_prefixes))]
-    for thread in threads:
-        thread.start()
-
-    for thread in threads:
-        thread.join()
+    logging.info(table_path_prefix_list)
+    # One work item per table, so that a slow create does not hold up a whole prefix
+    work_items = [(prefix, i) for prefix in table_path_prefix_list for i in xrange(start_idx, start_idx + num_tables)]
+    list_of_tables = run_on_work_queue(lambda item: create_table(item[0], item[1], 1)[0], work_items)
 
     logging.debug("Done")
+    return list_of_tables
 
 
 def delete_table(table_path_prefix, start_idx=1, num_tables=1):
@@ -120,9 +323,11 @@ def delete_table(table_path_prefix, start_idx=1, num_tables=1):
     list_of_tables = [table_path_prefix + str(start_idx + i).zfill(g_zfill_width) for i in xrange(0, num_tables)]
     logging.debug(list_of_tables)
     for table_name in list_of_tables:
-        delete_cmd = "maprcli table delete -path " + table_name
-        logging.info(delete_cmd)
-        os.system(delete_cmd)
+        delete_cmd = ["maprcli", "table", "delete", "-path", table_name]
+        result = g_executor.run(delete_cmd)
+        if result.ok:
+            g_inventory.remove_table(table_name)
+            _record_state("record_table", table_name, "deleted", result.wall_time)
     return list_of_tables
 
 
@@ -137,6 +342,24 @@ def autosetup_replica_table(src_table, replica_parent, num_replica=1, is_multima
     :return: list of replica tables
     """
     logging.debug("Creating autosetup replica")
+    list_of_replica = get_replica_table_names(src_table, replica_parent, num_replica, is_multimaster)
+    logging.debug(list_of_replica)
+
+    for repl_table in list_of_replica:
+        autosetup_single_replica(src_table, repl_table, is_multimaster)
+
+    return list_of_replica
+
+
+def get_replica_table_names(src_table, replica_parent, num_replica=1, is_multimaster=False):
+    """
+    Generates the names of the replica tables autosetup creates for a table
+    :param src_table: source table path
+    :param replica_parent: path to the parent directory of replica table
+    :param num_replica: number of replicas
+    :param is_multimaster: is it a multimaster replica
+    :return: list of replica table paths
+    """
     # Different table name for replica table and multimaster replica table
     rtable_prefix = "/rtable" if is_multimaster is False else "/mmrtable"
     # Remove leading forward slashes if any
@@ -144,18 +367,72 @@ def autosetup_replica_table(src_table, replica_parent, num_replica=1, is_multima
     # Generate replica table name
     src_suffix = src_table.translate(None, '/')
 
-    list_of_replica = [replica_parent + rtable_prefix + src_suffix + "_slave" + str(i + 1) for i in
-                       xrange(0, num_replica)]
-    logging.debug(list_of_replica)
+    return [replica_parent + rtable_prefix + src_suffix + "_slave" + str(i + 1) for i in xrange(0, num_replica)]
 
-    for repl_table in list_of_replica:
-        auto_setup_cmd = "maprcli table replica autosetup -path " + src_table + " -replica " + repl_table + " -directcopy true"
-        if is_multimaster is True:
-            auto_setup_cmd += " -multimaster true"
-        logging.info(auto_setup_cmd)
-        os.system(auto_setup_cmd)
 
-    return list_of_replica
+def autosetup_single_replica(src_table, repl_table, is_multimaster=False):
+    """
+    Sets up one replica table for a source table, with directcopy
+    :param src_table: source table path
+    :param repl_table: replica table path
+    :param is_multimaster: is it a multimaster replica
+    :return: CommandResult
+    """
+    auto_setup_cmd = ["maprcli", "table", "replica", "autosetup", "-path", src_table,
+                      "-replica", repl_table, "-directcopy", "true"]
+    if is_multimaster is True:
+        auto_setup_cmd += ["-multimaster", "true"]
+    skipped = _skip_if_done(auto_setup_cmd, src_table, "replica", repl_table)
+    if skipped is not None:
+        return skipped
+    result = g_executor.run(auto_setup_cmd)
+    if result.ok:
+        _step_completed(src_table, "replica", repl_table)
+        if g_uptodate_tracker is not None:
+            # When the command started running, not when it was submitted: waits in the queue are not copy time
+            setup_at = result.started_at if result.started_at is not None else time.time() - result.wall_time
+            g_uptodate_tracker.replica_setup(src_table, repl_table, get_replica_type(repl_table, is_multimaster),
+                                             setup_at)
+    _record_state("record_replica", src_table, repl_table, get_replica_type(repl_table, is_multimaster),
+                  "setup" if result.ok else "failed", result.wall_time)
+    return result
+
+
+def autosetup_replica_table_concurrent(src_table, replica_specs, max_concurrent=None):
+    """
+    Sets up all replicas of a table at the same time.
+    :param src_table: source table path
+    :param replica_specs: list of (replica_parent, num_replica, is_multimaster) tuples
+    :param max_concurrent: maximum number of autosetup commands in flight for this table
+                           (default = all replicas at once)
+    :return: list of replica tables
+    """
+    logging.debug("Concurrent autosetup of all replicas of a table")
+    work_items = [(repl_table, is_multimaster)
+                  for replica_parent, num_replica, is_multimaster in replica_specs
+                  for repl_table in get_replica_table_names(src_table, replica_parent, num_replica, is_multimaster)]
+    if max_concurrent is None:
+        max_concurrent = len(work_items)
+    run_on_work_queue(lambda item: autosetup_single_replica(src_table, item[0], item[1]),
+                      work_items, max_concurrent)
+    return [repl_table for repl_table, _ in work_items]
+
+
+def autosetup_replica_volume_concurrent(volume_path, replica_specs, max_concurrent=None):
+    """
+    Autosetup all replica types for all tables within a volume, in a single pass over the tables.
+    Replicas of each table are set up at the same time.
+    :param volume_path: volume, whose tables should have replica autosetup
+    :param replica_specs: list of (replica_parent, num_replica, is_multimaster) tuples
+    :param max_concurrent: maximum number of autosetup commands in flight per table
+    :return: None
+    """
+    logging.debug("Concurrent autosetup for tables in a volume")
+    list_of_tables = get_tables_in_volume(volume_path)
+    run_on_work_queue(lambda tab: autosetup_replica_table_concurrent(tab, replica_specs, max_concurrent),
+                      list_of_tables)
+
+    logging.debug("Done")
 
 
 def autosetup_replica_volume(volume_path, replica_parent, num_replica=1, is_multimaster=False):
@@ -204,40 +481,48 @@ def autosetup_replica_table_multithread(volume_path, replica_parent, num_replica
     """
     logging.debug("Autosetup for tables in a volume")
     list_of_tables = get_tables_in_volume(volume_path)
-    table_list_length = (len(list_of_tables) / g_thread_count) + 1
-    # if table_list_length is 0:
-    #     table_list_length = 1
-    sublist_of_tables = [list_of_tables[i:i + table_list_length] for i in
-                         xrange(0, len(list_of_tables), table_list_length)]
-    threads = [Thread(target=autosetup_many_replica_table,
-                      args=(sublist_of_tables[i], replica_parent, num_replica, is_multimaster))
-               for i in xrange(0, len(sublist_of_tables))]
-
-    for thread in threads:
-        thread.start()
-
-    for thread in threads:
-        thread.join()
+    run_on_work_queue(lambda tab: autosetup_replica_table(tab, replica_parent, num_replica, is_multimaster),
+                      list_of_tables)
 
     logging.debug("Done")
 
 
-def get_tables_in_volume(volume_path):
+def get_tables_in_volume(volume_path, use_cache=True):
     """
     Get the table names of all tables within a volume
     :param volume_path: volume of interest
+    :param use_cache: answer from g_inventory when the volume is cached (default = True)
     :return: list of tables
     """
     logging.debug('Getting tables in a volume')
-    result = None
+    if use_cache is True:
+        cached = g_inventory.get(volume_path)
+        if cached is not None:
+            return cached
+
+    generation = g_inventory.generation(volume_path)
+    result = g_executor.run(["hadoop", "fs", "-ls", volume_path])
+    if not result.ok:
+        return []
+    result_list = parse_fs_listing(result.stdout)
+    g_inventory.put(volume_path, result_list, generation)
+    return result_list
+
+
+def parse_fs_listing(output):
+    """
+    Extracts paths from the output of "hadoop fs -ls"
+    Same as piping through "grep -v Found | awk '{print $8}'"
+    :param output: stdout of the command
+    :return: list of paths
+    """
     result_list = []
-    cmd = "hadoop fs -ls " + volume_path + " | grep -v Found | awk \'{print $8}\'"
-    try:
-        result = subprocess.check_output(cmd, shell=True)
-    except subprocess.CalledProcessError:
-        logging.error(result)
-        return result_list
-    result_list = result.split()
+    for line in output.splitlines():
+        if line.startswith("Found"):
+            continue
+        columns = line.split()
+        if len(columns) >= 8:
+            result_list.append(columns[7])
     return result_list
 
 
@@ -249,16 +534,48 @@ def load_table(table_name, num_cfs=1, num_cols=3, num_rows=100000, is_json=False
     :param num_cols: number of columns in each cf
     :param num_rows: total number of rows to insert
     :param is_json: puts data in to json table if specified
-    :return: None
+    :return: CommandResult
     """
     logging.debug("Loading data on to table")
-    load_cmd = "/opt/mapr/server/tools/loadtest -mode put -table " + table_name \
-               + " -numfamilies " + str(num_cfs) + " -numcols " + str(num_cols) \
-               + " -numrows " + str(num_rows)
+    if g_bulk_loader is not None:
+        return _bulk_load_table(table_name, num_cfs, num_cols, num_rows)
+    load_cmd = ["/opt/mapr/server/tools/loadtest", "-mode", "put", "-table", table_name,
+                "-numfamilies", str(num_cfs), "-numcols", str(num_cols),
+                "-numrows", str(num_rows)]
     if is_json is True:
-        load_cmd += " -isjson true"
-    logging.info(load_cmd)
-    os.system(load_cmd)
+        load_cmd += ["-isjson", "true"]
+    skipped = _skip_if_done(load_cmd, table_name, "loaded")
+    if skipped is not None:
+        return skipped
+    result = g_load_runner.run(load_cmd) if g_load_runner is not None else g_executor.run(load_cmd)
+    load_result = loadstats.make_load_result(table_name, num_rows, result)
+    loadstats.g_load_stats.add(load_result)
+    logging.debug(table_name + ": %d rows in %.2fs, %.1f rows/sec, %d errors" %
+                  (load_result.rows, load_result.elapsed, load_result.rows_per_sec, load_result.errors))
+    _record_state("record_table_load", table_name, load_result.rows, load_result.elapsed,
+                  load_result.rows_per_sec, load_result.rows_source, load_result.errors)
+    if result.ok:
+        _step_completed(table_name, "loaded")
+        if g_uptodate_tracker is not None:
+            g_uptodate_tracker.table_loaded(table_name, num_rows)
+    _record_state("record_table", table_name, "loaded" if result.ok else "load_failed", result.wall_time)
+    return result
+
+
+def _bulk_load_table(table_name, num_cfs, num_cols, num_rows):
+    """
+    Writes the rows of a table to the sink of g_bulk_loader. The sink is not the table, so the table is
+    neither journaled nor indexed as loaded.
+    :return: CommandResult of the bulkload step
+    """
+    load_result = g_bulk_loader.load(table_name, num_rows, num_cfs, num_cols)
+    loadstats.g_load_stats.add(load_result)
+    logging.debug(table_name + ": %d rows to the sink in %.2fs, %.1f rows/sec, %d errors" %
+                  (load_result.rows, load_result.elapsed, load_result.rows_per_sec, load_result.errors))
+    return executor.CommandResult(["bulkload", "-table", table_name, "-numrows", str(num_rows)],
+                                  0 if load_result.ok else 1, "",
+                                  "" if load_result.ok else str(load_result.errors) + " rows not written",
+                                  load_result.elapsed)
 
 
 def load_volume_tables(volume_path, num_cfs=1, num_cols=3, num_rows=100000, is_json=False):
@@ -306,22 +623,77 @@ def load_volume_tables_multithread(volume_path, num_cfs=1, num_cols=3, num_rows=
     """
     logging.debug("Loading data on to all tables in a volume")
     list_of_tables = get_tables_in_volume(volume_path)
-    table_list_length = (len(list_of_tables) / g_thread_count) + 1
-    # if table_list_length is 0:
-    #     table_list_length = 1
-    sublist_of_tables = [list_of_tables[i:i + table_list_length] for i in
-                         xrange(0, len(list_of_tables), table_list_length)]
-    threads = [Thread(target=load_many_tables,
-                      args=(sublist_of_tables[i], num_cfs, num_cols, num_rows, is_json))
-               for i in xrange(0, len(sublist_of_tables))]
+    # One thread per CPU set of the load runner, so that all of them are kept busy
+    num_threads = g_load_runner.num_slots if g_load_runner is not None else None
+    run_on_work_queue(lambda tab: load_table(tab, num_cfs, num_cols, num_rows, is_json), list_of_tables,
+                      num_threads)
 
-    for thread in threads:
-        thread.start()
+    logging.debug("Done")
 
-    for thread in threads:
-        thread.join()
 
-    logging.debug("Done")
+def fetch_replica_status(table_name):
+    """
+    Runs "maprcli table replica list" for a table
+    :param table_name: name of the table (path)
+    :return: list of replica entries (dicts), or None if the command failed
+    """
+    replicalist_cmd = ["maprcli", "table", "replica", "list", "-path", table_name, "-json"]
+    cmd_out = g_executor.run(replicalist_cmd)
+    if not cmd_out.ok:
+        logging.error(cmd_out.stdout)
+        return None
+
+    # Command succeeded and result is not null
+    list_of_data = json.loads(cmd_out.stdout).get("data", [])
+    for data in list_of_data:
+        _record_state("record_replica_status", table_name, data)
+    if g_status_writer is not None:
+        g_status_writer.write_status(table_name, list_of_data)
+    if g_uptodate_tracker is not None:
+        for progress in g_uptodate_tracker.observe(table_name, list_of_data):
+            _record_state("record_replica_uptodate", progress.src_table, progress.repl_table,
+                          progress.replica_type, progress.setup_at, progress.copy_duration(),
+                          progress.catchup_duration())
+    return list_of_data
+
+
+def get_replica_field(data, field):
+    """
+    Reads a field of a replica status entry with its proper type.
+    maprcli may report numbers and booleans as strings.
+    :param data: one entry of "maprcli table replica list -json"
+    :param field: field name
+    :return: int for counters / timestamps / percentage, bool for flags, value as is otherwise.
+             None if the field is missing or cannot be converted.
+    """
+    value = data.get(field)
+    if value is None:
+        return None
+    field_type = g_replica_field_types.get(field)
+    if field_type is bool:
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    if field_type is int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+
+def get_fields_to_track(fields):
+    """
+    Filters g_all_replica_fields with the fields requested by the user
+    :param fields: requested fields (comma separated string or list), None for all
+    :return: list of fields, in g_all_replica_fields order
+    """
+    fields_to_track = []
+    fields_not_to_track = []
+    if fields is not None:
+        fields_not_to_track = [element for element in g_all_replica_fields if element not in fields]
+        fields_to_track = [element2 for element2 in g_all_replica_fields if element2 not in fields_not_to_track]
+    else:
+        fields_to_track = g_all_replica_fields
+    return fields_to_track
 
 
 def get_replica_status(table_name, fields):
@@ -335,32 +707,18 @@ def get_replica_status(table_name, fields):
     :return: None
     """
 
-    fields_to_track = []
-    fields_not_to_track = []
-    if fields is not None:
-        fields_not_to_track = [element for element in g_all_replica_fields if element not in fields]
-        fields_to_track = [element2 for element2 in g_all_replica_fields if element2 not in fields_not_to_track]
-    else:
-        fields_to_track = g_all_replica_fields
+    fields_to_track = get_fields_to_track(fields)
 
     logging.info("Tracking following fields..")
     logging.info(fields_to_track)
 
-    cmd_out = None
-    replicalist_cmd = "maprcli table replica list -path " + table_name + " -json"
-    logging.info(replicalist_cmd)
-
-    try:
-        cmd_out = subprocess.check_output(replicalist_cmd, shell=True)
-    except subprocess.CalledProcessError:
-        logging.error(cmd_out)
+    list_of_data = fetch_replica_status(table_name)
+    # Structured output is written by fetch_replica_status
+    if list_of_data is None or g_status_writer is not None:
         return
 
-    # There was no exception and result is not null
-    json_out = json.loads(cmd_out)
-
     result = ""
-    for data in json_out["data"]:
+    for data in list_of_data:
         result += "sourceTable: " + table_name
         for field in fields_to_track:
             try:
@@ -389,34 +747,48 @@ def get_replica_status_many(list_of_tables, fields):
     map(lambda table: get_replica_status(table, fields), list_of_tables)
 
 
-def get_replica_status_multithread(volume_path, fields):
+def get_replica_status_multithread(volume_path, fields, aggregator=None):
     """
     Fetches replica status of all the tables in a volume.
     To speed up the process, the method spawns multiple threads
     :param volume_path: volume path
     :param fields: filter fields
+    :param aggregator: optional lagreport.LagAggregator. If given, status is added to it instead of printed
     :return: None
     """
 
     logging.debug("Tracking replica for tables in volume")
     list_of_tables = get_tables_in_volume(volume_path)
-    table_list_length = ((len(list_of_tables) + 1) / g_thread_count)
-    if table_list_length is 0:
-        table_list_length = 1
-    list_of_subtables = [list_of_tables[i:i + table_list_length] for i in
-                         xrange(0, len(list_of_tables), table_list_length)]
-
-    threads = [Thread(target=get_replica_status_many, args=(list_of_subtables[i], fields))
-               for i in xrange(0, len(list_of_subtables))]
-    for thread in threads:
-        thread.start()
-
-    for thread in threads:
-        thread.join()
+    if aggregator is not None:
+        def add_status(table):
+            list_of_data = fetch_replica_status(table)
+            if list_of_data is not None:
+                aggregator.add(table, list_of_data)
+        run_on_work_queue(add_status, list_of_tables)
+    else:
+        run_on_work_queue(lambda table: get_replica_status(table, fields), list_of_tables)
 
     logging.debug("Done")
 
 
+def _autosetup_all_replica_types(table, replica_path, local_path, num_replica, replica_concurrency=None):
+    """
+    Sets up cross-cluster, intracluster and multimaster replicas of a table.
+    Sequentially by default, concurrently if replica_concurrency is set.
+    """
+    replica_specs = [(replica_path, num_replica, False),
+                     (local_path, num_replica, False),
+                     (replica_path, num_replica, True)]
+    if replica_concurrency is not None:
+        autosetup_replica_table_concurrent(table, replica_specs, replica_concurrency)
+        return
+    for replica_parent, num, is_multimaster in replica_specs:
+        autosetup_replica_table(src_table=table,
+                                replica_parent=replica_parent,
+                                num_replica=num,
+                                is_multimaster=is_multimaster)
+
+
 def do_incremental_setup(volume_list,
                          src_table_prefix,
                          num_tables,
@@ -426,7 +798,8 @@ def do_incremental_setup(volume_list,
                          num_rows,
                          replica_path,
                          local_path,
-                         num_replica):
+                         num_replica,
+                         replica_concurrency=None):
     """
     Helper method to incrementally create a table, load data and autosetup directcopy
     :param volume_list: list of volumes
@@ -439,6 +812,8 @@ def do_incremental_setup(volume_list,
     :param replica_path: cross-cluster replica path
     :param local_path: intracluster replica path
     :param num_replica: number of replica
+    :param replica_concurrency: if set, replicas of a table are set up concurrently,
+                                with at most these many autosetup commands in flight
     :return: None
     """
     table_path_prefix_list = [volume + "/" + src_table_prefix for volume in volume_list]
@@ -452,17 +827,71 @@ def do_incremental_setup(volume_list,
                        num_cfs=num_cfs,
                        num_cols=num_cols,
                        num_rows=num_rows)
-            autosetup_replica_table(src_table=table,
-                                    replica_parent=replica_path,
-                                    num_replica=num_replica,
-                                    is_multimaster=False)
-            autosetup_replica_table(src_table=table,
-                                    replica_parent=local_path,
-                                    num_replica=num_replica,
-                                    is_multimaster=False)
-            autosetup_replica_table(src_table=table,
-                                    replica_parent=replica_path,
-                                    num_replica=num_replica,
-                                    is_multimaster=True)
+            _autosetup_all_replica_types(table, replica_path, local_path, num_replica, replica_concurrency)
+
+    logging.debug("Done")
+
+
+def do_incremental_setup_pipelined(volume_list,
+                                   src_table_prefix,
+                                   num_tables,
+                                   start_idx,
+                                   num_cfs,
+                                   num_cols,
+                                   num_rows,
+                                   replica_path,
+                                   local_path,
+                                   num_replica,
+                                   create_workers=2,
+                                   load_workers=4,
+                                   autosetup_workers=4,
+                                   queue_size=10,
+                                   replica_concurrency=None):
+    """
+    Same as do_incremental_setup, but runs create, load and autosetup as pipeline stages.
+    While table N is being loaded, table N+1 is created and table N-1 has its replicas set up.
+    :param volume_list: list of volumes
+    :param src_table_prefix: source table prefix
+    :param num_tables: number of tables per volume
+    :param start_idx: start index of table
+    :param num_cfs: number of column families per table
+    :param num_cols: number of columns in a table
+    :param num_rows: number of rows to load in a table
+    :param replica_path: cross-cluster replica path
+    :param local_path: intracluster replica path
+    :param num_replica: number of replica
+    :param create_workers: number of threads creating tables
+    :param load_workers: number of threads loading tables
+    :param autosetup_workers: number of threads setting up replicas
+    :param queue_size: maximum number of tables waiting in front of each stage
+    :param replica_concurrency: if set, replicas of a table are set up concurrently,
+                                with at most these many autosetup commands in flight
+    :return: None
+    """
+    # A stage returns None when its command failed, so that the table is dropped from the later stages
+    def create_stage(item):
+        table = item[0] + str(item[1]).zfill(g_zfill_width)
+        result = create_single_table(table)
+        return table if result.ok or is_already_exists(result) else None
+
+    def load_stage(table):
+        result = load_table(table_name=table,
+                            num_cfs=num_cfs,
+                            num_cols=num_cols,
+                            num_rows=num_rows)
+        return table if result.ok else None
+
+    def autosetup_stage(table):
+        _autosetup_all_replica_types(table, replica_path, local_path, num_replica, replica_concurrency)
+        return table
+
+    table_path_prefix_list = [volume + "/" + src_table_prefix for volume in volume_list]
+    work_items = [(prefix_path, i) for prefix_path in table_path_prefix_list
+                  for i in xrange(start_idx, start_idx + num_tables)]
+    pipeline.run_pipeline(work_items,
+                          [pipeline.Stage("create", create_stage, create_workers),
+                           pipeline.Stage("load", load_stage, load_workers),
+                           pipeline.Stage("autosetup", autosetup_stage, autosetup_workers)],
+                          queue_size=queue_size)
 
     logging.debug("Done")